@@ -6,35 +6,116 @@ Calculates the theoretical probability of getting a run of K or more successes
 
 http://www.askamathematician.com/2010/07/q-whats-the-chance-of-getting-a-run-of-k-successes-in-n-bernoulli-trials-why-use-approximations-when-the-exact-answer-is-known/
 
+The probabilities are computed bottom-up for whole grids of N (antigen
+lengths), K (MHC lengths) and success probabilities at once and can be saved
+as a lookup table for other scripts (see `loadStreakTable()`):
+
+    K_succes_in_N.py -N 1000:6001:1000 -K 8 16 -p 0.5 -o streaks.csv
+
+Run without arguments it asks for N and K like before.
+
 Created on Fri Nov 13 18:08:10 2015
 
 @author: Piotr Bentkowski - bentkowski.piotr@gmail.com
 """
 import sys
+import argparse
+import numpy as np
+
+
+TABLE_HEADER = "numBits minFits succProb probability"
+
+
+def streakProbTable(numBits, minFits, succProb=0.5):
+    """Probabilities of a run of at least minFits successes in numBits trials
+    for all the combinations of the given values (numbers or sequences).
+    Returns an array indexed [numBits, minFits, succProb].
+
+    With P[n] the probability for n trials, the first failure either comes
+    after the run or splits off the last run-free stretch, which gives
+    P[n] = P[n-1] + (1 - p) * p**K * (1 - P[n-K-1]) for n > K, P[K] = p**K
+    and P[n] = 0 for n < K. All the K and p are advanced together along
+    n, keeping the last max(K) + 2 values in a ring buffer."""
+    numBits = np.atleast_1d(np.asarray(numBits, dtype=np.int64))
+    minFits = np.atleast_1d(np.asarray(minFits, dtype=np.int64))
+    succProb = np.atleast_1d(np.asarray(succProb, dtype=float))
+    kk = minFits[:, None]
+    powK = succProb[None, :]**kk
+    coef = (1. - succProb[None, :]) * powK
+    depth = int(max(minFits.max(), 0)) + 2
+    ring = np.zeros((depth, len(minFits), len(succProb)))
+    cols = np.arange(len(minFits))
+    table = np.zeros((len(numBits), len(minFits), len(succProb)))
+    wanted = {}
+    for ii, nn in enumerate(numBits):
+        wanted.setdefault(int(nn), []).append(ii)
+    prev = ring[0]
+    for nn in range(int(max(numBits.max(), 0)) + 1):
+        old = ring[(nn - kk.ravel() - 1) % depth, cols]
+        cur = np.where(kk > nn, 0., np.where(kk == nn, powK,
+                                             prev + coef * (1. - old)))
+        ring[nn % depth] = cur
+        prev = cur
+        for ii in wanted.get(nn, ()):
+            table[ii] = cur
+    # no trials, no run (even of length 0)
+    table[numBits <= 0] = 0.
+    return table
 
 
 def probOfStreak(numBits, minFits, succProb=0.5, saved=None):
-    """Recursive function calculating the probability that a define K-long
-    bit string will fit into a N-long random bitstring."""
-    if saved is None:
-        saved = {}
-    ID = (numBits, minFits, succProb)
-    if ID in saved:
-        return saved[ID]
-    else:
-        if minFits > numBits or numBits <= 0:
-            result = 0
+    """Calculates the probability that a define K-long bit string will fit
+    into a N-long random bitstring. `saved` is kept for the old calls and
+    not needed any more."""
+    return float(streakProbTable(numBits, minFits, succProb)[0, 0, 0])
+
+
+def saveStreakTable(FILE, numBits, minFits, succProb, table=None):
+    """Writes the probabilities of the grid into a text lookup table with
+    one `numBits minFits succProb probability` row per combination."""
+    numBits = np.atleast_1d(numBits)
+    minFits = np.atleast_1d(minFits)
+    succProb = np.atleast_1d(succProb)
+    if table is None:
+        table = streakProbTable(numBits, minFits, succProb)
+    NN, KK, PP = np.meshgrid(numBits, minFits, succProb, indexing='ij')
+    np.savetxt(FILE, np.column_stack((NN.ravel(), KK.ravel(), PP.ravel(),
+                                      table.ravel())),
+               fmt=['%d', '%d', '%.6g', '%.12e'], header=TABLE_HEADER)
+
+
+def loadStreakTable(FILE):
+    """Loads a table written by `saveStreakTable()` into a structured array
+    with the fields `numBits`, `minFits`, `succProb` and `probability`."""
+    return np.atleast_1d(np.genfromtxt(
+        FILE, names=TABLE_HEADER.split(),
+        dtype=[np.int64, np.int64, float, float]))
+
+
+def streakProbFromTable(table, numBits, minFits, succProb=0.5):
+    """Looks up the probability of one combination in a loaded table.
+    Returns NaN when the combination is not in it."""
+    hit = ((table['numBits'] == numBits) & (table['minFits'] == minFits) &
+           np.isclose(table['succProb'], succProb))
+    if not hit.any():
+        return np.nan
+    return table['probability'][np.flatnonzero(hit)[0]]
+
+
+def parseGrid(values, kind=int):
+    """Turns command line values into a sorted array. A value may be a
+    `start:stop[:step]` range (stop excluded) like in `numpy.arange()`."""
+    out = []
+    for vv in values:
+        if ':' in vv:
+            out.extend(np.arange(*[kind(xx) for xx in vv.split(':')]))
         else:
-            result = succProb**minFits
-            for firsTrail in range(1, minFits+1):
-                pr = probOfStreak(numBits-firsTrail, minFits, succProb, saved)
-                result += (succProb**(firsTrail-1))*(1-succProb)*pr
-        saved[ID] = result
-    return result
+            out.append(kind(vv))
+    return np.unique(np.array(out, dtype=kind))
 
 
-def main():
-    """ """
+def askInteractively():
+    """Asks for one N and K like the original script."""
     try:
         numBits = int(input("Enter length of the big bit string: "))
     except Exception:
@@ -52,6 +133,39 @@ def main():
     print("\nDONE!")
 
 
+def main():
+    """ """
+    if len(sys.argv) <= 1:
+        askInteractively()
+        return
+    parser = argparse.ArgumentParser(
+        description="Probability of a run of K or more successes in N "
+        "Bernoulli trials, for grids of N, K and p. Values may be given as "
+        "start:stop[:step] ranges.")
+    parser.add_argument('-N', '--num-bits', nargs='+', required=True,
+                        help="numbers of trials (antigen lengths)")
+    parser.add_argument('-K', '--min-fits', nargs='+', required=True,
+                        help="run lengths (MHC lengths)")
+    parser.add_argument('-p', '--succ-prob', nargs='+', default=['0.5'],
+                        help="success (bit match) probabilities")
+    parser.add_argument('-o', '--output', default=None, help="write the "
+                        "lookup table into this file instead of printing it")
+    args = parser.parse_args()
+    try:
+        numBits = parseGrid(args.num_bits)
+        minFits = parseGrid(args.min_fits)
+        succProb = parseGrid(args.succ_prob, float)
+    except ValueError:
+        print("Cannot convert arguments to numbers. Quit")
+        sys.exit(1)
+    table = streakProbTable(numBits, minFits, succProb)
+    if args.output is None:
+        saveStreakTable(sys.stdout.buffer, numBits, minFits, succProb, table)
+    else:
+        saveStreakTable(args.output, numBits, minFits, succProb, table)
+        print("Table of", table.size, "probabilities written to",
+              args.output)
+
+
 if __name__ == "__main__":
-    sys.setrecursionlimit(20000)
     main()
@@ -10,39 +10,24 @@ for Evolutionary Biology Group, Faculty of Biology
 @author: Piotr Bentkowski - bentkowski.piotr@gmail.com
 """
 import sys
-import re
 import numpy as np
-import bitstring as bts
 import scipy.cluster.hierarchy as sch
 import matplotlib.pyplot as plt
 import matplotlib.gridspec as gridspec
 import matplotlib
 import random
+import genome_snapshot as gsnp
+import packed_bits as pbits
 
 
 def loadHostPopulation(FILE):
     '''Takes the file with all the hosts data loads it to a list. Each
-    individual is loaded as a list of bit strings.And the population is a list
+    individual is loaded as an array of its packed MHC genes, one row of
+    64-bit words per gene (see `packed_bits`). And the population is a list
     of individuals.'''
-    LL = []
-    ll = []
-    nextHost = False
     try:
-        with open(FILE) as infile:
-            for line in infile:
-                if re.search(r"#", line):
-                    continue
-                elif re.search(r"===", line):
-                    if nextHost:
-                        LL.append(ll)
-                        ll = []
-                else:
-                    nextHost = True
-                    bitt = line.split()[0]
-                    ll.append(bts.BitString(bin=bitt).int)
-        LL.append(np.array(ll, dtype=int))
-#        print j + 1
-        return LL
+        snap = gsnp.loadHostSnapshot(FILE)
+        return gsnp.splitPerHost(snap, 'bit_gene')
     except IOError as e:
         print("I/O error({0}) in".format(e.errno),
               "loadHostPopulation(): {0}".format(e.strerror))
@@ -55,60 +40,97 @@ def hostsUniqueMHCs(hostList):
     if len(hostList):
         uniqueHosts = []
         for indv in hostList:
-            uniqueHosts.append(np.unique(indv))
+            uniqueHosts.append(pbits.uniqueRows(indv))
         return uniqueHosts
     else:
         print("ERROR in hostsUniqueMHCs(): the source host list is empty.")
         return None
 
 
+def groupGenotypes(hostList, ordered=False):
+    """Groups the hosts with the same genotype in one pass, hashing the bytes
+    of a canonical form of their alleles: sorted, or as they are in the
+    genome with `ordered`. Returns a tuple `(genotypes, counts, hostClone)`:
+    the list of distinct genotypes (in the canonical form) in the order they
+    first appear, the number of hosts with each of them and the index of
+    every host's genotype."""
+    ids = {}
+    genotypes = []
+    hostClone = np.zeros(len(hostList), dtype=np.int64)
+    for ii, indv in enumerate(hostList):
+        key = pbits.asWords(indv)
+        if not ordered:
+            key = pbits.sortRows(key)
+        kk = key.tobytes()
+        if kk not in ids:
+            ids[kk] = len(genotypes)
+            genotypes.append(key)
+        hostClone[ii] = ids[kk]
+    return (genotypes, np.bincount(hostClone, minlength=len(genotypes)),
+            hostClone)
+
+
 def createCloneList(hostList, removeConvergence="no"):
-    ''' '''
-    cloneList = []
-    cloneList.append(hostList[0])
-    for indv in hostList:
-        newOne = False
-        for indvC in cloneList:
-            if np.array_equal(indv, indvC):
-                newOne = False
-                break
-            else:
-                newOne = True
-        if newOne:
-            cloneList.append(indv)
-    if removeConvergence == "no":
-        return cloneList
-    else:
-        sortedCloneList = []
-        for indvS in cloneList:
-            sortedCloneList.append(np.sort(indvS))
-        reducedCloneList = []
-        reducedCloneList.append(sortedCloneList[0])
-        for indv in sortedCloneList:
-            newOne = False
-            for indvC in reducedCloneList:
-                if np.array_equal(indv, indvC):
-                    newOne = False
-                    break
-                else:
-                    newOne = True
-            if newOne:
-                reducedCloneList.append(indv)
-        return reducedCloneList
+    '''List of the distinct genotypes (clones) of the hosts in the order they
+    first appear. Unless removeConvergence is "no", genotypes with the same
+    alleles in a different order are merged and returned sorted.'''
+    return groupGenotypes(hostList, ordered=(removeConvergence == "no"))[0]
+
+
+def alleleIncidence(hostList):
+    """Sparse hosts x alleles incidence matrix (`scipy.sparse.csr_matrix`)
+    holding the number of copies of every allele in every host. Returns a
+    tuple `(alleles, incidence)` with the alleles (the columns) in the order
+    they first appear in hostList."""
+    from scipy.sparse import csr_matrix
+    lengths = [len(indv) for indv in hostList]
+    genes = np.vstack([pbits.asWords(indv) for indv in hostList]) \
+        if sum(lengths) else np.zeros((0, 1), dtype=np.uint64)
+    uniq, first, inverse = pbits.uniqueRows(genes, return_index=True,
+                                            return_inverse=True)
+    # === number the alleles by their first appearance ===
+    order = np.argsort(first)
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    incidence = csr_matrix((np.ones(len(genes), dtype=np.int64),
+                            (np.repeat(np.arange(len(hostList)), lengths),
+                             rank[inverse])),
+                           shape=(len(hostList), len(uniq)))
+    incidence.sum_duplicates()
+    return uniq[order], incidence
+
+
+def _presence(incidence):
+    """Incidence matrix with all the counts set to 1."""
+    pres = incidence.tocsr(copy=True)
+    pres.eliminate_zeros()
+    pres.data = np.ones(len(pres.data), dtype=np.int64)
+    return pres
+
+
+def geneCooccurrence(incidence):
+    """Frequencies of the alleles (number of hosts with each) and the
+    allele co-occurrence matrix normalized by the larger frequency of the
+    two alleles, from a hosts x alleles incidence matrix."""
+    pres = _presence(incidence)
+    geneFreq = np.asarray(pres.sum(axis=0), dtype=float).ravel()
+    cooccMtx = (pres.T @ pres).toarray().astype(float)
+    geneFreqMtx = np.maximum(geneFreq[:, None], geneFreq[None, :])
+    return geneFreq, cooccMtx / geneFreqMtx
+
+
+def cloneSimilarity(incidence, nLoci):
+    """Similarity of all pairs of rows (clones) of an incidence matrix: the
+    number of allele copies of the first clone found in the second one,
+    divided by the number of loci."""
+    simMtx = (incidence @ _presence(incidence).T).toarray().astype(float)
+    return simMtx / float(nLoci)
 
 
 def calculateCloneSimMatrix(cloneList):
-    """ """
-    N = len(cloneList)
-    simMtx = np.zeros((N, N))
-    for i, indv in enumerate(cloneList):
-        for j, indv2 in enumerate(cloneList):
-            count = 0.
-            for gene in indv:
-                if gene in indv2:
-                    count += 1.
-            simMtx[i, j] = count
-    return simMtx / float(len(cloneList[0]))
+    """Similarity matrix of the clones made by createCloneList(), see
+    cloneSimilarity()."""
+    return cloneSimilarity(alleleIncidence(cloneList)[1], len(cloneList[0]))
 
 
 def calculateGeneCooccurrMatrix(hostList):
@@ -118,37 +140,7 @@ def calculateGeneCooccurrMatrix(hostList):
         print("ERROR in calculateGeneCooccurrMatrix():",
               "the hosts list is empty.")
         return None
-    # === fetch unique MHC genes ===
-    geneList = []
-    for indv in hostList:
-        for gene in indv:
-            if gene in geneList:
-                pass
-            else:
-                geneList.append(gene)
-    geneVec = np.array(geneList, dtype=int)
-    N = geneVec.shape[0]
-    # === fetch frequencies of occurrence of MHC genes ===
-    geneFreq = np.zeros(N)
-    for k, gg in enumerate(geneVec):
-        cc = 0
-        for indv in hostList:
-            if(gg in indv):
-                cc += 1
-        geneFreq[k] = cc
-    # === calculate MHC genes co-occurrence matrix ===
-    geneFreqMtx = np.zeros((N, N))
-    cooccMtx = np.zeros((N, N))
-    for i, one in enumerate(geneVec):
-        for j, two in enumerate(geneVec):
-            count = 0
-            for indv in hostList:
-                if(one in indv and two in indv):
-                    count += 1
-            cooccMtx[i, j] = count
-            geneFreqMtx[i, j] = np.max([geneFreq[i], geneFreq[j]])
-    # === return normalized co-occurrence matrix ===
-    return geneFreq, cooccMtx / geneFreqMtx
+    return geneCooccurrence(alleleIncidence(hostList)[1])
 
 
 def clusterAndPlotSimMtx(mtx, figgName="SimMatrix.png", figgNum=1,
@@ -209,14 +201,9 @@ def countAndPlotClonalIndiv(hostList, fracOfPop=0.2):
     TickSize = 9
     selectIndiv = int(fracOfPop * float(len(hostList)))
     ww = random.sample(hostList, selectIndiv)
-    ll = []
-    for i, itm in enumerate(ww):
-        count = 0
-        for j, itm2 in enumerate(ww):
-            if (np.array_equal(itm, itm2) and i != j):
-                count += 1
-        ll.append(count)
-    ll = np.array(ll, dtype=float)
+    # number of other sampled hosts with the same genotype
+    counts, hostClone = groupGenotypes(ww, ordered=True)[1:]
+    ll = np.array(counts[hostClone] - 1, dtype=float)
     cloneFreq = ll / float(len(ww))
     # === plot it ===
     plt.figure(3, figsize=(8, 5))  # , frameon=False, dpi=100)
@@ -243,9 +230,12 @@ def main():
         # === remove genetic rdundancy first ===
         hostList = hostsUniqueMHCs(hostList)
         # === calculate the stats ===
-        geneFreq, cooccMtx = calculateGeneCooccurrMatrix(hostList)
-        cloneList = createCloneList(hostList, "yes")
-        cloneSimMtx = calculateCloneSimMatrix(cloneList)
+        incidence = alleleIncidence(hostList)[1]
+        geneFreq, cooccMtx = geneCooccurrence(incidence)
+        # === the first host of every clone stands for the clone ===
+        hostClone = groupGenotypes(hostList)[2]
+        leaders = np.unique(hostClone, return_index=True)[1]
+        cloneSimMtx = cloneSimilarity(incidence[leaders], len(hostList[0]))
         clusterAndPlotSimMtx(cooccMtx, "CoocurrenceMatrix_genes.png", 1)
 #        plt.show()
         clusterAndPlotSimMtx(cloneSimMtx, "SimMatrix_clones.png", 1)
@@ -10,11 +10,13 @@ for Evolutionary Biology Group, Faculty of Biology
 @author: Piotr Bentkowski - bentkowski.piotr@gmail.com
 """
 import sys
-import re
 import json
 # import linecache as ln
 import numpy as np
 import matplotlib.pyplot as plt
+import genome_snapshot as gsnp
+import packed_bits as pbits
+import bit_similarity as bsim
 
 
 def hamming_distance(s1, s2):
@@ -24,6 +26,27 @@ def hamming_distance(s1, s2):
     return sum(ch1 != ch2 for ch1, ch2 in zip(s1, s2))
 
 
+def packGenes(BitLyst):
+    """Packs a list of gene bit strings into 64-bit words (see `packed_bits`)
+    for the `bit_similarity` kernels. Arrays, which are already packed (like
+    the `bit_gene` rows of a host snapshot), are returned unchanged."""
+    if isinstance(BitLyst, np.ndarray):
+        return BitLyst
+    BitLyst = list(BitLyst)
+    return pbits.packAscii(BitLyst, len(BitLyst[0]) if BitLyst else 0)
+
+
+def geneLength(BitLyst, bitLen=None):
+    """Number of bits of the genes: bitLen if given (e.g. `bit_length` of
+    the host snapshot, which packed genes need), otherwise the length of the
+    first bit string."""
+    if bitLen is not None:
+        return int(bitLen)
+    if isinstance(BitLyst, np.ndarray):
+        raise ValueError("geneLength(): give the length of packed genes.")
+    return len(BitLyst[0])
+
+
 def bitSimInRow(s1, s2, sim_measure):
     """Compares two bit string of the same length. They need to have a defined
     number of common bits IN A ROW to be called \"similar\"."""
@@ -42,21 +65,15 @@ def bitSimInRow(s1, s2, sim_measure):
         return False
 
 
-def bitSimWhinIndiv(BitLyst, sim_measure=7):
+def bitSimWhinIndiv(BitLyst, sim_measure=7, bitLen=None):
     """Calculates similarity between antigens within individual by comparing
-    each antigen pairwise with all the others."""
+    each antigen pairwise with all the others. For packed genes bitLen has
+    to be given, see geneLength()."""
     try:
-        N = len(BitLyst)
-        compArr = np.ones((N*(N-1))/2)
-        k = 0
-        for ii, itmOne in enumerate(BitLyst):
-            for jj in np.arange(ii+1, N, 1):
-                if bitSimInRow(itmOne, BitLyst[jj], sim_measure):
-                    compArr[k] = 1
-                else:
-                    compArr[k] = 0
-                k += 1
-        return np.mean(compArr)
+        SS = bsim.runSimilarityMatrix(packGenes(BitLyst), None,
+                                      geneLength(BitLyst, bitLen),
+                                      sim_measure)
+        return np.mean(SS[np.triu_indices(len(SS), 1)])
     except Exception:
         print("ERROR in anti_gen_similiraty.bitSimWhinIndiv():",
               "Can't load the data!")
@@ -64,32 +81,25 @@ def bitSimWhinIndiv(BitLyst, sim_measure=7):
 
 
 def hamDistWhinIndiv(BitLyst):
-    """Hamming distances between genes in one pathogen."""
+    """Hamming distances between genes in one pathogen. BitLyst is a list of
+    bit strings or an array of packed genes."""
     try:
-        N = len(BitLyst)
-        compArr = np.ones(int((N*(N-1))/2))
-        k = 0
-        for ii, itmOne in enumerate(BitLyst):
-            for jj in np.arange(ii+1, N, 1):
-                compArr[k] = hamming_distance(itmOne, BitLyst[jj])
-                k += 1
-        return compArr
+        return bsim.pairDistances(packGenes(BitLyst))
     except Exception:
         print("ERROR in anti_gen_similiraty.bitSimWhinIndiv():",
               "Can't load the data!")
         return np.NaN
 
 
-def bitSimBetweenIndv(indOne, indTwo, sim_measure=7):
+def bitSimBetweenIndv(indOne, indTwo, sim_measure=7, bitLen=None):
     """Takes two sets of antigens (two individual pathogens) and compares them
-    (antigen by antigen) according to their fit to MHC"""
+    (antigen by antigen) according to their fit to MHC. For packed genes
+    bitLen has to be given, see geneLength()."""
     try:
-        compArr = np.zeros(len(indOne))
-        for k, itmOne in enumerate(indOne):
-            for itmTwo in indTwo:
-                if bitSimInRow(itmOne, itmTwo, sim_measure):
-                    compArr[k] = 1.
-        return compArr
+        SS = bsim.runSimilarityMatrix(packGenes(indOne), packGenes(indTwo),
+                                      geneLength(indOne, bitLen),
+                                      sim_measure)
+        return SS.any(axis=1).astype(float)
     except Exception:
         print("ERROR in anti_gen_similiraty.bitSimBetweenIndv():",
               "Can't proccess the data!")
@@ -98,15 +108,11 @@ def bitSimBetweenIndv(indOne, indTwo, sim_measure=7):
 
 def hamDistBetweenIndv(indOne, indTwo):
     """Takes two sets of antigens (tow individual pathogens) and compares them
-    (antigen by antigen) according to Hamming distance."""
+    (antigen by antigen) according to Hamming distance. Returns the
+    distances of all len(indOne) * len(indTwo) pairs."""
     try:
-        compArr = np.zeros(len(indOne) * len(indTwo))
-        k = 0
-        for itmOne in indOne:
-            for itmTwo in indTwo:
-                compArr[k] = hamming_distance(itmOne, itmTwo)
-                k += 1
-        return compArr
+        return bsim.hammingMatrix(packGenes(indOne),
+                                  packGenes(indTwo)).ravel()
     except Exception:
         print("ERROR in anti_gen_similiraty.hamDistBetweenIndv():",
               "Can't proccess the data!")
@@ -117,46 +123,23 @@ def loadHostPopulation(FILE):
     '''Takes the file with all the hosts data loads it to a list. Each
     individual is loaded as a list of bit strings.And the population is a list
     of individuals.'''
-    LL = []
-    ll = []
-    nextHost = False
     try:
-        with open(FILE) as infile:
-            for line in infile:
-                if re.search(r"#", line):
-                    continue
-                elif re.search(r"===", line):
-                    if nextHost:
-                        LL.append(ll)
-                        ll = []
-                else:
-                    nextHost = True
-                    ll.append(line.split()[0])
-        LL.append(ll)
-#        print j + 1
-        return LL
+        snap = gsnp.loadHostSnapshot(FILE)
+        bitz = gsnp.bitGeneStrings(snap)
+        offs = snap['host_offsets']
+        return [bitz[offs[ii]:offs[ii+1]] for ii in range(len(offs) - 1)]
     except IOError as e:
         print("I/O error({0}) in".format(e.errno),
               "loadTheHostPopulation(): {0}".format(e.strerror))
 
 
 def loadPathoExposed(FILE):
-    """ """
-    LL = []
+    """Loads the species of the pathogens presented by each host from the
+    headers of the host snapshot FILE. Returns a list with one integer array
+    per host."""
     try:
-        with open(FILE) as infile:
-            for line in infile:
-                if re.search(r"#", line):
-                    continue
-                elif re.search(r"===", line):
-                    ll = line.split()
-                    if int(ll[7]) > 0:
-                        LL.append(ll[11:-1])
-                    else:
-                        LL.append([])
-                else:
-                    continue
-        return LL
+        snap = gsnp.loadHostSnapshot(FILE)
+        return gsnp.presentedPerHost(snap)
     except IOError as e:
         print("I/O error({0}) in".format(e.errno),
               "loadPathoExposed(): {0}".format(e.strerror))
@@ -237,6 +220,44 @@ def hamDistInterIndv(Popul):
     return compArr
 
 
+def hamDistWhinHostAll(snap):
+    """Mean Hamming distances between the genes of each host, for all the
+    hosts of a host snapshot at once (what hamDisthistAll() gives for the
+    list of hosts)."""
+    return bsim.withinGroupMeans(snap['bit_gene'], snap['host_offsets'])
+
+
+def hamDistInterIndvAll(snap, bins=50):
+    """Exact version of hamDistInterIndv(): histogram of the mean Hamming
+    distances between the genes of two hosts, over every pair of hosts of a
+    host snapshot. Returns a tuple `(counts, edges)` like
+    `numpy.histogram()`, over `bins` equal bins from 0 to the gene length."""
+    edges = np.linspace(0., snap['bit_length'], bins + 1)
+    return (bsim.betweenGroupMeanHistogram(snap['bit_gene'],
+                                           snap['host_offsets'], edges),
+            edges)
+
+
+def bitSimWhinHostAll(snap, simm=7):
+    """Fraction of similar pairs of genes (bitSimInRow() criterion) within
+    each host, for all the hosts of a host snapshot at once (what bitSimAll()
+    gives for the list of hosts)."""
+    SS, group = bsim.withinGroupRuns(snap['bit_gene'], snap['host_offsets'],
+                                     snap['bit_length'], simm)
+    nHosts = gsnp.numberOfHosts(snap)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return (np.bincount(group, weights=SS, minlength=nHosts) /
+                np.bincount(group, minlength=nHosts))
+
+
+def bitSimInterIndvAll(snap, simms=7):
+    """Exact version of bitSimInterIndv(): what bitSimBetweenIndv() averages
+    for every ordered pair of distinct hosts of a host snapshot."""
+    MM = bsim.groupMatchFractions(snap['bit_gene'], snap['host_offsets'],
+                                  bitLen=snap['bit_length'], runLen=simms)
+    return MM[~np.eye(len(MM), dtype=bool)]
+
+
 def main():
     if len(sys.argv) <= 2:
         print("Give the names of two files with data. One at the begging of",
@@ -255,34 +276,33 @@ def main():
         print("Can't find parameter file! You may be in a wrong directory.")
         sys.exit()
     try:
-        L_init = loadHostPopulation(sys.argv[1])
+        L_init = gsnp.loadHostSnapshot(sys.argv[1])
         print("First file loaded!")
     except Exception:
         print("Can't load file named", sys.argv[1], ". Check if it exists.")
         sys.exit()
     try:
-        L_endd = loadHostPopulation(sys.argv[2])
+        L_endd = gsnp.loadHostSnapshot(sys.argv[2])
         print("Second file loaded!")
     except Exception:
         print("Can't load file named", sys.argv[2], ". Check if it exists.")
         sys.exit()
-#    F_init = bitSimAll(L_init, bitfit)
-    F_init = hamDisthistAll(L_init)
+#    F_init = bitSimWhinHostAll(L_init, bitfit)
+    F_init = hamDistWhinHostAll(L_init)
     F_init = F_init[~np.isnan(F_init)]
     print("Within genome similarities in the First file have been calculated!")
-#    F_endd = bitSimAll(L_endd, bitfit)
-    F_endd = hamDisthistAll(L_endd)
+#    F_endd = bitSimWhinHostAll(L_endd, bitfit)
+    F_endd = hamDistWhinHostAll(L_endd)
     F_endd = F_endd[~np.isnan(F_endd)]
     print("Within genome similarities in the Second file have been" +
           " calculated!")
-#    E_init = bitSimInterIndv(L_init, bitfit)
-    E_init = hamDistInterIndv(L_init)
-    E_init = E_init[~np.isnan(E_init)]
+#    E_init = bitSimInterIndvAll(L_init, bitfit)
+    # all pairs of hosts are compared, not a random sample of them
+    E_init, B_init = hamDistInterIndvAll(L_init)
     print("Between individual similarities in the First file have",
           "been calculated!")
-#    E_endd = bitSimInterIndv(L_endd, bitfit)
-    E_endd = hamDistInterIndv(L_endd)
-    E_endd = E_endd[~np.isnan(E_endd)]
+#    E_endd = bitSimInterIndvAll(L_endd, bitfit)
+    E_endd, B_endd = hamDistInterIndvAll(L_endd)
     print("Between individual similarities in the Second file have",
           "been calculated!")
     # === More generic plot ===
@@ -312,7 +332,8 @@ def main():
     #  === Now the detailed plot! ===
     plt.figure(2, figsize=(16, 8))
     plt.subplot(121)
-    plt.hist(E_init, color=(0.3, 0.3, 0.3, transs), edgecolor="none")
+    plt.hist(B_init[:-1], B_init, weights=E_init,
+             color=(0.3, 0.3, 0.3, transs), edgecolor="none")
     plt.title("Start of simulation", fontsize=T_label)
     plt.xlabel("Inter-individual similarity measure", fontsize=ax_label)
     plt.ylabel("Frequency of occurrence", fontsize=ax_label)
@@ -322,7 +343,8 @@ def main():
     plt.xlim(0, MHC_len)
 #    plt.ylim(ymax=200)
     plt.subplot(122)
-    plt.hist(E_endd, color=(0.3, 0.3, 0.3, transs), edgecolor="none")
+    plt.hist(B_endd[:-1], B_endd, weights=E_endd,
+             color=(0.3, 0.3, 0.3, transs), edgecolor="none")
     plt.title("End of simulation", fontsize=T_label)
     plt.xlabel("Inter-individual similarity measure", fontsize=ax_label)
     plt.xticks(fontsize=TicksFS)
@@ -17,7 +17,8 @@ for Evolutionary Biology Group, Faculty of Biology
 import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.animation as animation
-import n
+import generation_arrays as ga
+import compressed_files as cfs
 
 # This variable sets that every Nth row is used for plotting
 # thanks to that we get a speedy animation.
@@ -37,9 +38,11 @@ plt.rc('xtick', labelsize=TickSize)
 plt.rc('ytick', labelsize=TickSize)
 
 
-genMeans = np.genfromtxt("HostGeneNumbTotal_ChrOne.csv")
-mhcMeans = np.genfromtxt("HostMHCsNumbUniq_ChrOne.csv")
-GenerData = np.genfromtxt("HostsGeneDivers.csv")
+# time column is dropped, rows are memory-mapped from the binary cache
+genMeans = ga.loadGenerationFile("HostGeneNumbTotal_ChrOne.csv")[1]
+mhcMeans = ga.loadGenerationFile("HostMHCsNumbUniq_ChrOne.csv")[1]
+with cfs.openFile("HostsGeneDivers.csv") as f:
+    GenerData = np.genfromtxt(f)
 print("Done loading data files!")
 
 # --- trimming rows ---
@@ -83,9 +86,9 @@ def animate(i):
     ax2.axis([-1.0, 1.0, 0, 1.0])
     ax2.set_xlabel('number of genes per chromosome', fontsize=FontSize)
     ax2.set_ylabel('number of occurrences', fontsize=FontSize)
-    plt.hist(genMeans[i, 1::], bins=binz, color=(0.3, 0.3, 0.3, 1.0),
+    plt.hist(genMeans[i, :], bins=binz, color=(0.3, 0.3, 0.3, 1.0),
              edgecolor="none")
-    plt.hist(mhcMeans[i, 1::], bins=binz, color=(0.8, 0.0, 0.0, 1.0),
+    plt.hist(mhcMeans[i, :], bins=binz, color=(0.8, 0.0, 0.0, 1.0),
              edgecolor="none")
     plt.vlines(100, 0, MAYY, color="b", lw=2)
     plt.ylim(ymax=MAYY)
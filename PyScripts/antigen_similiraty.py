@@ -14,9 +14,12 @@ for Evolutionary Biology Group, Faculty of Biology
 import sys
 import re
 import json
-import linecache as ln
 import numpy as np
 import matplotlib.pyplot as plt
+import genome_snapshot as gsnp
+import compressed_files as cfs
+import packed_bits as pbits
+import bit_similarity as bsim
 # from bitstring import BitArray
 
 cloneType = np.dtype([("cloneTag", np.int64), ('numbOfIndv', np.float)])
@@ -29,6 +32,28 @@ def hamming_distance(s1, s2):
     return sum(ch1 != ch2 for ch1, ch2 in zip(s1, s2))
 
 
+def packAntigens(BitLyst):
+    """Packs a list of antigen bit strings into 64-bit words (see
+    `packed_bits`) for the `bit_similarity` kernels. Arrays, which are
+    already packed, are returned unchanged."""
+    if isinstance(BitLyst, np.ndarray):
+        return BitLyst
+    BitLyst = list(BitLyst)
+    return pbits.packAscii(BitLyst, len(BitLyst[0]) if BitLyst else 0)
+
+
+def antigenLength(BitLyst, bitLen=None):
+    """Number of bits of the antigens: bitLen if given (e.g.
+    `antigen_length` of the pathogen snapshot, which packed antigens need),
+    otherwise the length of the first bit string."""
+    if bitLen is not None:
+        return int(bitLen)
+    if isinstance(BitLyst, np.ndarray):
+        raise ValueError("antigenLength(): give the length of packed"
+                         " antigens.")
+    return len(BitLyst[0])
+
+
 def bitSimInRow(s1, s2, sim_measure):
     """Compares two bit string of the same length. They need to have a defined
     number of common bits IN A ROW to be called \"similar\"."""
@@ -47,21 +72,15 @@ def bitSimInRow(s1, s2, sim_measure):
         return False
 
 
-def bitSimWhinIndiv(BitLyst, sim_measure=7):
+def bitSimWhinIndiv(BitLyst, sim_measure=7, bitLen=None):
     """Calculates similarity between antigens within individual by comparing
-    each antigen pairwise with all the others."""
+    each antigen pairwise with all the others. For packed antigens bitLen
+    has to be given, see antigenLength()."""
     try:
-        N = len(BitLyst)
-        compArr = np.ones((N*(N-1))/2)
-        k = 0
-        for ii, itmOne in enumerate(BitLyst):
-            for jj in np.arange(ii+1, N, 1):
-                if bitSimInRow(itmOne, BitLyst[jj], sim_measure):
-                    compArr[k] = 1
-                else:
-                    compArr[k] = 0
-                k += 1
-        return np.mean(compArr)
+        SS = bsim.runSimilarityMatrix(packAntigens(BitLyst), None,
+                                      antigenLength(BitLyst, bitLen),
+                                      sim_measure)
+        return np.mean(SS[np.triu_indices(len(SS), 1)])
     except Exception:
         print("ERROR in anti_gen_similiraty.bitSimWhinIndiv():" +
               "Can't load the data!")
@@ -69,32 +88,26 @@ def bitSimWhinIndiv(BitLyst, sim_measure=7):
 
 
 def hamDistWhinIndiv(BitLyst):
-    """Hamming distances between genes in one pathogen."""
+    """Hamming distances between genes in one pathogen. BitLyst is a list of
+    bit strings or an array of packed antigens."""
     try:
-        N = len(BitLyst)
-        compArr = np.ones((N*(N-1))/2)
-        k = 0
-        for ii, itmOne in enumerate(BitLyst):
-            for jj in np.arange(ii+1, N, 1):
-                compArr[k] = hamming_distance(itmOne, BitLyst[jj])
-                k += 1
-        return compArr
+        return bsim.pairDistances(packAntigens(BitLyst))
     except Exception:
         print("ERROR in anti_gen_similiraty.bitSimWhinIndiv():" +
               "Can't load the data!")
         return np.NaN
 
 
-def bitSimBetweenIndv(indOne, indTwo, sim_measure=16):
+def bitSimBetweenIndv(indOne, indTwo, sim_measure=16, bitLen=None):
     """Takes two sets of antigens (two individual pathogens) and compares them
-    (antigen by antigen) according to their fit to MHC"""
+    (antigen by antigen) according to their fit to MHC. For packed antigens
+    bitLen has to be given, see antigenLength()."""
     try:
-        compArr = np.zeros(len(indOne))
-        for k, itmOne in enumerate(indOne):
-            for itmTwo in indTwo:
-                if bitSimInRow(itmOne, itmTwo, sim_measure):
-                    compArr[k] = 1.
-        return compArr
+        SS = bsim.runSimilarityMatrix(packAntigens(indOne),
+                                      packAntigens(indTwo),
+                                      antigenLength(indOne, bitLen),
+                                      sim_measure)
+        return SS.any(axis=1).astype(float)
     except Exception:
         print("ERROR in anti_gen_similiraty.bitSimBetweenIndv():" +
               "Can't proccess the data!")
@@ -103,15 +116,11 @@ def bitSimBetweenIndv(indOne, indTwo, sim_measure=16):
 
 def hamDistBetweenIndv(indOne, indTwo):
     """Takes two sets of antigens (two individual pathogens) and compares them
-    (antigen by antigen) according to Hamming distance."""
+    (antigen by antigen) according to Hamming distance. Returns the
+    distances of all len(indOne) * len(indTwo) pairs."""
     try:
-        compArr = np.zeros(len(indOne) * len(indTwo))
-        k = 0
-        for itmOne in indOne:
-            for itmTwo in indTwo:
-                compArr[k] = hamming_distance(itmOne, itmTwo)
-                k += 1
-        return compArr
+        return bsim.hammingMatrix(packAntigens(indOne),
+                                  packAntigens(indTwo)).ravel()
     except Exception:
         print("ERROR in anti_gen_similiraty.hamDistBetweenIndv():" +
               "Can't proccess the data!")
@@ -123,98 +132,23 @@ def loadThePopulationBitstrings(FILE):
     the population into species and individuals. Each individual is loaded as
     a list of bit strings. Each species is a list of individuals. And the
     population is a list of species lists.'''
-    LL = []
-    spp_list = []
-    nextPatho = False
-    endOfSpp = False
-    ll = []
-    lp = re.split(" ", ln.getline(FILE, 3))
-    old_spec = int(lp[5])
     try:
-        with open(FILE) as infile:
-            for j, line in enumerate(infile):
-                if re.search(r"#", line):
-                    continue
-                elif re.search(r"===", line):
-                    try:
-                        new_spec = int(line.split()[4])
-                    except Exception:
-                        pass
-                    if nextPatho:
-                        if new_spec == old_spec:
-                            spp_list.append(ll)
-                            ll = []
-                            endOfSpp = False
-                        else:
-                            if endOfSpp:
-                                LL.append(spp_list)
-                                spp_list = []
-                                spp_list.append(ll)
-                                ll = []
-                                old_spec = new_spec
-#                                print j + 1
-                            else:
-                                spp_list.append(ll)
-                                ll = []
-                            endOfSpp = True
-                    nextPatho = True
-                else:
-                    ll.append(line.split()[0][::-1])
-        spp_list.append(ll)
-        LL.append(spp_list)
-#        print j + 1
-        return LL
+        snap = gsnp.loadPathoSnapshot(FILE)
+        return gsnp.splitPerSpecies(snap, gsnp.antigenStrings(snap, True))
     except IOError as e:
         print("I/O error({0}) in".format(e.errno) +
-              " loadTheHostPopulation(): {0}".format(e.strerror))
+              " loadThePopulationBitstrings(): {0}".format(e.strerror))
 
 
 def loadIndvPathoTags(FILE):
-    """ """
-    LL = []
-    spp_list = []
-    nextPatho = False
-    endOfSpp = False
-    ll = []
-    lp = re.split(" ", ln.getline(FILE, 3))
-    old_spec = int(lp[5])
+    """Same as loadThePopulationBitstrings(), only each individual is a list
+    of its antigens' tags."""
     try:
-        with open(FILE) as infile:
-            for j, line in enumerate(infile):
-                if re.search(r"#", line):
-                    continue
-                elif re.search(r"===", line):
-                    try:
-                        new_spec = int(line.split()[4])
-                    except Exception:
-                        pass
-                    if nextPatho:
-                        if new_spec == old_spec:
-                            spp_list.append(ll)
-                            ll = []
-                            endOfSpp = False
-                        else:
-                            if endOfSpp:
-                                LL.append(spp_list)
-                                spp_list = []
-                                spp_list.append(ll)
-                                ll = []
-                                old_spec = new_spec
-#                                print j + 1
-                            else:
-                                spp_list.append(ll)
-                                ll = []
-                            endOfSpp = True
-                    nextPatho = True
-                else:
-                    ll.append(np.int64(line.split()[3]))
-        spp_list.append(ll)
-        LL.append(spp_list)
-#        print j + 1
-        return LL
+        snap = gsnp.loadPathoSnapshot(FILE)
+        return gsnp.splitPerSpecies(snap, snap['antigen_tag'])
     except IOError as e:
         print("I/O error({0}) in".format(e.errno) +
-              " loadTheHostPopulation(): {0}".format(e.strerror))
+              " loadIndvPathoTags(): {0}".format(e.strerror))
 
 
 def bitSimAll(Popul, simmes=7):
@@ -311,12 +245,140 @@ def hamDistInterSpecies(Popul):
     return CMP
 
 
+def speciesAntigens(snap, sp):
+    """Packed antigens of the sp-th species of a pathogen snapshot and the
+    offsets of its individuals into them."""
+    first, last = gsnp.speciesAntigenRange(snap, sp)
+    sppOffs = snap['species_offsets']
+    offs = snap['indv_offsets'][sppOffs[sp]:sppOffs[sp+1]+1] - first
+    return snap['antigen_words'][first:last], offs
+
+
+def hamDistWhinIndivAll(snap):
+    """Mean Hamming distances between the antigens of each individual, for
+    all the individuals of a pathogen snapshot at once (what
+    hamDisthistAll() gives for the nested lists)."""
+    return bsim.withinGroupMeans(snap['antigen_words'], snap['indv_offsets'])
+
+
+def hamDistInsideSpecAll(snap, sp, bins=50):
+    """Exact version of hamDistInsideSpec(): histogram of the mean Hamming
+    distances between the antigens of two individuals, over every pair of
+    individuals of the sp-th species of a pathogen snapshot. Returns a tuple
+    `(counts, edges)` like `numpy.histogram()`, over `bins` equal bins from 0
+    to the antigen length."""
+    words, offs = speciesAntigens(snap, sp)
+    edges = np.linspace(0., snap['antigen_length'], bins + 1)
+    return bsim.betweenGroupMeanHistogram(words, offs, edges), edges
+
+
+def hamDistInterSpeciesAll(snap):
+    """Exact version of hamDistInterSpecies() for every pair of species, in
+    the order (0, 1), (0, 2) ... (1, 2) ... Returns a tuple `(means,
+    counts)`: the mean over all pairs of individuals from the two species of
+    the mean Hamming distance between their antigens, and a pairs x
+    (antigen length + 1) array with the histograms of the distances between
+    the antigens of the two species. The individuals are compared in tiles
+    (see `bit_similarity.groupMeanBlocks()`) summed up on the fly, so the
+    individuals x individuals matrices are never kept."""
+    bitLen = int(snap['antigen_length'])
+    nSpp = len(snap['species_offsets']) - 1
+    means = []
+    counts = []
+    for ii in range(nSpp):
+        wordsOne, offsOne = speciesAntigens(snap, ii)
+        for jj in range(ii+1, nSpp):
+            wordsTwo, offsTwo = speciesAntigens(snap, jj)
+            total = 0.
+            pairs = 0
+            hist = np.zeros(bitLen + 1, dtype=np.int64)
+            for gg, MM, DD in bsim.groupMeanBlocks(wordsOne, offsOne,
+                                                   wordsTwo, offsTwo):
+                total += np.nansum(MM)
+                pairs += np.count_nonzero(~np.isnan(MM))
+                hist += np.bincount(DD.ravel(), minlength=bitLen + 1)
+            means.append(total / pairs if pairs else np.nan)
+            counts.append(hist)
+    return (np.array(means),
+            np.array(counts, dtype=np.int64).reshape(len(means), bitLen + 1))
+
+
+def bitSimWhinIndivAll(snap, sim_measure=7):
+    """Fraction of similar pairs of antigens (bitSimInRow() criterion) within
+    each individual, for all the individuals of a pathogen snapshot at once
+    (what bitSimAll() gives for the nested lists)."""
+    SS, group = bsim.withinGroupRuns(snap['antigen_words'],
+                                     snap['indv_offsets'],
+                                     snap['antigen_length'], sim_measure)
+    nIndv = len(snap['indv_offsets']) - 1
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return (np.bincount(group, weights=SS, minlength=nIndv) /
+                np.bincount(group, minlength=nIndv))
+
+
+def bitSimInsideSpecAll(snap, sp, simm=7):
+    """Exact version of bitSimInsideSpec(): what bitSimBetweenIndv() averages
+    for every ordered pair of distinct individuals of the sp-th species of a
+    pathogen snapshot."""
+    words, offs = speciesAntigens(snap, sp)
+    MM = bsim.groupMatchFractions(words, offs, bitLen=snap['antigen_length'],
+                                  runLen=simm)
+    return MM[~np.eye(len(MM), dtype=bool)]
+
+
+def bitSimInterSpecAll(snap, simm=16):
+    """Exact version of bitSimInterSpec() for every pair of species, in the
+    order (0, 1), (0, 2) ... (1, 2) ... Returns an array with the mean, over
+    all pairs of individuals from the two species, of what
+    bitSimBetweenIndv() averages. The individuals are compared in tiles (see
+    `bit_similarity.groupMatchBlocks()`) summed up on the fly, so the
+    individuals x individuals matrices are never kept; longestRunHistSpecies()
+    gives the distribution of the runs behind the criterion."""
+    nSpp = len(snap['species_offsets']) - 1
+    means = []
+    for ii in range(nSpp):
+        wordsOne, offsOne = speciesAntigens(snap, ii)
+        for jj in range(ii+1, nSpp):
+            wordsTwo, offsTwo = speciesAntigens(snap, jj)
+            total = 0.
+            pairs = 0
+            for gg, MM in bsim.groupMatchBlocks(wordsOne, offsOne, wordsTwo,
+                                                offsTwo,
+                                                snap['antigen_length'],
+                                                simm):
+                total += np.nansum(MM)
+                pairs += np.count_nonzero(~np.isnan(MM))
+            means.append(total / pairs if pairs else np.nan)
+    return np.array(means)
+
+
+def longestRunHistSpecies(snap, sp):
+    """Exact distribution of the longest runs of agreeing bits (the measure
+    bitSimInRow() compares with its threshold) over all pairs of antigens of
+    the sp-th species of a pathogen snapshot. Returns the counts of the run
+    lengths 0 ... antigen length."""
+    words = speciesAntigens(snap, sp)[0]
+    return bsim.longestRunHistogram(words, None, snap['antigen_length'])
+
+
+def hamDistHistSpecies(snap, sp):
+    """Exact histograms of the Hamming distances between antigens of the
+    sp-th species of a pathogen snapshot. Returns a tuple of counts of the
+    distances 0 ... antigen length: between the antigens within individuals
+    and between the antigens of different individuals."""
+    words, offs = speciesAntigens(snap, sp)
+    bitLen = int(snap['antigen_length'])
+    DD = bsim.withinGroupDistances(words, offs)[0]
+    return (np.bincount(DD, minlength=bitLen+1),
+            bsim.betweenGroupHistogram(words, offs, bitLen))
+
+
 def loadNoMutSet(FILE):
     """When fed with file NoMutationInPathoList.csv it loads the 'no mutation'
     set for different pathogen species. """
     LL = []
     try:
-        with open(FILE) as infile:
+        with cfs.openFile(FILE) as infile:
             for line in infile:
                 if re.search("#", line):
                     pass
@@ -363,40 +425,68 @@ def checkNoMutationPositions(noMutt, antigenList, k, j):
         print("\nNo difference whatsoever between individuals")
 
 
+def groupClones(keys):
+    """Groups individuals by a hashable key (e.g. the tuple or the bytes of
+    their antigens) in one pass. Returns a tuple `(cloneSize, leader)`: the
+    number of individuals of every clone and the index of its first
+    individual, with the clones in the order they first appear."""
+    ids = {}
+    cloneId = np.array([ids.setdefault(kk, len(ids)) for kk in keys],
+                       dtype=np.int64)
+    leader = np.zeros(len(ids), dtype=np.int64)
+    # written backwards, so the first individual of a clone is left
+    leader[cloneId[::-1]] = np.arange(len(cloneId))[::-1]
+    return np.bincount(cloneId, minlength=len(ids)), leader
+
+
+def cloneTable(cloneSize, cloneTag):
+    """Array of cloneType with the clones sorted from the biggest one, the
+    way countClonesInSpeciesFromTags() returns them."""
+    clones = np.zeros(len(cloneSize), dtype=cloneType)
+    clones['cloneTag'] = cloneTag
+    clones['numbOfIndv'] = cloneSize
+    return np.sort(clones, order=['numbOfIndv'])[::-1]
+
+
 def countClonesInSpeciesFromBitstrings(oneSpeciesList):
-    """ """
-    nn = len(oneSpeciesList)
-    clones = np.zeros(nn)
-    checked = []
-    for i, indvOne in enumerate(oneSpeciesList):
-        if i not in checked:
-            clones[i] += 1
-            for j in range(i+1, nn):
-                if(j not in checked and
-                   hamDistBetweenIndv(indvOne, oneSpeciesList[j])[0] == 0):
-                    clones[i] += 1
-                    checked.append(j)
-            checked.append(i)
-    clones.sort()
-    return clones[::-1]
+    """Sizes of the clones (individuals with identical antigens) of a species
+    given as a list of individuals, each a list of bit strings. Returns an
+    array of len(oneSpeciesList) with the sizes sorted from the biggest
+    clone and zeros after the last clone."""
+    clones = np.zeros(len(oneSpeciesList))
+    cloneSize = groupClones(tuple(indv) for indv in oneSpeciesList)[0]
+    clones[:len(cloneSize)] = np.sort(cloneSize)[::-1]
+    return clones
 
 
 def countClonesInSpeciesFromTags(oneSpListTags):
-    """ """
-    nn = len(oneSpListTags)
-    clones = np.zeros(nn, dtype=cloneType)
-    checked = []
-    for i, indvOne in enumerate(oneSpListTags):
-        if i not in checked:
-            clones["cloneTag"][i] = np.int64(indvOne[0])
-            clones['numbOfIndv'][i] += 1.
-            for j in range(i+1, nn):
-                if(j not in checked and indvOne == oneSpListTags[j]):
-                    clones['numbOfIndv'][i] += 1.
-                    checked.append(j)
-            checked.append(i)
-    clones = clones[clones["numbOfIndv"] > 0]
-    return np.sort(clones, order=['numbOfIndv'])[::-1]
+    """Clones of a species given as a list of individuals, each a list of
+    its antigens' tags. Returns an array of cloneType: the tag of the first
+    antigen of each clone and its number of individuals, from the biggest
+    clone."""
+    cloneSize, leader = groupClones(tuple(indv) for indv in oneSpListTags)
+    cloneTag = [oneSpListTags[ii][0] for ii in leader]
+    return cloneTable(cloneSize, np.array(cloneTag, dtype=np.int64))
+
+
+def countClonesAll(snap, fromBits=False):
+    """Counts the clones in all the species of a pathogen snapshot at once.
+    Individuals are grouped by the bytes of their antigens' tags (or of
+    their packed antigens with fromBits), so it takes linear time. Returns a
+    list with an array of cloneType per species, like
+    countClonesInSpeciesFromTags()."""
+    data = np.ascontiguousarray(snap['antigen_words' if fromBits
+                                     else 'antigen_tag'])
+    offs = snap['indv_offsets']
+    sppOffs = snap['species_offsets']
+    LL = []
+    for sp in range(len(sppOffs) - 1):
+        indvs = range(sppOffs[sp], sppOffs[sp+1])
+        cloneSize, leader = groupClones(data[offs[ii]:offs[ii+1]].tobytes()
+                                        for ii in indvs)
+        cloneTag = snap['antigen_tag'][offs[leader + sppOffs[sp]]]
+        LL.append(cloneTable(cloneSize, cloneTag))
+    return LL
 
 
 def plotCloneCount(cloneCountArr, maxRange=-1, totPopSize=-1):
@@ -442,27 +532,27 @@ def main():
         print("Can't load the param file! You may be in a wrong directory.")
         sys.exit()
     try:
-        L_init = loadThePopulationBitstrings(sys.argv[1])
+        snapInit = gsnp.loadPathoSnapshot(sys.argv[1])
         print("First file loaded!")
     except Exception:
         print("Can't load file named " + str(sys.argv[1]) +
               ". Check if it exists.")
         sys.exit()
     try:
-        L_endd = loadThePopulationBitstrings(sys.argv[2])
-        cloneList = loadIndvPathoTags(sys.argv[2])
+        snapEndd = gsnp.loadPathoSnapshot(sys.argv[2])
         print("Second file loaded!")
     except Exception:
         print("Can't load file named" + str(sys.argv[2]) +
               ". Check if it exists.")
         sys.exit()
-    F_init = hamDistInterSpecies(L_init)
+    # all pairs of individuals are compared, not a random sample of them
+    F_init, H_init = hamDistInterSpeciesAll(snapInit)
     print("Similarities in the First file have been calculated!")
-    F_endd = hamDistInterSpecies(L_endd)
+    F_endd, H_endd = hamDistInterSpeciesAll(snapEndd)
     print("Similarities in the Second file have been calculated!")
-    clonez = countClonesInSpeciesFromTags(cloneList[0])
+    clonez = countClonesAll(snapEndd)[0]
     np.savetxt("cloneFreq.csv", clonez, fmt='%i')
-    plotCloneCount(clonez["numbOfIndv"], 25, len(cloneList[0]))
+    plotCloneCount(clonez["numbOfIndv"], 25, np.sum(clonez["numbOfIndv"]))
     print("Clonal variability of first pathogen population calculated!")
     # === More generic plot ===
     ax_label = 20
@@ -471,10 +561,7 @@ def main():
     transs = 0.8
     plt.figure(1, figsize=(16, 8))
     plt.subplot(121)
-    xx = np.zeros(len(F_init))
-    for ii, itm in enumerate(F_init):
-        xx[ii] = np.mean(itm)
-    plt.hist(xx, color=(0.3, 0.3, 0.3, transs), edgecolor="none")
+    plt.hist(F_init, color=(0.3, 0.3, 0.3, transs), edgecolor="none")
     plt.title("Start of simulation", fontsize=T_label)
     plt.xlabel("Inter-species similarity measure", fontsize=ax_label)
     plt.ylabel("Frequency of occurrence", fontsize=ax_label)
@@ -483,10 +570,7 @@ def main():
     plt.grid(True)
 #    plt.xlim(0., 1.)
     plt.subplot(122)
-    xx = np.zeros(len(F_endd))
-    for ii, itm in enumerate(F_endd):
-        xx[ii] = np.mean(itm)
-    plt.hist(xx, color=(0.3, 0.3, 0.3, transs), edgecolor="none")
+    plt.hist(F_endd, color=(0.3, 0.3, 0.3, transs), edgecolor="none")
     plt.title("End of simulation", fontsize=T_label)
     plt.xlabel("Inter-species similarity measure", fontsize=ax_label)
     plt.xticks(fontsize=TicksFS)
@@ -498,7 +582,9 @@ def main():
     #  === Now the detailed plot! ===
     plt.figure(2, figsize=(16, 8))
     plt.subplot(121)
-    plt.hist(F_init, edgecolor="none")
+    # distances between the antigens of all pairs of species
+    plt.bar(np.arange(H_init.shape[1]), H_init.sum(axis=0), width=1.,
+            color=(0.3, 0.3, 0.3, transs), edgecolor="none")
     plt.title("Start of simulation", fontsize=T_label)
     plt.xlabel("Inter-species similarity measure", fontsize=ax_label)
     plt.ylabel("Frequency of occurrence", fontsize=ax_label)
@@ -508,7 +594,8 @@ def main():
 #    plt.xlim(0., 1.)
 #    plt.ylim(ymax=200)
     plt.subplot(122)
-    plt.hist(F_endd, edgecolor="none")
+    plt.bar(np.arange(H_endd.shape[1]), H_endd.sum(axis=0), width=1.,
+            color=(0.3, 0.3, 0.3, transs), edgecolor="none")
     plt.title("End of simulation", fontsize=T_label)
     plt.xlabel("Inter-species similarity measure", fontsize=ax_label)
     plt.xticks(fontsize=TicksFS)
@@ -525,7 +612,8 @@ def main():
     TicksFS_2 = 11
     for ii in range(spp_num):
         plt.subplot(divv, divv, ii+1)
-        plt.hist(hamDistInsideSpec(L_endd[ii], 15000),
+        counts, edges = hamDistInsideSpecAll(snapEndd, ii)
+        plt.hist(edges[:-1], edges, weights=counts,
                  color=(0.3, 0.3, 0.3, transs),  edgecolor="none")
         plt.xlabel("Within-species similarity measure", fontsize=ax_label_2)
         plt.ylabel("Frequency of occurrence", fontsize=ax_label_2)
@@ -538,7 +626,8 @@ def main():
     ax_label_2 = 10
     for ii in range(spp_num):
         plt.subplot(divv, divv, ii+1)
-        plt.hist(hamDistInsideSpec(L_init[ii], 15000),
+        counts, edges = hamDistInsideSpecAll(snapInit, ii)
+        plt.hist(edges[:-1], edges, weights=counts,
                  color=(0.3, 0.3, 0.3, transs), edgecolor="none")
         plt.xlabel("Within-species similarity measure", fontsize=ax_label_2)
         plt.ylabel("Frequency of occurrence", fontsize=ax_label_2)
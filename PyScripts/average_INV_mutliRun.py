@@ -8,6 +8,11 @@ simulation time. One of the parameters which in the template file is
 tagged "VAR" will be used to label (and aggregate) lines of mean INV
 for a boundle of runs with same parametrisation.
 
+The per-generation mean INV (with its variance and quantiles) of every run is
+computed in-process from the binary generation array of
+NumberOfMhcBeforeMating.csv (see `generation_arrays`), in worker processes,
+and cached in MeanInvdMhcNumb.npz next to it until the file changes.
+
 Created on Sun Jul 21 15:07:56 2019
 
 @author: Piotr Bentkowski - bentkowski.piotr@gmail.com
@@ -15,29 +20,130 @@ Created on Sun Jul 21 15:07:56 2019
 import os
 import sys
 import json
+import tempfile
+import multiprocessing as mp
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
-import subprocess as subp
 
 import packed_plots_of_MHC_alleles as ppma
+import run_catalog as rcat
+import genome_snapshot as gsnp
+import generation_arrays as ga
 
 
-def awkMeanINV(path='.'):
-    """ """
-#    inFile = os.path.join(path, "NumberOfMhcAfterMating.csv")
-    inFile = os.path.join(path, "NumberOfMhcBeforeMating.csv")
-    outFile = os.path.join(path, "MeanInvdMhcNumb.csv")
-    awk = """awk 'NR==1 { next }
-               { T=0
-                  for(N=2; N<=NF; N++) T+=$N;
-                  T/=(NF-1)
-                  print $1, T }' """ + inFile + " > " + outFile
-    subp.check_output(awk, shell=True)
+# inFile = "NumberOfMhcAfterMating.csv"
+INV_FILE = "NumberOfMhcBeforeMating.csv"
+STATS_FILE = "MeanInvdMhcNumb.npz"
+STATS_KIND = 'inv_stats'
+# Quantiles of INV computed for every generation.
+QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+# Number of generation x host cells processed at once.
+BLOCK_CELLS = 2**24
+
+
+def rowStats(data, quantiles=QUANTILES):
+    """Mean, variance and quantiles of every row (generation) of a
+    generation x host array, reading it in blocks of rows, so a
+    memory-mapped array is read once and never copied whole. Returns a
+    tuple `(mean, var, qq)`, qq with one column per quantile."""
+    nRows, nCols = data.shape
+    mean = np.zeros(nRows)
+    var = np.zeros(nRows)
+    qq = np.zeros((nRows, len(quantiles)))
+    step = max(1, BLOCK_CELLS // max(1, nCols))
+    for start in range(0, nRows, step):
+        block = np.asarray(data[start:start+step], dtype=float)
+        mean[start:start+step] = block.mean(axis=1)
+        var[start:start+step] = block.var(axis=1)
+        if len(quantiles):
+            qq[start:start+step] = np.percentile(
+                block, 100. * np.asarray(quantiles), axis=1).T
+    return mean, var, qq
+
+
+def statsCacheKey(inFile, quantiles=QUANTILES):
+    """Key of the cached statistics: the version of the source file (see
+    `genome_snapshot.cacheKey()`) and the quantiles."""
+    key = gsnp.cacheKey(inFile, STATS_KIND)
+    key['quantiles'] = [float(qq) for qq in quantiles]
+    return key
+
+
+def loadINVStatsCache(path, key):
+    """Loads the statistics cached in STATS_FILE of the run directory path.
+    Returns None when there is no cache or its key differs from key."""
+    try:
+        with np.load(os.path.join(path, STATS_FILE)) as data:
+            if json.loads(str(data['key'])) != key:
+                return None
+            return {name: data[name] for name in data.files if name != 'key'}
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def saveINVStatsCache(path, stats, key):
+    """Writes the statistics with their key into STATS_FILE of path. The file
+    is written under a temporary name and renamed, so a half-written cache
+    is never read (e.g. on a shared file system)."""
+    fd, tmpName = tempfile.mkstemp(prefix='.tmp', suffix='.npz', dir=path)
+    try:
+        with os.fdopen(fd, 'wb') as ff:
+            np.savez(ff, key=json.dumps(key), **stats)
+        os.replace(tmpName, os.path.join(path, STATS_FILE))
+    finally:
+        if os.path.exists(tmpName):
+            os.remove(tmpName)
+
+
+def meanINVStats(path='.', quantiles=QUANTILES, useCache=True):
+    """Per-generation statistics of the individual number of MHC variants
+    from INV_FILE of the run in path (one row per generation). Returns a
+    dictionary of arrays: `time`, `meanINV`, `varINV` and `quantiles`
+    (generations x quantiles). With `useCache` they are read from
+    STATS_FILE, or computed and saved there when INV_FILE has changed."""
+    inFile = os.path.join(path, INV_FILE)
+    if useCache:
+        key = statsCacheKey(inFile, quantiles)
+        stats = loadINVStatsCache(path, key)
+        if stats is not None:
+            return stats
+    time, data = ga.loadGenerationFile(inFile, useCache)
+    mean, var, qq = rowStats(data, quantiles)
+    stats = {'time': np.asarray(time), 'meanINV': mean, 'varINV': var,
+             'quantiles': qq}
+    if useCache:
+        try:
+            saveINVStatsCache(path, stats, key)
+        except OSError as e:
+            print("WARNING in meanINVStats(): cannot write the cache in",
+                  path, "-", e.strerror)
+    return stats
+
+
+def statsFrame(stats, quantiles=QUANTILES):
+    """Turns the dictionary made by meanINVStats() into a DataFrame with the
+    columns time, meanINV, varINV and q5, q25, ... for the quantiles."""
+    frame = pd.DataFrame({'time': stats['time'], 'meanINV': stats['meanINV'],
+                          'varINV': stats['varINV']})
+    for ii, qq in enumerate(quantiles):
+        frame['q' + format(100. * qq, 'g')] = stats['quantiles'][:, ii]
+    return frame
+
+
+def runINVStats(path):
+    """Computes the statistics of one run directory. Returns a tuple
+    `(stats, error)` with None in place of the missing one. Meant to run in
+    worker processes."""
+    try:
+        return meanINVStats(path), None
+    except (OSError, ValueError) as e:
+        return None, "Cannot process " + path + ": " + str(e)
 
 
 def loadMeanInvdMhcNumb(path='.'):
-    """ """
+    """Loads MeanInvdMhcNumb.csv (time and mean INV) written for the runs by
+    the earlier versions of the script."""
     theFile = os.path.join(path, "MeanInvdMhcNumb.csv")
     try:
         return pd.read_csv(theFile, delimiter=" ", header=None,
@@ -48,23 +154,38 @@ def loadMeanInvdMhcNumb(path='.'):
         return None
 
 
-def getTheData(theStartDate, templateList, dirr=os.getcwd()):
-    """ """
-    datOut = []
+def getTheData(theStartDate, templateList, dirr=os.getcwd(),
+               jobs=mp.cpu_count()):
+    """Goes through the runs in the catalog of the dir (see `run_catalog`)
+    matching the template and computes the mean INV of each of them (see
+    meanINVStats()) in `jobs` worker processes. Returns a list of
+    `(VAR, VARX, DataFrame)` tuples."""
     vv = ppma.lookForVARinList(templateList)
-    for dirName, subdirList, fileList in os.walk(dirr):
-        for file in fileList:
-            filepath = os.path.join(dirName, file)
-            if(filepath == os.path.join(dirName, 'InputParameters.json') and
-               ppma.loadTheDateFromParamFile(filepath) >= theStartDate):
-                paramzList = ppma.loadParamSettings(filepath)
-                if ppma.compareParams(templateList, paramzList):
-                    var = float(paramzList[vv['VAR']])
-                    varx = float(paramzList[vv['VARX']])
-                    awkMeanINV(dirName)
-                    meanINV = loadMeanInvdMhcNumb(dirName)
-                    datOut.append((var, varx, meanINV))
-                    print("Done dir:", dirName)
+    runs = []
+    for run in rcat.findRuns(theStartDate, dirr):
+        paramzList = ppma.paramSettingsFromDict(run['params'])
+        if ppma.compareParams(templateList, paramzList):
+            runs.append((float(paramzList[vv['VAR']]),
+                         float(paramzList[vv['VARX']]), run['dir']))
+    dirs = [run[2] for run in runs]
+    if jobs <= 1 or len(dirs) <= 1:
+        results = map(runINVStats, dirs)
+        pool = None
+    else:
+        pool = mp.Pool(min(jobs, len(dirs)))
+        results = pool.imap(runINVStats, dirs)
+    datOut = []
+    try:
+        for (var, varx, dirName), (stats, err) in zip(runs, results):
+            if err is None:
+                datOut.append((var, varx, statsFrame(stats)))
+                print("Done dir:", dirName)
+            else:
+                print("ERROR in getTheData():", err)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
     return datOut
 
 
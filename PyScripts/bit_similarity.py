@@ -0,0 +1,463 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Similarity kernels working on whole sets of packed bit strings (see
+`packed_bits`) at once instead of comparing '0'/'1' strings pair by pair in
+Python loops.
+
+The Hamming distance of two rows is the popcount of their XOR summed over the
+words. Distances are computed in blocks of rows, so that a block of
+`BLOCK_WORDS` XOR-ed words at most is held in memory, and either returned as
+full distance matrices or accumulated into histograms. The sets can be split
+into groups (individuals, species) by offset arrays like the ones of
+`genome_snapshot`, which gives the within-group, between-group and
+group-to-group modes used by the similarity scripts.
+
+The presentation criterion of the model, at least K consecutive agreeing bits
+(see `bitSimInRow()` in the similarity scripts), is tested with shift-and-AND
+on the words: with E the agreement bits (NOT XOR) of a pair, `E & (E >> 1)`
+marks the starts of runs of two agreeing bits, and doubling the shifts gives
+runs of any length in log2(K) steps. The longest run of every pair is found
+the same way by a binary search over the doubled shifts.
+
+Created on Sun Oct 18 20:14:52 2026
+for Evolutionary Biology Group, Faculty of Biology
+    Adam Mickiewicz University, Poznan, Poland
+"""
+import numpy as np
+import packed_bits as pbits
+
+
+# Number of 64-bit words XOR-ed at once in a block of a distance matrix.
+BLOCK_WORDS = 2**22
+# The run kernels keep about this many copies of a block at once.
+RUN_COPIES = 16
+# Distances fit in 16 bits for bit strings up to 65535 bits long.
+DIST_TYPE = np.uint16
+
+
+def _blockRows(nCols, ww, blockRows=None):
+    """Number of rows of a block with nCols columns of ww words each."""
+    if blockRows is not None:
+        return max(1, int(blockRows))
+    return max(1, BLOCK_WORDS // max(1, nCols * ww))
+
+
+def _xorBlocks(wordsA, wordsB=None, blockRows=None, copies=1):
+    """Yields the pairs `(start, X)` where X[k, j] are the XOR-ed words of
+    rows start+k of wordsA and j of wordsB (wordsA itself when None)."""
+    wordsA = pbits.asWords(wordsA)
+    wordsB = wordsA if wordsB is None else pbits.asWords(wordsB)
+    if wordsA.shape[1] != wordsB.shape[1]:
+        raise ValueError("Undefined for bit strings of unequal length")
+    step = _blockRows(len(wordsB), wordsA.shape[1] * copies, blockRows)
+    for start in range(0, len(wordsA), step):
+        yield start, wordsA[start:start+step, None, :] ^ wordsB[None, :, :]
+
+
+def _upperMask(start, nRows, nCols):
+    """Mask of the pairs above the diagonal in rows start:start+nRows of an
+    nCols wide square matrix."""
+    rows = np.arange(start, start + nRows)
+    return np.arange(nCols)[None, :] > rows[:, None]
+
+
+def hammingBlocks(wordsA, wordsB=None, blockRows=None):
+    """Yields the Hamming distance matrix between the rows of wordsA and
+    wordsB (wordsA itself when None) in blocks of rows: the pairs
+    `(start, D)` where D[k, j] is the distance between rows start+k of wordsA
+    and j of wordsB."""
+    for start, xx in _xorBlocks(wordsA, wordsB, blockRows):
+        yield start, pbits.popcount(xx).sum(axis=2, dtype=DIST_TYPE)
+
+
+def hammingMatrix(wordsA, wordsB=None, blockRows=None):
+    """Full N x M matrix of Hamming distances between the rows of wordsA and
+    wordsB (N x N between the rows of wordsA when wordsB is None)."""
+    nn = len(pbits.asWords(wordsA))
+    mm = nn if wordsB is None else len(pbits.asWords(wordsB))
+    DD = np.zeros((nn, mm), dtype=DIST_TYPE)
+    for start, block in hammingBlocks(wordsA, wordsB, blockRows):
+        DD[start:start+len(block)] = block
+    return DD
+
+
+def pairDistances(words, blockRows=None):
+    """Hamming distances of all N*(N-1)/2 pairs of distinct rows of words, in
+    the order (0, 1), (0, 2), ... (1, 2), ... like the upper triangle of the
+    distance matrix."""
+    nn = len(pbits.asWords(words))
+    out = [np.zeros(0, dtype=DIST_TYPE)]
+    for start, block in hammingBlocks(words, None, blockRows):
+        out.append(block[_upperMask(start, len(block), nn)])
+    return np.concatenate(out)
+
+
+def hammingHistogram(wordsA, wordsB=None, bitLen=None, blockRows=None):
+    """Exact histogram of the Hamming distances between all rows of wordsA
+    and all rows of wordsB, or between all pairs of distinct rows of wordsA
+    when wordsB is None. Returns the counts of distances 0 ... bitLen (the
+    number of bits in the words by default) without keeping the matrix."""
+    wordsA = pbits.asWords(wordsA)
+    if bitLen is None:
+        bitLen = wordsA.shape[1] * pbits.WORD_BITS
+    counts = np.zeros(int(bitLen) + 1, dtype=np.int64)
+    for start, block in hammingBlocks(wordsA, wordsB, blockRows):
+        if wordsB is None:
+            block = block[_upperMask(start, len(block), len(wordsA))]
+        counts += np.bincount(block.ravel(), minlength=len(counts))
+    return counts
+
+
+def withinGroupPairs(offsets):
+    """Row indices (ii, jj), ii < jj, of all pairs of rows belonging to the
+    same group, where group g holds the rows offsets[g]:offsets[g+1]. The
+    pairs go group by group, each in the upper triangle order."""
+    offsets = np.asarray(offsets, dtype=np.int64)
+    sizes = np.diff(offsets)
+    ends = np.repeat(offsets[1:], sizes)
+    rows = np.arange(offsets[0], offsets[-1])
+    partners = ends - rows - 1
+    ii = np.repeat(rows, partners)
+    firsts = np.cumsum(partners) - partners
+    jj = ii + 1 + np.arange(len(ii)) - np.repeat(firsts, partners)
+    return ii, jj
+
+
+def _withinGroupApply(words, offsets, kernel, dtype, blockRows=None,
+                      copies=1):
+    """Applies kernel to the XOR-ed words of all the pairs of rows within
+    the same group, in blocks of pairs. Returns the tuple `(values, group)`,
+    see `withinGroupDistances()`."""
+    words = pbits.asWords(words)
+    ii, jj = withinGroupPairs(offsets)
+    sizes = np.diff(offsets)
+    group = np.repeat(np.arange(len(sizes)), sizes * (sizes - 1) // 2)
+    step = _blockRows(1, words.shape[1] * copies, blockRows)
+    out = np.zeros(len(ii), dtype=dtype)
+    for start in range(0, len(ii), step):
+        xx = words[ii[start:start+step]] ^ words[jj[start:start+step]]
+        out[start:start+step] = kernel(xx)
+    return out, group
+
+
+def withinGroupDistances(words, offsets, blockRows=None):
+    """Hamming distances of all pairs of rows within the same group (e.g. the
+    antigens of one individual) for all groups at once. Returns a tuple
+    `(distances, group)` with the group index of each pair; for one group
+    the order is that of `pairDistances()`."""
+    return _withinGroupApply(
+        words, offsets,
+        lambda xx: pbits.popcount(xx).sum(axis=1, dtype=DIST_TYPE),
+        DIST_TYPE, blockRows)
+
+
+def withinGroupMeans(words, offsets, blockRows=None):
+    """Mean Hamming distance between the rows within each group. Groups with
+    less than two rows get NaN."""
+    nGroups = len(offsets) - 1
+    DD, group = withinGroupDistances(words, offsets, blockRows)
+    sums = np.bincount(group, weights=DD, minlength=nGroups)
+    pairs = np.bincount(group, minlength=nGroups)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return sums / pairs
+
+
+def betweenGroupHistogram(words, offsets, bitLen=None, blockRows=None):
+    """Exact histogram of the Hamming distances between rows belonging to
+    different groups (e.g. antigens of different individuals of one
+    species): all pairs minus the pairs within the groups."""
+    words = pbits.asWords(words)
+    lo, hi = int(offsets[0]), int(offsets[-1])
+    counts = hammingHistogram(words[lo:hi], None, bitLen, blockRows)
+    DD = withinGroupDistances(words, offsets, blockRows)[0]
+    return counts - np.bincount(DD, minlength=len(counts))
+
+
+def _groupSums(cumul, offsets, axis):
+    """Sums of the groups of columns (axis=1) or rows (axis=0) from a
+    cumulative sum with a leading zero; empty groups sum to zero."""
+    offsets = np.asarray(offsets, dtype=np.int64)
+    return (np.take(cumul, offsets[1:], axis=axis) -
+            np.take(cumul, offsets[:-1], axis=axis))
+
+
+def _groupRanges(offsets, rowsPerBlock):
+    """Splits the groups into ranges (gg, hh) of whole groups holding about
+    rowsPerBlock rows (at least one group)."""
+    gg = 0
+    while gg < len(offsets) - 1:
+        hh = gg + 1
+        while (hh < len(offsets) - 1 and
+               offsets[hh+1] - offsets[gg] <= rowsPerBlock):
+            hh += 1
+        yield gg, hh
+        gg = hh
+
+
+def _groupTotals(block, offsetsA, offsetsB, anyInColumns=False):
+    """Sums the row x column block over the groups of its rows and columns
+    (offsets local to the block). With anyInColumns a row counts 1 for a
+    group of columns when any of its values there is nonzero."""
+    cumul = np.zeros((block.shape[0], block.shape[1] + 1), dtype=np.int64)
+    np.cumsum(block, axis=1, out=cumul[:, 1:])
+    colSums = _groupSums(cumul, offsetsB, 1)
+    if anyInColumns:
+        colSums = (colSums > 0).astype(np.int64)
+    cumul = np.zeros((block.shape[0] + 1, colSums.shape[1]), dtype=np.int64)
+    np.cumsum(colSums, axis=0, out=cumul[1:])
+    return _groupSums(cumul, offsetsA, 0)
+
+
+def _groupOperands(wordsA, offsetsA, wordsB, offsetsB):
+    """Common argument handling of the group-to-group functions."""
+    wordsA = pbits.asWords(wordsA)
+    offsetsA = np.asarray(offsetsA, dtype=np.int64)
+    if wordsB is None:
+        wordsB, offsetsB = wordsA, offsetsA
+    wordsB = pbits.asWords(wordsB)
+    offsetsB = np.asarray(offsetsB, dtype=np.int64)
+    return wordsA, offsetsA, wordsB[offsetsB[0]:offsetsB[-1]], \
+        offsetsB - offsetsB[0]
+
+
+def groupMeanBlocks(wordsA, offsetsA, wordsB=None, offsetsB=None,
+                    blockRows=None):
+    """Yields `groupMeanMatrix()` in blocks of whole groups of wordsA, so the
+    full matrix is never kept: the tuples `(gg, MM, DD)` where MM are the
+    rows gg:gg+len(MM) of the matrix and DD the Hamming distances between
+    the rows of these groups and all the rows of wordsB they come from."""
+    wordsA, offsetsA, colsB, offsetsB = _groupOperands(wordsA, offsetsA,
+                                                       wordsB, offsetsB)
+    sizesA = np.diff(offsetsA)
+    sizesB = np.diff(offsetsB)
+    rowsPerBlock = _blockRows(len(colsB), wordsA.shape[1], blockRows)
+    for gg, hh in _groupRanges(offsetsA, rowsPerBlock):
+        DD = hammingMatrix(wordsA[offsetsA[gg]:offsetsA[hh]], colsB,
+                           rowsPerBlock)
+        MM = _groupTotals(DD, offsetsA[gg:hh+1] - offsetsA[gg], offsetsB)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            yield gg, MM / np.outer(sizesA[gg:hh], sizesB), DD
+
+
+def groupMeanMatrix(wordsA, offsetsA, wordsB=None, offsetsB=None,
+                    blockRows=None):
+    """Matrix of mean Hamming distances between groups: element [g, h] is
+    the mean distance over all pairs of a row of group g of wordsA and a row
+    of group h of wordsB (e.g. the antigens of two individuals). Without
+    wordsB the groups of wordsA are compared with each other, the diagonal
+    then includes the zero distances of rows to themselves. The offsets are
+    indices into the corresponding words."""
+    nCols = len(offsetsA if offsetsB is None else offsetsB) - 1
+    MM = np.zeros((len(offsetsA) - 1, nCols))
+    for gg, block, _ in groupMeanBlocks(wordsA, offsetsA, wordsB, offsetsB,
+                                        blockRows):
+        MM[gg:gg+len(block)] = block
+    return MM
+
+
+def betweenGroupMeanHistogram(words, offsets, edges, blockRows=None):
+    """Histogram, over the bins with the given edges (like
+    `numpy.histogram()`), of the mean Hamming distances of all G*(G-1)/2
+    pairs of distinct groups (the upper triangle of `groupMeanMatrix()`),
+    e.g. for every pair of individuals of a species. The matrix is taken in
+    tiles from `groupMeanBlocks()`, so the G x G means are never kept. Pairs
+    with an empty group are left out."""
+    nGroups = len(offsets) - 1
+    counts = np.zeros(len(edges) - 1, dtype=np.int64)
+    for gg, MM, _ in groupMeanBlocks(words, offsets, blockRows=blockRows):
+        upper = (np.arange(nGroups)[None, :] >
+                 np.arange(gg, gg + len(MM))[:, None])
+        MM = MM[upper]
+        counts += np.histogram(MM[~np.isnan(MM)], edges)[0]
+    return counts
+
+
+def _validMask(bitLen, ww):
+    """Words with the bitLen right aligned bits of a row set."""
+    mask = np.full(ww, ~np.uint64(0), dtype=np.uint64)
+    rest = int(bitLen) - (ww - 1) * pbits.WORD_BITS
+    if ww:
+        mask[0] = np.uint64((1 << rest) - 1) if rest < pbits.WORD_BITS \
+            else ~np.uint64(0)
+    return mask
+
+
+def _shiftRightBy(words, shift):
+    """`_shiftRight()` by the same number of bits in all rows."""
+    nWords, bits = divmod(shift, pbits.WORD_BITS)
+    out = np.zeros_like(words)
+    if nWords >= words.shape[1]:
+        return out
+    out[:, nWords:] = words[:, :words.shape[1] - nWords] >> np.uint64(bits)
+    if bits and nWords + 1 < words.shape[1]:
+        out[:, nWords+1:] |= (words[:, :words.shape[1] - nWords - 1] <<
+                              np.uint64(pbits.WORD_BITS - bits))
+    return out
+
+
+def _shiftRight(words, shift):
+    """Shifts the (right aligned, big-endian) rows of N x W words right by
+    shift bits, a number or one number per row."""
+    nn, ww = words.shape
+    if np.ndim(shift) == 0:
+        return _shiftRightBy(words, int(shift))
+    shift = np.broadcast_to(np.asarray(shift, dtype=np.int64), (nn,))
+    src = np.arange(ww)[None, :] - (shift // pbits.WORD_BITS)[:, None]
+    bits = (shift % pbits.WORD_BITS).astype(np.uint64)[:, None]
+    high = np.take_along_axis(words, np.clip(src, 0, ww - 1), axis=1)
+    high[src < 0] = 0
+    low = np.take_along_axis(words, np.clip(src - 1, 0, ww - 1), axis=1)
+    low[(src < 1) | (bits == 0)] = 0
+    return (high >> bits) | (low << ((np.uint64(pbits.WORD_BITS) - bits) %
+                                     np.uint64(pbits.WORD_BITS)))
+
+
+def runAtLeast(agree, runLen):
+    """Tells for each row of agreement words (N x W, padding bits cleared)
+    whether it has at least runLen consecutive set bits."""
+    runLen = int(runLen)
+    if runLen <= 0:
+        return np.ones(len(agree), dtype=bool)
+    found = None
+    done = 0
+    power, step = agree, 1
+    while True:
+        # `power` marks the starts of runs of `step` set bits
+        if runLen & step:
+            found = power if found is None else \
+                found & _shiftRight(power, done)
+            done += step
+            if done == runLen:
+                return found.any(axis=1)
+        power = power & _shiftRight(power, step)
+        step *= 2
+
+
+def longestRuns(agree):
+    """Length of the longest run of consecutive set bits in each row of
+    agreement words (N x W, padding bits cleared)."""
+    powers = [agree]
+    step = 1
+    while powers[-1].any():
+        powers.append(powers[-1] & _shiftRight(powers[-1], step))
+        step *= 2
+    runs = np.zeros(len(agree), dtype=np.int64)
+    found = np.full(agree.shape, ~np.uint64(0), dtype=np.uint64)
+    for jj in range(len(powers) - 2, -1, -1):
+        # extend the runs found so far by 2**jj bits where possible
+        longer = found & _shiftRight(powers[jj], runs)
+        ok = longer.any(axis=1)
+        found[ok] = longer[ok]
+        runs[ok] += 2**jj
+    return runs
+
+
+def _runKernel(bitLen, runLen=None):
+    """Kernel of the run functions taking XOR-ed words of any shape. Gives
+    the longest agreeing runs, or with runLen whether they reach it. All
+    the bits of the words are compared when bitLen is None."""
+    def kernel(xx):
+        shape = xx.shape[:-1]
+        xx = xx.reshape(-1, xx.shape[-1])
+        nBits = xx.shape[1] * pbits.WORD_BITS if bitLen is None else bitLen
+        agree = ~xx & _validMask(nBits, xx.shape[1])
+        if runLen is None:
+            return longestRuns(agree).reshape(shape)
+        return runAtLeast(agree, runLen).reshape(shape)
+    return kernel
+
+
+def longestRunBlocks(wordsA, wordsB=None, bitLen=None, runLen=None,
+                     blockRows=None):
+    """Like `hammingBlocks()` but yields the lengths of the longest runs of
+    agreeing bits of the pairs of rows (bitLen bits long), or with runLen
+    boolean blocks telling whether the pairs share a run of runLen bits."""
+    kernel = _runKernel(bitLen, runLen)
+    for start, xx in _xorBlocks(wordsA, wordsB, blockRows, RUN_COPIES):
+        yield start, kernel(xx)
+
+
+def longestRunMatrix(wordsA, wordsB=None, bitLen=None, blockRows=None):
+    """Full N x M matrix of the longest runs of agreeing bits between the
+    rows of wordsA and wordsB (N x N within wordsA when wordsB is None)."""
+    nn = len(pbits.asWords(wordsA))
+    mm = nn if wordsB is None else len(pbits.asWords(wordsB))
+    RR = np.zeros((nn, mm), dtype=DIST_TYPE)
+    for start, block in longestRunBlocks(wordsA, wordsB, bitLen, None,
+                                         blockRows):
+        RR[start:start+len(block)] = block
+    return RR
+
+
+def runSimilarityMatrix(wordsA, wordsB=None, bitLen=None, runLen=7,
+                        blockRows=None):
+    """Boolean N x M matrix telling which pairs of rows of wordsA and wordsB
+    have at least runLen consecutive agreeing bits (the `bitSimInRow()`
+    criterion)."""
+    nn = len(pbits.asWords(wordsA))
+    mm = nn if wordsB is None else len(pbits.asWords(wordsB))
+    SS = np.zeros((nn, mm), dtype=bool)
+    for start, block in longestRunBlocks(wordsA, wordsB, bitLen, runLen,
+                                         blockRows):
+        SS[start:start+len(block)] = block
+    return SS
+
+
+def longestRunHistogram(wordsA, wordsB=None, bitLen=None, blockRows=None):
+    """Exact distribution of the longest runs of agreeing bits between all
+    rows of wordsA and wordsB, or between all pairs of distinct rows of
+    wordsA when wordsB is None: the counts of run lengths 0 ... bitLen."""
+    wordsA = pbits.asWords(wordsA)
+    if bitLen is None:
+        bitLen = wordsA.shape[1] * pbits.WORD_BITS
+    counts = np.zeros(int(bitLen) + 1, dtype=np.int64)
+    nn = len(wordsA)
+    for start, block in longestRunBlocks(wordsA, wordsB, bitLen, None,
+                                         blockRows):
+        if wordsB is None:
+            block = block[_upperMask(start, len(block), nn)]
+        counts += np.bincount(block.ravel(), minlength=len(counts))
+    return counts
+
+
+def withinGroupRuns(words, offsets, bitLen, runLen=None, blockRows=None):
+    """Longest runs of agreeing bits (or with runLen whether they reach it)
+    of all pairs of rows within the same group, see
+    `withinGroupDistances()`."""
+    return _withinGroupApply(words, offsets, _runKernel(bitLen, runLen),
+                             DIST_TYPE if runLen is None else bool,
+                             blockRows, RUN_COPIES)
+
+
+def groupMatchBlocks(wordsA, offsetsA, wordsB=None, offsetsB=None,
+                     bitLen=None, runLen=7, blockRows=None):
+    """Yields `groupMatchFractions()` in blocks of whole groups of wordsA, so
+    the full matrix is never kept: the pairs `(gg, MM)` where MM are the
+    rows gg:gg+len(MM) of the matrix."""
+    wordsA, offsetsA, colsB, offsetsB = _groupOperands(wordsA, offsetsA,
+                                                       wordsB, offsetsB)
+    sizesA = np.diff(offsetsA)
+    rowsPerBlock = _blockRows(len(colsB), wordsA.shape[1] * RUN_COPIES,
+                              blockRows)
+    for gg, hh in _groupRanges(offsetsA, rowsPerBlock):
+        block = runSimilarityMatrix(wordsA[offsetsA[gg]:offsetsA[hh]], colsB,
+                                    bitLen, runLen, rowsPerBlock)
+        MM = _groupTotals(block, offsetsA[gg:hh+1] - offsetsA[gg], offsetsB,
+                          True)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            yield gg, MM / sizesA[gg:hh, None]
+
+
+def groupMatchFractions(wordsA, offsetsA, wordsB=None, offsetsB=None,
+                        bitLen=None, runLen=7, blockRows=None):
+    """Matrix of the fractions of rows of group g of wordsA sharing at least
+    runLen consecutive agreeing bits with any row of group h of wordsB
+    (what `bitSimBetweenIndv()` averages for two individuals). Without
+    wordsB the groups of wordsA are compared with each other."""
+    nCols = len(offsetsA if offsetsB is None else offsetsB) - 1
+    MM = np.zeros((len(offsetsA) - 1, nCols))
+    for gg, block in groupMatchBlocks(wordsA, offsetsA, wordsB, offsetsB,
+                                      bitLen, runLen, blockRows):
+        MM[gg:gg+len(block)] = block
+    return MM
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Opens the model's output files whether they are stored as plain text or
+compressed with gzip (`.gz`), xz (`.xz`) or Zstandard (`.zst`). A loader asks
+for the plain name, e.g. `HostGenomesFile.1000.csv`, and gets a stream of the
+first of `HostGenomesFile.1000.csv`, `HostGenomesFile.1000.csv.gz`, ... that
+exists, so archived runs are read without decompressing them to disk first.
+
+Compressed files are decompressed by the command line tools when they are
+installed (`pigz`, `xz -T0`, `zstd`), which run in a separate process next to
+the Python parser and use several threads where the format allows it (`pigz`
+and multi-block `.xz` files). Otherwise the `gzip`, `lzma` and, if installed,
+`zstandard` Python modules are used.
+
+Created on Sun Oct 18 18:02:37 2026
+for Evolutionary Biology Group, Faculty of Biology
+    Adam Mickiewicz University, Poznan, Poland
+"""
+import io
+import os
+import gzip
+import lzma
+import shutil
+import subprocess as subp
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# Compressed variants of a file in the order they are looked for.
+COMPRESSED_SUFFIXES = ('.gz', '.xz', '.zst')
+# Command line decompressors writing to stdout, the first one installed is
+# used. Set USE_EXTERNAL_TOOLS to False to use the Python modules only.
+EXTERNAL_TOOLS = {'.gz': (('pigz', '-dc'), ('gzip', '-dc')),
+                  '.xz': (('xz', '-T0', '-dc'),),
+                  '.zst': (('zstd', '-dcq'),)}
+USE_EXTERNAL_TOOLS = True
+IO_BUFFER = 2**20
+
+
+def compressionSuffix(FILE):
+    """Returns the compression suffix of FILE ('.gz', '.xz', '.zst') or an
+    empty string for a plain file."""
+    for suffix in COMPRESSED_SUFFIXES:
+        if FILE.endswith(suffix):
+            return suffix
+    return ''
+
+
+def plainName(FILE):
+    """FILE without its compression suffix."""
+    return FILE[:len(FILE) - len(compressionSuffix(FILE))]
+
+
+def resolveFile(FILE):
+    """Returns the path of the existing variant of FILE: FILE itself when it
+    exists, otherwise its first compressed variant found. FILE is returned
+    unchanged when none exists, so that opening it raises the usual
+    FileNotFoundError."""
+    if os.path.exists(FILE) or compressionSuffix(FILE):
+        return FILE
+    for suffix in COMPRESSED_SUFFIXES:
+        if os.path.exists(FILE + suffix):
+            return FILE + suffix
+    return FILE
+
+
+class _ProcessReader(io.BufferedReader):
+    """Buffered binary stream of the standard output of a decompressing
+    process. Closing it stops the process; a process which failed on its
+    own (e.g. on a corrupted archive) raises OSError."""
+    def __init__(self, args, FILE):
+        self._proc = subp.Popen(list(args) + [FILE], stdout=subp.PIPE,
+                                stderr=subp.PIPE)
+        self._name = FILE
+        super().__init__(self._proc.stdout.detach(), IO_BUFFER)
+
+    def close(self):
+        if self.closed:
+            return
+        # a stream closed before its end stops the process on purpose
+        finished = not self.peek(1)
+        super().close()
+        if not finished:
+            self._proc.terminate()
+        self._proc.wait()
+        err = self._proc.stderr.read().decode(errors='replace').strip()
+        self._proc.stderr.close()
+        if finished and self._proc.returncode != 0:
+            raise OSError("Cannot decompress " + self._name + ": " + err)
+
+
+def _externalTool(suffix):
+    """The command of the first installed decompressor for suffix or
+    None."""
+    if not USE_EXTERNAL_TOOLS:
+        return None
+    for args in EXTERNAL_TOOLS.get(suffix, ()):
+        if shutil.which(args[0]):
+            return args
+    return None
+
+
+def _openBinary(FILE, suffix):
+    """Opens a compressed FILE as a binary stream of the decompressed
+    data."""
+    args = _externalTool(suffix)
+    if args is not None:
+        return _ProcessReader(args, FILE)
+    if suffix == '.gz':
+        return io.BufferedReader(gzip.open(FILE, 'rb'), IO_BUFFER)
+    elif suffix == '.xz':
+        return io.BufferedReader(lzma.open(FILE, 'rb'), IO_BUFFER)
+    elif zstandard is not None:
+        raw = open(FILE, 'rb')
+        return io.BufferedReader(
+            zstandard.ZstdDecompressor().stream_reader(raw,
+                                                       closefd=True),
+            IO_BUFFER)
+    raise OSError("Cannot read " + FILE + ": neither the zstd program nor"
+                  " the zstandard module is installed.")
+
+
+def openFile(FILE, mode='r'):
+    """Opens FILE (or its compressed variant, see `resolveFile()`) for
+    reading. `mode` is 'r' for text or 'rb' for bytes, as in `open()`. The
+    returned stream is read sequentially; compressed streams cannot
+    seek."""
+    if mode not in ('r', 'rt', 'rb'):
+        raise ValueError("openFile(): only reading modes are supported.")
+    path = resolveFile(FILE)
+    suffix = compressionSuffix(path)
+    if not suffix:
+        return open(path, mode)
+    stream = _openBinary(path, suffix)
+    if mode == 'rb':
+        return stream
+    return io.TextIOWrapper(stream)
+
+
+def isCompressed(FILE):
+    """True when FILE is read from a compressed variant."""
+    return compressionSuffix(resolveFile(FILE)) != ''
@@ -13,13 +13,15 @@ Created on Tue Oct 29 23:42:32 2019
 import re
 import os
 import sys
-import glob
+import fnmatch
 import numpy as np
 import matplotlib.pyplot as plt
 import pandas as pd
 import seaborn as sns
 from scipy.stats import linregress
 import packed_plots_of_MHC_alleles as ppma
+import genome_snapshot as gsnp
+import run_catalog as rcat
 
 stats_dt = np.dtype([('chr_1', np.int), ('chr_2', np.int), ('unq_1', np.int),
                      ('unq_2', np.int), ('tot', np.int), ('unq_tot', np.int)])
@@ -29,28 +31,14 @@ def loadHostPopulation(FILE="HostGenomesFile.0.csv"):
     '''Takes the file with all the hosts data loads it to a list. Each
     individual is loaded as as two lists (chromosome one and chromosome two)
     of gene tags. And the population is a list of individuals.'''
-    B_list = [[], []]
-    Gene_list = []
-    contin = False
     try:
-        with open(FILE) as infile:
-            for line in infile:
-                if re.search(r"#", line):
-                    continue
-                elif (re.search(r"===", line) and contin):
-                    Gene_list.append(B_list)
-                    B_list = [[], []]
-                elif (re.search(r"===", line) and contin is False):
-                    contin = True
-                    continue
-                else:
-                    LL = line.split()
-                    if LL[1] == 'ch_one':
-                        B_list[0].append(int(LL[3]))
-                    elif LL[1] == 'ch_two':
-                        B_list[1].append(int(LL[3]))
-        Gene_list.append(B_list)
-        return Gene_list
+        snap = gsnp.loadHostSnapshot(FILE)
+        chrOne = snap['chromosome'] == gsnp.CHROMOSOME_IDS['ch_one']
+        chrTwo = snap['chromosome'] == gsnp.CHROMOSOME_IDS['ch_two']
+        oneTags = gsnp.splitPerHost(snap, 'gene_own_tag', chrOne)
+        twoTags = gsnp.splitPerHost(snap, 'gene_own_tag', chrTwo)
+        return [[list(one), list(two)] for one, two in zip(oneTags,
+                                                            twoTags)]
     except IOError as e:
         print("I/O error({0}) in".format(e.errno) +
               " loadTheHostPopulation(): {0}".format(e.strerror))
@@ -72,33 +60,29 @@ def analiseGeneContent(Gene_list):
 
 
 def getTheGenes(theStartDate, templateList, dirr=os.getcwd()):
-    """Walking the dir using Python 3.5. Variable theStartDate has to be
-    a datetime.date() data type."""
+    """Goes through the runs in the catalog of the dir (see `run_catalog`).
+    Variable theStartDate has to be a datetime.date() data type."""
     vv = ppma.lookForVARinList(templateList)
     datOut = []
 #    dataOrdering = ['VAR', 'VARX', 'meanAllel', 'stdAllel', 'slope']
-    for dirName, subdirList, fileList in os.walk(dirr):
-        for file in fileList:
-            filepath = os.path.join(dirName, file)
-            if(filepath == os.path.join(dirName, 'InputParameters.json') and
-               ppma.loadTheDateFromParamFile(filepath) >= theStartDate):
-                paramzList = ppma.loadParamSettings(filepath)
-#                with open(filepath) as f:
-#                    prms = json.load(f)
-                if ppma.compareParams(templateList, paramzList):
-                    print("Data from:", dirName, end=" ")
-                    popFiles = os.path.join(dirName, "HostGenomesFile.*.csv")
-                    for fil in glob.glob(popFiles):
-                        if not re.search('HostGenomesFile.0.csv', fil):
-                            hostPopFile = fil
-                    Gene_list = loadHostPopulation(hostPopFile)
-                    geneStats = analiseGeneContent(Gene_list)
-                    var = float(paramzList[vv['VAR']])
-                    varx = float(paramzList[vv['VARX']])
-                    geneStats['spp'] = varx
-                    geneStats['patho_mut'] = var
-                    datOut.append((geneStats))
-                    print("- done!")
+    for run in rcat.findRuns(theStartDate, dirr):
+        dirName = run['dir']
+        paramzList = ppma.paramSettingsFromDict(run['params'])
+        if ppma.compareParams(templateList, paramzList):
+            print("Data from:", dirName, end=" ")
+            popFiles = fnmatch.filter(run['files'],
+                                      "HostGenomesFile.*.csv")
+            for fil in popFiles:
+                if not re.search('HostGenomesFile.0.csv', fil):
+                    hostPopFile = os.path.join(dirName, fil)
+            Gene_list = loadHostPopulation(hostPopFile)
+            geneStats = analiseGeneContent(Gene_list)
+            var = float(paramzList[vv['VAR']])
+            varx = float(paramzList[vv['VARX']])
+            geneStats['spp'] = varx
+            geneStats['patho_mut'] = var
+            datOut.append((geneStats))
+            print("- done!")
     return datOut
 
 
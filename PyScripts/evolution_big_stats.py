@@ -4,21 +4,24 @@
 Iterates through directories and looks for the file with the Host population
 snapshot called HostGenomesFile.XXXX.csv and the InputParameters.json file with
 the parameters used it the run. It extracts information about the genes origin
-like ancestry tree and MRCA.
+like ancestry tree and MRCA. The ancestry is merged into a parent-pointer
+forest of the genes (see `gene_genealogy`) once per snapshot.
 
 Created on Thu Dec  8 02:38:00 2016
 
 @author: Piotr Bentkowski - bentkowski.piotr@gmail.com
 """
-import re
 import os
 import json
 # import linecache as ln
 import sys
 import numpy as np
 import matplotlib.pyplot as plt
-import bitstring as bts
+import genome_snapshot as gsnp
+import gene_genealogy as ggen
+import packed_bits as pbits
 import packed_plots_of_MHC_alleles as ppma
+import run_catalog as rcat
 
 
 outType = np.dtype([('VAR', 'f8'), ('VARX', 'f8'), ('MRCA_time', 'f8'),
@@ -31,30 +34,17 @@ def loadHostPopulation(FILE):
     picks unique genes from it. Produces two lists: one containing ancestry of
     each gene (tags of all predecessors) and the second, corresponding
     containing times when each mutation arose in the genes time line.'''
-    B_list = []
     Mut_tags = []
     Mut_times = []
     try:
-        with open(FILE) as infile:
-            for line in infile:
-                if re.search(r"#", line):
-                    continue
-                elif re.search(r"===", line):
-                    continue
-                else:
-                    LL = line.split()
-                    bb = bts.BitString(bin=LL[0]).int
-                    if bb in B_list:
-                        pass
-                    else:
-                        # print(LL[5::2])
-                        B_list.append(bb)
-                        tagz = LL[5::2]
-                        tagz.append(LL[3])
-                        Mut_tags.append(tagz)
-                        timez = LL[4::2]
-                        timez.append(LL[2])
-                        Mut_times.append(timez)
+        snap = gsnp.loadHostSnapshot(FILE)
+        for ii in gsnp.uniqueAlleles(snap)['first_gene']:
+            tagz = gsnp.geneHistory(snap, ii, 'parent_tags').tolist()
+            tagz.append(int(snap['gene_own_tag'][ii]))
+            Mut_tags.append(tagz)
+            timez = gsnp.geneHistory(snap, ii, 'mutation_times').tolist()
+            timez.append(int(snap['time_of_origin'][ii]))
+            Mut_times.append(timez)
         return Mut_tags, Mut_times
     except IOError as e:
         print("I/O error({0}) in".format(e.errno) +
@@ -65,22 +55,10 @@ def loadRawBitstrings(FILE):
     """Loads just the raw bit strings to a list from the Host population
     HostGenomesFile.XXXX.csv file. Used only for debugging.
     """
-    B_list = []
     try:
-        with open(FILE) as infile:
-            for line in infile:
-                if re.search(r"#", line):
-                    continue
-                elif re.search(r"===", line):
-                    continue
-                else:
-                    LL = line.split()
-                    bb = LL[0]
-                    if bb in B_list:
-                        pass
-                    else:
-                        B_list.append(bb)
-        return B_list
+        snap = gsnp.loadHostSnapshot(FILE)
+        return pbits.toStrings(gsnp.uniqueAlleles(snap)['allele'],
+                               snap['bit_length'])
     except IOError as e:
         print("I/O error({0}) in".format(e.errno) +
               " loadTheHostPopulation(): {0}".format(e.strerror))
@@ -88,16 +66,7 @@ def loadRawBitstrings(FILE):
 
 def findTheOnesAtBeginning(Mut_tags, jj=0):
     """Finds the tag of the first gene in population’s known history."""
-    ll = []
-    for itm in Mut_tags:
-        try:
-            if itm[jj] in ll:
-                pass
-            else:
-                ll.append(itm[jj])
-        except Exception:
-            pass
-    return ll
+    return list(dict.fromkeys(itm[jj] for itm in Mut_tags if len(itm) > jj))
 
 
 def numberOfMutList(Mut_tags):
@@ -108,36 +77,34 @@ def numberOfMutList(Mut_tags):
     return np.array(ll)
 
 
-def findMRCA(Mut_tags, Mut_times):
+def findMRCA(Mut_tags, Mut_times, forest=None):
     """Finds the tag, time stamp and index of the most recent common ancestor
-    gene from the list of all genes at the population snapshot.
+    gene from the list of all genes at the population snapshot. The forest
+    made from the lists by `gene_genealogy.buildForest()` can be given when
+    it is already there.
     Returns: MRCA gene tag, time of MRCA origin, MRCA index in Mut_tags list,
              time of the MRCA
     """
-    if len(findTheOnesAtBeginning(Mut_tags, 0)) != 1:
+    if forest is None:
+        forest = ggen.buildForest(Mut_tags, Mut_times)
+    node, splitTime = ggen.findMRCA(forest)
+    if node < 0:
         print("The most recent common ancestor cannot be established.",
               "There is more than one ancestral gene at the root.")
         return None, np.nan, np.nan, np.nan
-    mutNumb = numberOfMutList(Mut_tags)
-    maxx = np.max(mutNumb)
-    theMRCAtag = Mut_tags[0][0]
-    ii = 0
-    for x in range(maxx):
-        if len(findTheOnesAtBeginning(Mut_tags, x)) == 1:
-            theMRCAtag = findTheOnesAtBeginning(Mut_tags, x)[0]
-            ii = x
-        else:
-            break
-    minn = np.inf
-    kk = ii + 1
-    for item in Mut_times:
-        try:
-            indx = int(item[kk])
-        except Exception:
-            continue
-        if indx < minn:
-            minn = indx
-    return theMRCAtag, int(Mut_times[0][ii]), ii, minn
+    return (int(forest['tag'][node]), int(forest['origin'][node]),
+            int(forest['depth'][node]), splitTime)
+
+
+def _paddedArr(chains, width, dtype):
+    """Puts a list of sequences into the rows of an array of `width`
+    columns padded with -1."""
+    lengths = np.array([len(itm) for itm in chains], dtype=np.int64)
+    arr = -1 * np.ones((len(chains), width), dtype=dtype)
+    if len(chains):
+        arr[np.arange(width) < lengths[:, None]] = \
+            np.concatenate([np.asarray(itm, dtype=dtype) for itm in chains])
+    return arr, lengths
 
 
 def transTagsToNumpyArr(tagList):
@@ -145,15 +112,8 @@ def transTagsToNumpyArr(tagList):
     into a Numpy array where number of columns equals to the number of unique
     genes and the number of rows equals to the number of mutation events in the
     history of the gene that had the most of these events."""
-    maxLen = 0
-    for itm in tagList:
-        if maxLen < len(itm):
-            maxLen = len(itm)
-    arr = -1 * np.ones((len(tagList), maxLen), dtype='i8')
-    for i, itm in enumerate(tagList):
-        for j, ii in enumerate(itm):
-            arr[i, j] = ii
-    return arr
+    maxLen = max((len(itm) for itm in tagList), default=0)
+    return _paddedArr(tagList, maxLen, 'i8')[0]
 
 
 def transTimesToNumpyArr(timesList, finito):
@@ -163,15 +123,9 @@ def transTimesToNumpyArr(timesList, finito):
     mutation events in the history of the gene that had the most of these
     events, 'finito' is the maximal number of generations a.k.a. simulation
     time. """
-    maxLen = 0
-    for itm in timesList:
-        if maxLen < len(itm):
-            maxLen = len(itm)
-    arr = -1 * np.ones((len(timesList), maxLen+1))
-    for i, itm in enumerate(timesList):
-        for j, ii in enumerate(itm):
-            arr[i, j] = ii
-        arr[i, j+1] = finito
+    maxLen = max((len(itm) for itm in timesList), default=0)
+    arr, lengths = _paddedArr(timesList, maxLen+1, float)
+    arr[np.arange(len(timesList)), lengths] = finito
     return arr
 
 
@@ -179,32 +133,22 @@ def setPairedOriginTags(tagArr, timeArr):
     """Takes the Numpy-transformed tag and time arrays and creates a data
     structure where there are only unique ancestor-descendant pairs of genes
     and pairs of corresponding times of gene origin."""
-    maxLen = 0
-    for itm in tagArr:
-        if maxLen < len(itm):
-            maxLen = len(itm)
     genePairs = []
     geneTimez = []
-    for i in range(maxLen-1):
-        tag_ll = []
-        time_ll = []
-        for j, itm in enumerate(tagArr):
-            geneTpl = (itm[i], itm[i+1])
-            if itm[i+1] != -1 and geneTpl not in tag_ll:
-                    tag_ll.append(geneTpl)
-                    time_ll.append((timeArr[j][i+1], timeArr[j][i+2]))
-        genePairs.append(tag_ll)
-        geneTimez.append(time_ll)
+    for i in range(tagArr.shape[1]-1):
+        rows = np.flatnonzero(tagArr[:, i+1] != -1)
+        # === first row of every distinct pair, in the order of rows ===
+        first = np.unique(tagArr[rows, i:i+2], axis=0, return_index=True)[1]
+        rows = rows[np.sort(first)]
+        genePairs.append([tuple(pp) for pp in tagArr[rows, i:i+2]])
+        geneTimez.append([tuple(tt) for tt in timeArr[rows, i+1:i+3]])
     return genePairs, geneTimez
 
 
 def maxGeneLifeDict(tagArr, maxTime):
     """Creates an utility data structure: a dictionary of the surviving gene
     tags and the number of host generations (a.k.a. simulation time)"""
-    dd = {}
-    for item in tagArr:
-        dd[np.max(item)] = maxTime
-    return dd
+    return dict.fromkeys(np.max(tagArr, axis=1), maxTime)
 
 
 def plotTheTimes(tagArr, timeArr, maxTime, genePairs, maxTimeGenDict, dirrName,
@@ -217,12 +161,10 @@ def plotTheTimes(tagArr, timeArr, maxTime, genePairs, maxTimeGenDict, dirrName,
     FS = linesWdth[3]
     plt.figure(1, figsize=(20, 16))
     lline = 0
-    checkList = [-1]
     dd = {}
     for i, itm in enumerate(tagArr):
         for j, ii in enumerate(itm):
-            if ii not in checkList:
-                checkList.append(ii)
+            if ii != -1 and ii not in dd:
                 plt.hlines(lline, timeArr[i][j], timeArr[i][j+1],
                            colors='k', lw=hLineWidth)
                 dd[ii] = (timeArr[i][j], lline, timeArr[i][j+1])
@@ -274,8 +216,9 @@ def processDataOneFile(FILE):
     except Exception:
         print("Can't load the host population snapshot file.")
         return None
-    mrcaTag, mrcaOri, mrcaIdx, mrcaTime = findMRCA(mutTags, mutTimes)
-    if mrcaTag:
+    forest = ggen.buildForest(mutTags, mutTimes)
+    mrcaTag, mrcaOri, mrcaIdx, mrcaTime = findMRCA(mutTags, mutTimes, forest)
+    if mrcaTag is not None:
         mutTimes.sort(key=len, reverse=True)
         mutTags.sort(key=len, reverse=True)
         npMutTags = transTagsToNumpyArr(mutTags)
@@ -290,35 +233,33 @@ def processDataOneFile(FILE):
 
 
 def serchTheDirs(FILE, template, dirr=os.getcwd()):
-    """Walk the directory tree in search of model runs and process each
-    simulation individually. Produces some meta-statistics regarding the
-    results geathered in Numpy structured array."""
+    """Go through the model runs in the catalog of the directory tree (see
+    `run_catalog`) having the FILE and process each simulation individually.
+    Produces some meta-statistics regarding the results geathered in Numpy
+    structured array."""
 #    vv = ppma.lookForVAR(template)
     vv = ppma.lookForVARinList(template)
     datOut = []
     dataOrdering = ['VAR', 'VARX', 'MRCA_time', 'maxMutNumb', 'numOfGenes']
-    for dirName, subdirList, fileList in os.walk(dirr):
-        for file in fileList:
-            filepath = os.path.join(dirName, file)
-            if filepath == os.path.join(dirName, FILE):
-                try:
-                    paramList = ppma.loadParamSettings(os.path.join(dirName,
-                                                       "InputParameters.json"))
-                except Exception:
-                    print("Cannot load the parameters. in dir", dirName)
-                    continue
-                if ppma.compareParams(template, paramList):
-                    try:
-                        DATA = processDataOneFile(filepath)
-                    except Exception:
-                        print("Cannot load the data. in dir", dirName)
-                        continue
-                    plotTheTimes(DATA[0], DATA[1], DATA[2], DATA[3], DATA[4],
-                                 dirName)
-                    var = float(paramList[vv['VAR']])
-                    varx = float(paramList[vv['VARX']])
-                    datOut.append((var, varx, DATA[6], DATA[0].shape[1],
-                                   DATA[0].shape[0], dirName))
+    for run in rcat.findRuns(dirr=dirr, withFile=FILE):
+        dirName = run['dir']
+        filepath = os.path.join(dirName, FILE)
+        paramList = ppma.paramSettingsFromDict(run['params'])
+        if paramList is None:
+            print("Cannot load the parameters. in dir", dirName)
+            continue
+        if ppma.compareParams(template, paramList):
+            try:
+                DATA = processDataOneFile(filepath)
+            except Exception:
+                print("Cannot load the data. in dir", dirName)
+                continue
+            plotTheTimes(DATA[0], DATA[1], DATA[2], DATA[3], DATA[4],
+                         dirName)
+            var = float(paramList[vv['VAR']])
+            varx = float(paramList[vv['VARX']])
+            datOut.append((var, varx, DATA[6], DATA[0].shape[1],
+                           DATA[0].shape[0], dirName))
     if len(datOut) > 0:
         datOut = np.array(datOut, dtype=outType)
         return np.sort(datOut, order=dataOrdering)
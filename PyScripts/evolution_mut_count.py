@@ -10,38 +10,19 @@ for Evolutionary Biology Group, Faculty of Biology
     Adam Mickiewicz University, Poznan, Poland
 @author: Piotr Bentkowski - bentkowski.piotr@gmail.com
 """
-import re
 import sys
 import json
 # import linecache as ln
-import numpy as np
 import matplotlib.pyplot as plt
-import bitstring as bts
+import genome_snapshot as gsnp
 
 
 def loadHostPopulation(FILE):
     '''Takes the file with all the hosts data and loads it to a list. Each
     individual is loaded as a list of bit strings. And the population is a list
     of individuals.'''
-    B_list = []
-    Mut_list = []
     try:
-        with open(FILE) as infile:
-            for line in infile:
-                if re.search(r"#", line):
-                    continue
-                elif re.search(r"===", line):
-                    continue
-                else:
-                    LL = line.split()
-#                    bb = int(LL[3])
-                    bb = bts.BitString(bin=LL[0]).int
-                    if bb in B_list:
-                        pass
-                    else:
-                        B_list.append(bb)
-                        Mut_list.append((len(LL) - 4) // 2)
-        return np.array(Mut_list)
+        return gsnp.uniqueAlleles(gsnp.loadHostSnapshot(FILE))['mutations']
     except IOError as e:
         print("I/O error({0}) in".format(e.errno) +
               " loadTheHostPopulation(): {0}".format(e.strerror))
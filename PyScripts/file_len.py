@@ -3,13 +3,146 @@
 """
 Just an utility function. Counts the number of lines in a text file.
 
+The file is read in large binary chunks (plain or compressed, see
+`compressed_files`) and the newlines are counted in C with `bytes.count()`
+instead of looping over the lines in Python. The same way it counts the
+` === ... ===` host/pathogen records of the genome snapshots and the
+generations (data rows) of the wide per-generation CSV files. Many files can
+be counted at once in worker processes:
+
+    file_len.py [--records | --generations] [-j N] FILE [FILE ...]
+
 Created on Mon May 30 17:38:33 2011
 Author: Piotr Bentkowski - p.bentkowski@uea.ac.uk, bentkowski.piotr@gmail.com
 """
+import re
+import sys
+import argparse
+import multiprocessing as mp
+import compressed_files as cfs
+
+
+# Amount of the file read at once.
+CHUNK_BYTES = 2**24
+# Header lines of single hosts/pathogens in the genome snapshot files.
+RECORD_LINE = re.compile(br'^[ \t]*===', re.MULTILINE)
+# Data rows (not comments, not empty) of the per-generation files.
+DATA_LINE = re.compile(br'^[ \t]*[^#\s]', re.MULTILINE)
+
+
+def _wholeLineChunks(fname):
+    """Reads fname in chunks of about CHUNK_BYTES cut at line ends, so that
+    no line is split between two chunks."""
+    rest = b''
+    with cfs.openFile(fname, 'rb') as f:
+        while True:
+            chunk = f.read(CHUNK_BYTES)
+            if not chunk:
+                break
+            cut = chunk.rfind(b'\n') + 1
+            if cut == 0:
+                rest += chunk
+                continue
+            yield rest + chunk[:cut]
+            rest = chunk[cut:]
+    if rest:
+        yield rest
 
 
 def file_len(fname):
-    with open(fname) as f:
-        for i, l in enumerate(f):
-            pass
-    return i + 1
+    """Number of lines in the file. A last line without the newline counts
+    too; an empty file has 0 lines."""
+    count = 0
+    last = b'\n'
+    with cfs.openFile(fname, 'rb') as f:
+        while True:
+            chunk = f.read(CHUNK_BYTES)
+            if not chunk:
+                break
+            count += chunk.count(b'\n')
+            last = chunk[-1:]
+    if last != b'\n':
+        count += 1
+    return count
+
+
+def countMatchingLines(fname, pattern):
+    """Number of lines of the file matched by the compiled bytes regex
+    pattern (in the MULTILINE mode)."""
+    count = 0
+    for chunk in _wholeLineChunks(fname):
+        count += sum(1 for _ in pattern.finditer(chunk))
+    return count
+
+
+def countRecords(fname):
+    """Number of ` === Host has ... ===` or ` === Patho. sp. ... ===` records
+    (individuals) in a genome snapshot file."""
+    return countMatchingLines(fname, RECORD_LINE)
+
+
+def countGenerations(fname):
+    """Number of generations (data rows) in a wide per-generation file like
+    NumberOfMhcBeforeMating.csv or in HostsGeneDivers.csv."""
+    return countMatchingLines(fname, DATA_LINE)
+
+
+COUNTERS = {'lines': file_len, 'records': countRecords,
+            'generations': countGenerations}
+
+
+def _countOne(task):
+    """Counts one file for `countFiles()`. Returns `(fname, count)` with
+    count None when the file cannot be read."""
+    fname, what = task
+    try:
+        return fname, COUNTERS[what](fname)
+    except OSError as e:
+        print("ERROR in countFiles(): cannot read", fname, "-", e)
+        return fname, None
+
+
+def countFiles(fnames, what='lines', jobs=mp.cpu_count()):
+    """Counts 'lines', 'records' or 'generations' in many files using `jobs`
+    worker processes. Returns a list of `(fname, count)` pairs in the order
+    of fnames; count is None for files which cannot be read."""
+    tasks = [(fname, what) for fname in fnames]
+    if jobs <= 1 or len(tasks) <= 1:
+        return [_countOne(task) for task in tasks]
+    pool = mp.Pool(min(jobs, len(tasks)))
+    try:
+        return pool.map(_countOne, tasks, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def main():
+    """ """
+    parser = argparse.ArgumentParser(
+        description="Counts lines (default), records or generations in the "
+        "model's output files.")
+    parser.add_argument('files', nargs='+', help="files to count")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--records', action='store_const', dest='what',
+                       const='records', help="count the ' === ... ===' "
+                       "host/pathogen records of genome snapshots")
+    group.add_argument('--generations', action='store_const', dest='what',
+                       const='generations', help="count the data rows of "
+                       "per-generation files")
+    parser.add_argument('-j', '--jobs', type=int, default=mp.cpu_count(),
+                        help="number of worker processes")
+    parser.set_defaults(what='lines')
+    args = parser.parse_args()
+    failed = False
+    for fname, count in countFiles(args.files, args.what, args.jobs):
+        if count is None:
+            failed = True
+        else:
+            print(count, fname)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Genealogy of the MHC genes of a host population snapshot as a parent-pointer
+forest. Every gene in the snapshot carries its ancestry: the tags of all its
+predecessors from the oldest one and the times they arose (see
+`evolution_big_stats.loadHostPopulation()`). The chains are merged once into
+one node per tag with the index of its parent node, so the most recent common
+ancestor, the coalescence (split) times, the lineage depths and the lifetimes
+of the surviving lineages come from a few array operations over the nodes
+instead of scanning the chains again and again.
+
+Created on Sun Oct 18 23:12:40 2026
+for Evolutionary Biology Group, Faculty of Biology
+    Adam Mickiewicz University, Poznan, Poland
+"""
+import itertools
+import numpy as np
+
+
+def _flatten(chains, dtype):
+    """Concatenates a list of sequences into one array."""
+    return np.array(list(itertools.chain.from_iterable(chains)), dtype=dtype)
+
+
+def buildForest(tagChains, timeChains):
+    """Builds the forest from the ancestry chains of the genes (lists of
+    tags and of origin times, the oldest ancestor first and the gene itself
+    last). Returns a dictionary of arrays:
+
+    ================  =======================================================
+    key               info
+    ================  =======================================================
+    `tag`             tags of the nodes (genes and ancestors), sorted
+    `parent`          index of the parent node, -1 for the roots
+    `origin`          time the node arose
+    `depth`           number of ancestors of the node
+    `chain_nodes`     node index of every entry of the chains, concatenated
+    `chain_offsets`   offsets of the chains into `chain_nodes`
+    ================  =======================================================
+    """
+    lengths = np.array([len(cc) for cc in tagChains], dtype=np.int64)
+    offsets = np.concatenate(([0], np.cumsum(lengths)))
+    tags = _flatten(tagChains, np.int64)
+    times = _flatten(timeChains, np.int64)
+    depth = np.arange(len(tags)) - np.repeat(offsets[:-1], lengths)
+    uniq, first, inverse = np.unique(tags, return_index=True,
+                                     return_inverse=True)
+    inverse = inverse.ravel()
+    # the parent of a node is the entry before its first one in a chain
+    parent = np.full(len(uniq), -1, dtype=np.int64)
+    child = depth[first] > 0
+    parent[child] = inverse[first[child] - 1]
+    return {'tag': uniq,
+            'parent': parent,
+            'origin': times[first],
+            'depth': depth[first],
+            'chain_nodes': inverse,
+            'chain_offsets': offsets}
+
+
+def leaves(forest):
+    """Node indices of the genes themselves (the last entry of each
+    chain)."""
+    return forest['chain_nodes'][forest['chain_offsets'][1:] - 1]
+
+
+def lineageCounts(forest):
+    """Number of chains (genes of the snapshot) passing through every node,
+    i.e. the genes the node is an ancestor of or is itself."""
+    return np.bincount(forest['chain_nodes'], minlength=len(forest['tag']))
+
+
+def splitTimes(forest):
+    """Earliest origin among the children of every node that still have
+    genes in the snapshot: the time the lineages through the node split.
+    np.inf for nodes with no such children."""
+    counts = lineageCounts(forest)
+    child = (forest['parent'] >= 0) & (counts > 0)
+    split = np.full(len(forest['tag']), np.inf)
+    np.minimum.at(split, forest['parent'][child],
+                  forest['origin'][child].astype(float))
+    return split
+
+
+def findMRCA(forest):
+    """Finds the most recent common ancestor of all the genes: the deepest
+    node all the chains pass through. Returns a tuple `(node, splitTime)`
+    with its index and the time its lineages split (see splitTimes()), or
+    `(-1, np.nan)` when the genes descend from more than one root."""
+    common = np.flatnonzero(lineageCounts(forest) ==
+                            len(forest['chain_offsets']) - 1)
+    if not len(common):
+        return -1, np.nan
+    node = common[np.argmax(forest['depth'][common])]
+    return node, splitTimes(forest)[node]
+
+
+def coalescenceTimes(forest):
+    """Nodes where lineages of the snapshot genes coalesce: the ones with at
+    least two children carrying genes of the snapshot, or being a gene of
+    the snapshot themselves and an ancestor of another one. Returns a tuple
+    `(nodes, times)` with their indices and split times, by depth."""
+    counts = lineageCounts(forest)
+    child = (forest['parent'] >= 0) & (counts > 0)
+    branches = np.bincount(forest['parent'][child],
+                           minlength=len(forest['tag']))
+    isGene = np.zeros(len(forest['tag']), dtype=np.int64)
+    isGene[leaves(forest)] = 1
+    nodes = np.flatnonzero(branches + isGene >= 2)
+    nodes = nodes[np.argsort(forest['depth'][nodes], kind='mergesort')]
+    return nodes, splitTimes(forest)[nodes]
+
+
+def lineageDepths(forest):
+    """Number of mutations in the history of every gene of the snapshot."""
+    return forest['depth'][leaves(forest)]
+
+
+def survivingLifetimes(forest, maxTime):
+    """How long the lineage of every gene of the snapshot has lasted since
+    the gene arose, up to maxTime (the snapshot time)."""
+    return maxTime - forest['origin'][leaves(forest)]
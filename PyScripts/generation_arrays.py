@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Converts the wide per-generation host files (one row per host generation, one
+column per host) like `NumberOfMhcBeforeMating.csv`, `NumberOfMhcInMother.csv`
+or `PresentedPathogenNumbers.csv` into compact binary 2-D arrays. The values
+are stored with the smallest integer type that fits them (usually uint8)
+next to a separate time vector, and are memory-mapped on load, so generations
+can be sliced without reading the whole file. When only the last N
+generations are needed, `loadLastGenerations()` reads them backwards from the
+end of the text file instead.
+
+Created on Sun Oct 18 14:05:12 2026
+for Evolutionary Biology Group, Faculty of Biology
+    Adam Mickiewicz University, Poznan, Poland
+"""
+import os
+import sys
+import shutil
+import tempfile
+from collections import deque
+from array import array
+import numpy as np
+import genome_snapshot as gsnp
+import compressed_files as cfs
+
+
+GENERATIONS_KIND = 'generations'
+# Number of array cells copied at once when writing the final .npy file.
+CHUNK_CELLS = 2**24
+# Size of the blocks read when walking a file backwards.
+TAIL_BLOCK = 2**16
+
+
+def smallestIntType(minVal, maxVal):
+    """Returns the smallest Numpy integer type holding values from minVal to
+    maxVal."""
+    return np.promote_types(np.min_scalar_type(int(minVal)),
+                            np.min_scalar_type(int(maxVal)))
+
+
+def _parseGenerationFile(FILE, dirr):
+    """Reads the text file FILE line by line and writes its content into
+    `time.npy` (first column) and `data.npy` (all the other columns) in the
+    directory dirr. Raises ValueError when rows have unequal length."""
+    rawPath = os.path.join(dirr, 'data.raw')
+    times = array('q')
+    nCols = -1
+    minVal = 0
+    maxVal = 0
+    with cfs.openFile(FILE) as infile, open(rawPath, 'wb') as raw:
+        for line in infile:
+            if line.startswith('#'):
+                continue
+            row = np.fromstring(line, dtype=np.int64, sep=' ')
+            if len(row) == 0:
+                continue
+            if nCols < 0:
+                nCols = len(row) - 1
+            elif len(row) - 1 != nCols:
+                raise ValueError("_parseGenerationFile(): row for time " +
+                                 str(row[0]) + " has " + str(len(row) - 1) +
+                                 " columns instead of " + str(nCols) + ".")
+            times.append(int(row[0]))
+            if nCols > 0:
+                minVal = min(minVal, row[1:].min())
+                maxVal = max(maxVal, row[1:].max())
+                raw.write(row[1:].astype(np.int32).tobytes())
+    nRows = len(times)
+    nCols = max(nCols, 0)
+    dtype = smallestIntType(minVal, maxVal)
+    dst = np.lib.format.open_memmap(os.path.join(dirr, 'data.npy'),
+                                    mode='w+', dtype=dtype,
+                                    shape=(nRows, nCols))
+    if nRows * nCols > 0:
+        src = np.memmap(rawPath, dtype=np.int32, mode='r',
+                        shape=(nRows, nCols))
+        step = max(1, CHUNK_CELLS // nCols)
+        for ii in range(0, nRows, step):
+            dst[ii:ii+step] = src[ii:ii+step]
+        del src
+    dst.flush()
+    del dst
+    os.remove(rawPath)
+    np.save(os.path.join(dirr, 'time.npy'), np.array(times, dtype=np.int64))
+
+
+def convertGenerationFile(FILE):
+    """Converts the text file FILE into the binary FILE + '.npycache'
+    directory (`time.npy` and `data.npy`). The cache is keyed on the size and
+    modification time of FILE, so it is rebuilt once the file changes."""
+    tmpDir = gsnp.newCacheDir(FILE)
+    try:
+        _parseGenerationFile(FILE, tmpDir)
+        gsnp.publishCache(tmpDir, FILE, GENERATIONS_KIND, ['time', 'data'])
+    finally:
+        if os.path.isdir(tmpDir):
+            shutil.rmtree(tmpDir, ignore_errors=True)
+
+
+def loadGenerationFile(FILE, useCache=True):
+    """Loads a wide per-generation host file. Returns a tuple `(time, data)`
+    where `time` is the vector of time stamps (host generations) and `data`
+    is a generation x host array of small integers. With `useCache` the
+    arrays are memory-mapped from the binary cache, which is built or
+    refreshed when needed. Without it (or when the cache cannot be written,
+    e.g. on a read-only file system or when another process replaces it at
+    the same time) the file is converted in a temporary directory and loaded
+    to memory."""
+    if useCache:
+        cache = gsnp.loadSnapshotCache(FILE, GENERATIONS_KIND)
+        if cache is None:
+            try:
+                convertGenerationFile(FILE)
+                cache = gsnp.loadSnapshotCache(FILE, GENERATIONS_KIND)
+            except OSError as e:
+                print("WARNING in loadGenerationFile(): cannot write the",
+                      "cache for", FILE, "-", e.strerror)
+        if cache is not None:
+            return cache['time'], cache['data']
+    if not os.path.isfile(cfs.resolveFile(FILE)):
+        raise FileNotFoundError("No such file: " + str(FILE))
+    tmpDir = tempfile.mkdtemp()
+    try:
+        _parseGenerationFile(FILE, tmpDir)
+        return (np.load(os.path.join(tmpDir, 'time.npy')),
+                np.load(os.path.join(tmpDir, 'data.npy')))
+    finally:
+        shutil.rmtree(tmpDir, ignore_errors=True)
+
+
+def readLastLines(FILE, nn):
+    """Reads the text file FILE backwards from its end, block by block, and
+    returns its last nn data lines (comments and empty lines are skipped) as
+    a list of strings in the file order. Reading stops as soon as nn whole
+    lines are found, so the cost depends on nn, not on the file length.
+    A compressed file cannot be read backwards, so it is streamed from the
+    start keeping only the last nn lines."""
+    lines = []
+    if nn <= 0:
+        return lines
+    if cfs.isCompressed(FILE):
+        with cfs.openFile(FILE) as f:
+            lines = deque((line for line in f
+                           if line.strip() and not line.startswith('#')),
+                          maxlen=nn)
+        return [line.rstrip() for line in lines]
+    with open(FILE, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        pos = f.tell()
+        rest = b''
+        while pos > 0 and len(lines) < nn:
+            step = min(TAIL_BLOCK, pos)
+            pos -= step
+            f.seek(pos)
+            parts = (f.read(step) + rest).split(b'\n')
+            # the first part may be a line cut in half by the block border
+            rest = parts[0]
+            for line in reversed(parts[1:]):
+                if line.strip() and not line.startswith(b'#'):
+                    lines.append(line)
+                    if len(lines) == nn:
+                        break
+        if len(lines) < nn and rest.strip() and not rest.startswith(b'#'):
+            lines.append(rest)
+    lines.reverse()
+    return [line.decode().rstrip() for line in lines]
+
+
+def loadLastGenerations(FILE, nn):
+    """Loads only the last nn generations (rows) of a wide per-generation
+    host file, reading the file backwards with `readLastLines()`. Returns
+    a tuple `(time, data)` like `loadGenerationFile()`. Fewer rows are
+    returned if the file is shorter than nn generations."""
+    rows = [np.fromstring(line, dtype=np.int64, sep=' ') for line in
+            readLastLines(FILE, nn)]
+    if not rows:
+        return np.zeros(0, dtype=np.int64), np.zeros((0, 0), dtype=np.uint8)
+    if len(set(len(row) for row in rows)) > 1:
+        raise ValueError("loadLastGenerations(): rows of " + str(FILE) +
+                         " have unequal length.")
+    arr = np.vstack(rows)
+    data = arr[:, 1:]
+    dtype = smallestIntType(min(0, data.min(initial=0)), data.max(initial=0))
+    return arr[:, 0], data.astype(dtype)
+
+
+def main():
+    """Converts files given as arguments, e.g. to prepare the binary caches
+    of a whole run in advance."""
+    if len(sys.argv) <= 1:
+        print("Give the names of the per-generation files to convert, e.g.",
+              "NumberOfMhcBeforeMating.csv")
+        sys.exit()
+    for FILE in sys.argv[1:]:
+        try:
+            convertGenerationFile(FILE)
+            time, data = loadGenerationFile(FILE)
+            print(FILE, ":", data.shape[0], "generations x", data.shape[1],
+                  "hosts as", data.dtype)
+        except (OSError, ValueError) as e:
+            print("ERROR in main(): cannot convert", FILE, "-", e)
+
+
+if __name__ == "__main__":
+    main()
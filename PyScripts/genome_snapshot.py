@@ -0,0 +1,467 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Shared loader of the population snapshot files written by the model
+(`HostGenomesFile.XXXX.csv` and `PathoGenomesFile.XXXX.csv`). Reads a snapshot
+once, line by line, and returns
+it as a set of columnar Numpy arrays, so the analysis scripts do not have to
+walk the text file themselves. After the first parse the arrays are stored
+next to the snapshot in a `.npycache` directory and later loads memory-map
+them instead of re-reading the text.
+
+Created on Sun Oct 18 10:12:40 2026
+for Evolutionary Biology Group, Faculty of Biology
+    Adam Mickiewicz University, Poznan, Poland
+"""
+import os
+import json
+import shutil
+import tempfile
+from array import array
+import numpy as np
+import compressed_files as cfs
+import packed_bits as pbits
+
+
+# Numeric codes of the `chromosome` column of the snapshot files.
+CHROMOSOME_IDS = {'unique': 0, 'ch_one': 1, 'ch_two': 2}
+# Bump it whenever the layout of the parsed arrays changes. Caches written by
+# a different version are ignored and rebuilt.
+PARSER_VERSION = 4
+CACHE_SUFFIX = '.npycache'
+# Prefix of the directories the caches are built in.
+CACHE_TMP_PREFIX = '.tmp'
+# Number of gene/antigen lines converted to packed bits at once.
+PACK_CHUNK = 4096
+
+
+def _raggedOffsets(lengths):
+    """Turns a sequence of item counts into an offset array of length N+1,
+    so that items of the i-th record are `data[offs[i]:offs[i+1]]`."""
+    offs = np.zeros(len(lengths) + 1, dtype=np.int64)
+    offs[1:] = np.cumsum(np.asarray(lengths, dtype=np.int64))
+    return offs
+
+
+def cacheKey(FILE, kind):
+    """Identifies the version of the text file the cache was built from. For
+    a compressed file it is the compressed variant found by
+    `compressed_files.resolveFile()`."""
+    path = cfs.resolveFile(FILE)
+    st = os.stat(path)
+    return {'kind': kind, 'source': os.path.basename(path),
+            'size': st.st_size, 'mtime_ns': st.st_mtime_ns,
+            'parser_version': PARSER_VERSION}
+
+
+def newCacheDir(FILE):
+    """Creates a temporary directory next to FILE. A cache is built in it and
+    then moved into place with `publishCache()`, so a half-written cache is
+    never picked up."""
+    return tempfile.mkdtemp(prefix=CACHE_TMP_PREFIX,
+                            dir=os.path.dirname(FILE) or '.')
+
+
+def publishCache(tmpDir, FILE, kind, arrays, scalars=None):
+    """Writes `meta.json` (the cache key, names of the .npy `arrays` and the
+    `scalars` dictionary) into tmpDir and renames it to FILE + '.npycache',
+    replacing the old cache if there is one."""
+    meta = {'key': cacheKey(FILE, kind), 'arrays': list(arrays),
+            'scalars': scalars if scalars else {}}
+    with open(os.path.join(tmpDir, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+    cacheDir = FILE + CACHE_SUFFIX
+    if os.path.isdir(cacheDir):
+        shutil.rmtree(cacheDir, ignore_errors=True)
+    os.rename(tmpDir, cacheDir)
+
+
+def saveSnapshotCache(FILE, snap, kind):
+    """Stores arrays of a parsed snapshot in the FILE + '.npycache' directory,
+    one .npy file per array, plus a `meta.json` file with the cache key and
+    the scalar values."""
+    tmpDir = newCacheDir(FILE)
+    try:
+        arrays = []
+        scalars = {}
+        for name, val in snap.items():
+            if np.ndim(val) == 0:
+                scalars[name] = val.item()
+            else:
+                np.save(os.path.join(tmpDir, name + '.npy'), val)
+                arrays.append(name)
+        publishCache(tmpDir, FILE, kind, arrays, scalars)
+    finally:
+        if os.path.isdir(tmpDir):
+            shutil.rmtree(tmpDir, ignore_errors=True)
+
+
+def loadSnapshotCache(FILE, kind):
+    """Memory-maps the cached arrays of the snapshot FILE. Returns None when
+    there is no cache or it was built from a different version of the file
+    (other size or modification time) or by a different parser version."""
+    cacheDir = FILE + CACHE_SUFFIX
+    try:
+        with open(os.path.join(cacheDir, 'meta.json')) as f:
+            meta = json.load(f)
+        if meta['key'] != cacheKey(FILE, kind):
+            return None
+        snap = {}
+        for name in meta['arrays']:
+            snap[name] = np.load(os.path.join(cacheDir, name + '.npy'),
+                                 mmap_mode='r')
+        for name, val in meta['scalars'].items():
+            snap[name] = np.int64(val)
+        return snap
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def cachedSnapshot(FILE, kind, parser, useCache=True):
+    """Returns the parsed snapshot from its binary cache if it is up to date.
+    Otherwise parses the text file with `parser(FILE)` and refreshes the
+    cache. A cache that cannot be written (e.g. read-only directory) is
+    skipped with a warning."""
+    if not useCache:
+        return parser(FILE)
+    snap = loadSnapshotCache(FILE, kind)
+    if snap is not None:
+        return snap
+    snap = parser(FILE)
+    try:
+        saveSnapshotCache(FILE, snap, kind)
+    except OSError as e:
+        print("WARNING in cachedSnapshot(): cannot write the cache for",
+              FILE, "-", e.strerror)
+    return snap
+
+
+def loadHostSnapshot(FILE, useCache=True):
+    """Loads the host population snapshot HostGenomesFile.XXXX.csv, from
+    the binary cache when possible. See `parseHostSnapshot()` for the
+    returned arrays."""
+    return cachedSnapshot(FILE, 'host', parseHostSnapshot, useCache)
+
+
+def parseHostSnapshot(FILE):
+    """Parses the host population snapshot HostGenomesFile.XXXX.csv in one
+    pass. Returns a dictionary of Numpy arrays with one row per gene:
+
+    ==================  =====================================================
+    key                 info
+    ==================  =====================================================
+    `bit_gene`          genes as rows of packed 64-bit words, see
+                        `packed_bits` (a single word, the integer value of
+                        the bit string, for genes up to 64 bits)
+    `bit_length`        number of bits per gene (a scalar)
+    `chromosome`        chromosome id, see `CHROMOSOME_IDS`
+    `time_of_origin`    time the gene arose
+    `gene_own_tag`      the gene's own tag
+    `history_offsets`   N+1 offsets into `parent_tags` and `mutation_times`
+    `parent_tags`       tags of all the gene's predecessors (ragged)
+    `mutation_times`    times of origin of the predecessors (ragged)
+    `host_offsets`      H+1 offsets of the genes belonging to each host
+    `host_infecting`    number of pathogens infecting each host
+    `host_presented`    number of pathogens presented by each host
+    `presented_indptr`  H+1 offsets into `presented_species` (CSR rows)
+    `presented_species` species of the presented pathogens, one entry per
+                        presentation, so a species may repeat within a host
+    `snapshot_time`     the time step the snapshot was taken (a scalar)
+    ==================  =====================================================
+    """
+    packed = []
+    pending = []
+    chrom = array('b')
+    timeOri = array('q')
+    ownTag = array('q')
+    histLen = array('q')
+    parTags = array('q')
+    mutTimes = array('q')
+    hostStarts = array('q')
+    infecting = array('q')
+    presented = array('q')
+    presLen = array('q')
+    presSpp = array('q')
+    bitLen = 0
+    snapTime = -1
+    with cfs.openFile(FILE) as infile:
+        for line in infile:
+            if line.startswith('#'):
+                if snapTime < 0 and '=' in line:
+                    snapTime = int(line.split('=')[1])
+                continue
+            elif '===' in line:
+                # ' === Host has N parasites and presented M - these are:
+                # s1 s2 ... ===' with the species of every presented pathogen
+                hostStarts.append(len(ownTag))
+                head, _, spp = line.partition('are:')
+                head = head.split()
+                infecting.append(int(head[3]))
+                presented.append(int(head[7]))
+                spp = spp.replace('===', ' ').split()
+                presSpp.extend(map(int, spp))
+                presLen.append(len(spp))
+                continue
+            LL = line.split()
+            if not LL:
+                continue
+            if bitLen == 0:
+                bitLen = len(LL[0])
+            elif len(LL[0]) != bitLen:
+                raise ValueError("parseHostSnapshot(): genes of unequal"
+                                 " length in " + str(FILE))
+            pending.append(LL[0])
+            if len(pending) == PACK_CHUNK:
+                packed.append(pbits.packAscii(pending, bitLen))
+                pending = []
+            chrom.append(CHROMOSOME_IDS[LL[1]])
+            timeOri.append(int(LL[2]))
+            ownTag.append(int(LL[3]))
+            # a gene with no mutation history is closed with a single -1
+            if len(LL) > 5:
+                mutTimes.extend(map(int, LL[4::2]))
+                parTags.extend(map(int, LL[5::2]))
+                histLen.append((len(LL) - 4) // 2)
+            else:
+                histLen.append(0)
+    if not hostStarts:
+        hostStarts.append(0)
+    hostStarts.append(len(ownTag))
+    if pending:
+        packed.append(pbits.packAscii(pending, bitLen))
+    if packed:
+        bitGene = np.vstack(packed)
+    else:
+        bitGene = np.zeros((0, 0), dtype=np.uint64)
+    return {'bit_gene': bitGene,
+            'bit_length': np.int64(bitLen),
+            'chromosome': np.array(chrom, dtype=np.int8),
+            'time_of_origin': np.array(timeOri, dtype=np.int64),
+            'gene_own_tag': np.array(ownTag, dtype=np.int64),
+            'history_offsets': _raggedOffsets(histLen),
+            'parent_tags': np.array(parTags, dtype=np.int64),
+            'mutation_times': np.array(mutTimes, dtype=np.int64),
+            'host_offsets': np.array(hostStarts, dtype=np.int64),
+            'host_infecting': np.array(infecting, dtype=np.int64),
+            'host_presented': np.array(presented, dtype=np.int64),
+            'presented_indptr': _raggedOffsets(presLen),
+            'presented_species': np.array(presSpp, dtype=np.int64),
+            'snapshot_time': np.int64(snapTime)}
+
+
+def numberOfHosts(snap):
+    """Number of host individuals in a snapshot loaded by
+    `loadHostSnapshot()`."""
+    return len(snap['host_offsets']) - 1
+
+
+def splitPerHost(snap, column, mask=None):
+    """Splits one per-gene column of a snapshot into a list of arrays, one
+    array per host (for `bit_gene` the rows of the host's genes). With
+    `mask` (a boolean per-gene array) only the selected genes are kept, e.g.
+    genes from one chromosome."""
+    data = snap[column]
+    offs = snap['host_offsets']
+    if mask is None:
+        return np.split(data, offs[1:-1])
+    keptBefore = np.concatenate(([0], np.cumsum(mask)))
+    return np.split(data[mask], keptBefore[offs[1:-1]])
+
+
+def presentedPerHost(snap):
+    """Splits `presented_species` of a host snapshot into a list with one
+    integer array per host, holding the species of the pathogens that host
+    presented."""
+    return np.split(snap['presented_species'], snap['presented_indptr'][1:-1])
+
+
+def presentedIncidence(snap, sppNumber=None, binary=True):
+    """Returns the host x pathogen species matrix of presentations as a
+    `scipy.sparse.csr_matrix` built directly on the CSR arrays of the
+    snapshot. Each cell counts how many pathogens of a species the host
+    presented; with `binary` (the default) it is just 1 when the species was
+    presented at all. `sppNumber` sets the number of columns, otherwise it is
+    the highest presented species + 1."""
+    from scipy.sparse import csr_matrix
+    species = np.asarray(snap['presented_species'])
+    if sppNumber is None:
+        sppNumber = int(species.max()) + 1 if len(species) else 0
+    mtx = csr_matrix((np.ones(len(species), dtype=np.int64), species,
+                      np.asarray(snap['presented_indptr'])),
+                     shape=(len(snap['presented_indptr']) - 1, sppNumber))
+    # duplicated species within a row are summed up here
+    mtx.sum_duplicates()
+    if binary:
+        mtx.data[:] = 1
+    return mtx
+
+
+def geneHistory(snap, ii, column='parent_tags'):
+    """Returns the ragged mutation-history entries (`parent_tags` or
+    `mutation_times`) of the ii-th gene of the snapshot."""
+    offs = snap['history_offsets']
+    return snap[column][offs[ii]:offs[ii+1]]
+
+
+def uniqueAlleles(snap):
+    """Finds the distinct MHC alleles (`bit_gene` rows) of a host snapshot,
+    in the order they first appear in the file. Returns a dictionary:
+
+    ================  =======================================================
+    key               info
+    ================  =======================================================
+    `allele`          bit_gene row of every allele
+    `first_gene`      index of the first gene with the allele; its mutation
+                      history (see `geneHistory()`) stands for the allele
+    `multiplicity`    number of genes with the allele in the population
+    `mutations`       number of mutations in the history of `first_gene`
+    `gene_allele`     index of the allele of every gene
+    ================  =======================================================
+    """
+    alleles, first, inverse, counts = pbits.uniqueRows(
+        snap['bit_gene'], return_index=True, return_inverse=True,
+        return_counts=True)
+    order = np.argsort(first)
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    return {'allele': alleles[order],
+            'first_gene': first[order],
+            'multiplicity': counts[order],
+            'mutations': np.diff(snap['history_offsets'])[first[order]],
+            'gene_allele': rank[inverse]}
+
+
+def loadPathoSnapshot(FILE, useCache=True):
+    """Loads the pathogen population snapshot PathoGenomesFile.XXXX.csv, from
+    the binary cache when possible. See `parsePathoSnapshot()` for the
+    returned arrays."""
+    return cachedSnapshot(FILE, 'patho', parsePathoSnapshot, useCache)
+
+
+def parsePathoSnapshot(FILE):
+    """Parses the pathogen population snapshot PathoGenomesFile.XXXX.csv in
+    one pass. Returns a dictionary of Numpy arrays indexed by antigen,
+    individual and species through offset arrays:
+
+    ==================  =====================================================
+    key                 info
+    ==================  =====================================================
+    `antigen_words`     antigens as rows of packed 64-bit words, see
+                        `packed_bits`
+    `antigen_length`    number of bits per antigen (a scalar)
+    `time_of_origin`    time the antigen arose
+    `antigen_tag`       the antigen's own tag
+    `parent_offsets`    A+1 offsets into `parent_tags`
+    `parent_tags`       tags of all the antigen's predecessors (ragged)
+    `indv_offsets`      I+1 offsets of the antigens of each individual
+    `indv_species`      species number of each individual
+    `indv_infected`     number of hosts each individual has infected
+    `species`           species numbers in the file order
+    `species_offsets`   S+1 offsets of the individuals of each species
+    `snapshot_time`     the time step the snapshot was taken (a scalar)
+    ==================  =====================================================
+    """
+    packed = []
+    pending = []
+    timeOri = array('q')
+    ownTag = array('q')
+    parLen = array('q')
+    parTags = array('q')
+    indvStarts = array('q')
+    indvSpec = array('q')
+    indvInfect = array('q')
+    bitLen = 0
+    snapTime = -1
+    with cfs.openFile(FILE, 'rb') as infile:
+        for line in infile:
+            if line.startswith(b'#'):
+                if snapTime < 0 and b'=' in line:
+                    snapTime = int(line.split(b'=')[1])
+                continue
+            elif b'===' in line:
+                LL = line.split()
+                indvStarts.append(len(ownTag))
+                indvSpec.append(int(LL[4]))
+                indvInfect.append(int(LL[7]))
+                continue
+            LL = line.split()
+            if not LL:
+                continue
+            if bitLen == 0:
+                bitLen = len(LL[0])
+            elif len(LL[0]) != bitLen:
+                raise ValueError("parsePathoSnapshot(): antigens of unequal"
+                                 " length in " + str(FILE))
+            pending.append(LL[0])
+            if len(pending) == PACK_CHUNK:
+                packed.append(pbits.packAscii(pending, bitLen))
+                pending = []
+            timeOri.append(int(LL[2]))
+            ownTag.append(int(LL[3]))
+            parTags.extend(map(int, LL[4:]))
+            parLen.append(len(LL) - 4)
+    if pending:
+        packed.append(pbits.packAscii(pending, bitLen))
+    indvStarts.append(len(ownTag))
+    indvSpec = np.array(indvSpec, dtype=np.int64)
+    # individuals of one species are written in one block
+    sppStarts = np.zeros(1, dtype=np.int64)
+    if len(indvSpec):
+        newSpp = np.flatnonzero(np.diff(indvSpec)) + 1
+        sppStarts = np.concatenate(([0], newSpp, [len(indvSpec)]))
+    species = indvSpec[sppStarts[:-1]]
+    if len(np.unique(species)) != len(species):
+        raise ValueError("parsePathoSnapshot(): individuals of one species"
+                         " are not stored together in " + str(FILE))
+    if packed:
+        antigenWords = np.vstack(packed)
+    else:
+        antigenWords = np.zeros((0, 0), dtype=np.uint64)
+    return {'antigen_words': antigenWords,
+            'antigen_length': np.int64(bitLen),
+            'time_of_origin': np.array(timeOri, dtype=np.int64),
+            'antigen_tag': np.array(ownTag, dtype=np.int64),
+            'parent_offsets': _raggedOffsets(parLen),
+            'parent_tags': np.array(parTags, dtype=np.int64),
+            'indv_offsets': np.array(indvStarts, dtype=np.int64),
+            'indv_species': indvSpec,
+            'indv_infected': np.array(indvInfect, dtype=np.int64),
+            'species': species,
+            'species_offsets': sppStarts.astype(np.int64),
+            'snapshot_time': np.int64(snapTime)}
+
+
+def antigenStrings(snap, reverse=False):
+    """Converts the packed antigens of a pathogen snapshot back into a list of
+    '0'/'1' strings. With `reverse` the strings are turned back to front, so
+    the i-th character is the i-th bit of the antigen in the model."""
+    return pbits.toStrings(snap['antigen_words'], snap['antigen_length'],
+                           reverse)
+
+
+def speciesAntigenRange(snap, sp):
+    """Returns the first and one-past-the-last index of the antigens of the
+    sp-th species (in the file order) of a pathogen snapshot, so all its
+    antigens are e.g. `snap['antigen_words'][first:last]`."""
+    indvOffs = snap['indv_offsets']
+    sppOffs = snap['species_offsets']
+    return indvOffs[sppOffs[sp]], indvOffs[sppOffs[sp+1]]
+
+
+def splitPerSpecies(snap, perAntigen):
+    """Arranges a per-antigen sequence (e.g. a column of the snapshot or
+    the list made by `antigenStrings()`) into nested lists: a list of
+    species, each a list of individuals, each a list of its antigens."""
+    indvOffs = snap['indv_offsets']
+    sppOffs = snap['species_offsets']
+    LL = []
+    for sp in range(len(sppOffs) - 1):
+        LL.append([list(perAntigen[indvOffs[ii]:indvOffs[ii+1]])
+                   for ii in range(sppOffs[sp], sppOffs[sp+1])])
+    return LL
+
+
+def bitGeneStrings(snap):
+    """Converts the `bit_gene` column back into a list of '0'/'1' strings,
+    the way they are written in the snapshot file."""
+    return pbits.toStrings(snap['bit_gene'], snap['bit_length'])
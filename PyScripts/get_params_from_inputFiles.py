@@ -13,6 +13,7 @@ import os
 import sys
 import json
 import datetime as dt
+import run_catalog as rcat
 # import linecache as ln
 
 
@@ -51,43 +52,38 @@ def loadTheDateFromParamFile(filePar):
 
 
 def printTheParams3(theStartDate, dirr=os.getcwd()):
-    """Walking the dir using Python 3.5. Variable theStartDate has to be
-    a datetime.date() data type."""
+    """Goes through the runs in the catalog of the dir (see `run_catalog`).
+    Variable theStartDate has to be a datetime.date() data type."""
     nogphoch = 'number_of_genes_per_host_one_chromosome'
     nopgpohg = 'number_of_pathogen_generation_per_one_host_generation'
     hmnogich = 'host_maximal_number_of_genes_in_chromosome'
-    for dirName, subdirList, fileList in os.walk(dirr):
-        for file in fileList:
-            filepath = os.path.join(dirName, file)
-            if(filepath == os.path.join(dirName, 'InputParameters.json') and
-               loadTheDateFromParamFile(filepath) >= theStartDate):
-                ST = ""
-                with open(filepath, 'r') as f:
-                    prms = json.load(f)
-                if prms['separated_species_genomes'] == "YES":
-                    sepSpGen = "10"
-                elif prms['separated_species_genomes'] == "NO":
-                    sepSpGen = "11"
-                else:
-                    sepSpGen = prms['separated_species_genomes']
-                ST = str(prms['number_of_threads']) + " "\
-                    + str(prms['number_of_bits_per_gene']) + " "\
-                    + str(prms['number_of_bits_per_antigen']) + " "\
-                    + str(prms['host_population_size']) + " "\
-                    + str(prms['pathogen_population_size']) + " "\
-                    + str(prms['number_of_pathogen_species']) + " "\
-                    + str(prms[nogphoch]) + " "\
-                    + str(prms[nopgpohg]) + " "\
-                    + str(prms['number_of_host_generations']) + " "\
-                    + str(prms['mutation_probability_in_host']) + " "\
-                    + str(prms['mutation_probability_in_pathogen']) + " "\
-                    + sepSpGen + " "\
-                    + str(prms['host_gene_deletion_probability']) + " "\
-                    + str(prms['host_gene_duplication_probability']) + " "\
-                    + str(prms[hmnogich]) + " "\
-                    + str(prms['number_of_sex_mates']) + " "\
-                    + str(prms['alpha_factor_for_the_host_fitness_function'])
-                print(ST)
+    for run in rcat.findRuns(theStartDate, dirr):
+        ST = ""
+        prms = run['params']
+        if prms['separated_species_genomes'] == "YES":
+            sepSpGen = "10"
+        elif prms['separated_species_genomes'] == "NO":
+            sepSpGen = "11"
+        else:
+            sepSpGen = prms['separated_species_genomes']
+        ST = str(prms['number_of_threads']) + " "\
+            + str(prms['number_of_bits_per_gene']) + " "\
+            + str(prms['number_of_bits_per_antigen']) + " "\
+            + str(prms['host_population_size']) + " "\
+            + str(prms['pathogen_population_size']) + " "\
+            + str(prms['number_of_pathogen_species']) + " "\
+            + str(prms[nogphoch]) + " "\
+            + str(prms[nopgpohg]) + " "\
+            + str(prms['number_of_host_generations']) + " "\
+            + str(prms['mutation_probability_in_host']) + " "\
+            + str(prms['mutation_probability_in_pathogen']) + " "\
+            + sepSpGen + " "\
+            + str(prms['host_gene_deletion_probability']) + " "\
+            + str(prms['host_gene_duplication_probability']) + " "\
+            + str(prms[hmnogich]) + " "\
+            + str(prms['number_of_sex_mates']) + " "\
+            + str(prms['alpha_factor_for_the_host_fitness_function'])
+        print(ST)
 
 
 def main():
@@ -9,33 +9,17 @@ for Evolutionary Biology Group, Faculty of Biology
     Adam Mickiewicz University, Poznan, Poland
 @author: Piotr Bentkowski - bentkowski.piotr@gmail.com
 """
-import re
 import sys
+import genome_snapshot as gsnp
 
 
 def loadHostPopulation(FILE):
     '''Takes the file with all the hosts data loads it to a list. Each
     individual is loaded as a list of gene tags. And the population is a list
     of individuals.'''
-    B_list = []
-    Gene_list = []
-    contin = False
     try:
-        with open(FILE) as infile:
-            for line in infile:
-                if re.search(r"#", line):
-                    continue
-                elif (re.search(r"===", line) and contin):
-                    Gene_list.append(B_list)
-                    B_list = []
-                elif (re.search(r"===", line) and contin is False):
-                    continue
-                else:
-                    contin = True
-                    LL = line.split()
-                    B_list.append(int(LL[3]))
-        Gene_list.append(B_list)
-        return Gene_list
+        snap = gsnp.loadHostSnapshot(FILE)
+        return gsnp.splitPerHost(snap, 'gene_own_tag')
     except IOError as e:
         print("I/O error({0}) in".format(e.errno) +
               " loadTheHostPopulation(): {0}".format(e.strerror))
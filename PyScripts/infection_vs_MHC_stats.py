@@ -9,16 +9,17 @@ for Evolutionary Biology Group, Faculty of Biology
     Adam Mickiewicz University, Poznan, Poland
 @author: Piotr Bentkowski - bentkowski.piotr@gmail.com
 """
-import re
 import os
 import sys
-import json
 import numpy as np
 # import linecache as ln
 import matplotlib.pyplot as plt
 from scipy.stats import linregress
 # depends on this packedge of mine:
 import packed_plots_of_MHC_alleles as ppma
+import genome_snapshot as gsnp
+import packed_bits as pbits
+import run_catalog as rcat
 
 
 # """Data type for storing processed data"""
@@ -48,26 +49,12 @@ def the_line(x, a, b):
 
 def loadHostPopulation(FILE):
     '''Takes the file with all the hosts data loads it to a list. Each
-    individual is loaded as a list of bit strings.And the population is a list
+    individual is loaded as an array of its packed MHC genes, one row of
+    64-bit words per gene (see `packed_bits`). And the population is a list
     of individuals.'''
-    LL = []
-    ll = []
-    nextHost = False
     try:
-        with open(FILE) as infile:
-            for line in infile:
-                if re.search(r"#", line):
-                    continue
-                elif re.search(r"===", line):
-                    if nextHost:
-                        LL.append(ll)
-                        ll = []
-                else:
-                    nextHost = True
-                    ll.append(line.split()[0])
-        LL.append(ll)
-#        print j + 1
-        return LL
+        snap = gsnp.loadHostSnapshot(FILE)
+        return gsnp.splitPerHost(snap, 'bit_gene')
     except IOError as e:
         print("\nI/O error({0}) in".format(e.errno),
               "loadTheHostPopulation(): {0}".format(e.strerror))
@@ -75,22 +62,12 @@ def loadHostPopulation(FILE):
 
 
 def loadPathoExposed(FILE):
-    """ """
-    LL = []
+    """Loads the species of the pathogens presented by each host from the
+    headers of the host snapshot FILE. Returns a list with one integer array
+    per host."""
     try:
-        with open(FILE) as infile:
-            for line in infile:
-                if re.search(r"#", line):
-                    continue
-                elif re.search(r"===", line):
-                    ll = line.split()
-                    if int(ll[7]) > 0:
-                        LL.append(ll[11:-1])
-                    else:
-                        LL.append([])
-                else:
-                    continue
-        return LL
+        snap = gsnp.loadHostSnapshot(FILE)
+        return gsnp.presentedPerHost(snap)
     except IOError as e:
         print("\nI/O error({0}) in".format(e.errno),
               "loadPathoExposed(): {0}".format(e.strerror))
@@ -98,15 +75,8 @@ def loadPathoExposed(FILE):
 
 
 def uniqueMhcInHostOnly(hostPopList):
-    """ """
-    uniqHosts = []
-    for indv in hostPopList:
-        ll = []
-        for mhc in indv:
-            if mhc not in ll:
-                ll.append(mhc)
-        uniqHosts.append(ll)
-    return uniqHosts
+    """Distinct MHC alleles (rows of packed genes, sorted) of each host."""
+    return [pbits.uniqueRows(indv) for indv in hostPopList]
 
 
 def calculateTheNumbers(hostPopList, pathoExposed):
@@ -147,49 +117,45 @@ def plotMHCvsPathoPresent(uniqNumb, pathoNumb, slope, intercept,
 
 
 def getTheData(theStartDate, templateList, dirr=os.getcwd()):
-    """Walking the dir using Python 3.6. Variable theStartDate has to be
-    a datetime.date() data type."""
+    """Goes through the runs in the catalog of the dir (see `run_catalog`).
+    Variable theStartDate has to be a datetime.date() data type."""
     vv = ppma.lookForVARinList(templateList)
     datOut = []
     dataOrdering = ['VAR', 'VARX', 'slope', 'intercept']
-    for dirName, subdirList, fileList in os.walk(dirr):
-        for file in fileList:
-            filepath = os.path.join(dirName, file)
-            if(filepath == os.path.join(dirName, 'InputParameters.json') and
-               ppma.loadTheDateFromParamFile(filepath) >= theStartDate):
-                paramzList = ppma.loadParamSettings(filepath)
-                if ppma.compareParams(templateList, paramzList):
-                    with open(filepath) as f:
-                        prms = json.load(f)
-                    path_spp = float(prms['number_of_pathogen_species'])
-                    lg = prms['number_of_host_generations']
-                    genomeFileName = "HostGenomesFile." + str(lg) + ".csv"
-                    genomeFileName = os.path.join(dirName, genomeFileName)
-#                    print(genomeFileName)
-                    var = float(paramzList[vv['VAR']])
-                    varx = float(paramzList[vv['VARX']])
-                    try:
-                        print(dirName, end=' : ')
-                        pathos = loadPathoExposed(genomeFileName)
-                        hosts = loadHostPopulation(genomeFileName)
-                        if hosts is None or pathos is None:
-                            print("Failed to read data")
-                            continue
-                        else:
-                            print("Done")
-                    except Exception:
-                        print("ERROR in getTheData(): cant's load the host",
-                              "population data")
-                        continue
-                    uniqNumb, pathoNumb = calculateTheNumbers(hosts, pathos)
-                    uniqNumb = np.hstack((uniqNumb, 0))
-                    pathoNumb = np.hstack((pathoNumb, 0))
-                    # slope, intercept, r_val, p_val, std_err
-                    data = linregress(uniqNumb, pathoNumb)
-                    plotMHCvsPathoPresent(uniqNumb, pathoNumb,
-                                          data[0], data[1], dirName)
-                    datOut.append((var, varx, data[0], data[1], data[2]**2,
-                                   data[3], data[4], path_spp, dirName))
+    for run in rcat.findRuns(theStartDate, dirr):
+        dirName = run['dir']
+        prms = run['params']
+        paramzList = ppma.paramSettingsFromDict(prms)
+        if ppma.compareParams(templateList, paramzList):
+            path_spp = float(prms['number_of_pathogen_species'])
+            lg = prms['number_of_host_generations']
+            genomeFileName = "HostGenomesFile." + str(lg) + ".csv"
+            genomeFileName = os.path.join(dirName, genomeFileName)
+#            print(genomeFileName)
+            var = float(paramzList[vv['VAR']])
+            varx = float(paramzList[vv['VARX']])
+            try:
+                print(dirName, end=' : ')
+                pathos = loadPathoExposed(genomeFileName)
+                hosts = loadHostPopulation(genomeFileName)
+                if hosts is None or pathos is None:
+                    print("Failed to read data")
+                    continue
+                else:
+                    print("Done")
+            except Exception:
+                print("ERROR in getTheData(): cant's load the host",
+                      "population data")
+                continue
+            uniqNumb, pathoNumb = calculateTheNumbers(hosts, pathos)
+            uniqNumb = np.hstack((uniqNumb, 0))
+            pathoNumb = np.hstack((pathoNumb, 0))
+            # slope, intercept, r_val, p_val, std_err
+            data = linregress(uniqNumb, pathoNumb)
+            plotMHCvsPathoPresent(uniqNumb, pathoNumb,
+                                  data[0], data[1], dirName)
+            datOut.append((var, varx, data[0], data[1], data[2]**2,
+                           data[3], data[4], path_spp, dirName))
     datOut = np.array(datOut, dtype=outType)
     return np.sort(datOut, order=dataOrdering)
 
@@ -12,8 +12,9 @@ for Evolutionary Biology Group, Faculty of Biology
 
 import os
 import sys
-import json
 import pylab as p
+import run_catalog as rcat
+import compressed_files as cfs
 # import linecache as ln
 
 
@@ -32,30 +33,28 @@ def loadTheData3(DIRR=os.getcwd()):
     """Iterates trough directories and look for HostsGeneDivers.csv file and
     corresponding InputParameters.json then copies the necessary data to
     a Python list to be analysed and plotted later on in the program. Version
-    for Python 3.5 utilazing os.walk() function"""
+    for Python 3.5 utilazing the catalog of runs (see `run_catalog`)"""
     TheData = []
-    for dirName, subdirList, fileList in os.walk(DIRR):
-        for file in fileList:
-            filepath = os.path.join(dirName, file)
-            if filepath == os.path.join(dirName, 'HostsGeneDivers.csv'):
-                genes = p.genfromtxt(filepath)
-                paramsFile = os.path.join(dirName, 'InputParameters.json')
-                with open(paramsFile) as f:
-                    prms = json.load(f)
-                # change here
-                interestOne = float(prms['mutation_probability_in_pathogen'])
-                # change here
-                interestTwo = float(prms['number_of_pathogen_species'])
-                path_spp = prms['number_of_pathogen_species']
-                pop_size = float(prms['host_population_size'])
-                if path_spp == "NOT_IN_THIS_MODEL":
-                    path_spp = 1
-                print("patho species:", path_spp, "| things:",  interestOne,
-                      " ; ", interestTwo, "| dir:", dirName.split("/")[-1])
-                TheData.append((interestOne, interestTwo, int(path_spp),
-                                genes[:, 0], genes[:, 3], genes[:, 4],
-                                genes[:, 5], genes[:, 2], genes[:, 6],
-                                pop_size))
+    for run in rcat.findRuns(dirr=DIRR, withFile='HostsGeneDivers.csv'):
+        dirName = run['dir']
+        filepath = os.path.join(dirName, 'HostsGeneDivers.csv')
+        with cfs.openFile(filepath) as f:
+            genes = p.genfromtxt(f)
+        prms = run['params']
+        # change here
+        interestOne = float(prms['mutation_probability_in_pathogen'])
+        # change here
+        interestTwo = float(prms['number_of_pathogen_species'])
+        path_spp = prms['number_of_pathogen_species']
+        pop_size = float(prms['host_population_size'])
+        if path_spp == "NOT_IN_THIS_MODEL":
+            path_spp = 1
+        print("patho species:", path_spp, "| things:",  interestOne,
+              " ; ", interestTwo, "| dir:", dirName.split("/")[-1])
+        TheData.append((interestOne, interestTwo, int(path_spp),
+                        genes[:, 0], genes[:, 3], genes[:, 4],
+                        genes[:, 5], genes[:, 2], genes[:, 6],
+                        pop_size))
     return TheData
 
 
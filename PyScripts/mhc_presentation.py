@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Re-derives offline which antigens the MHC alleles of the hosts present, from
+a host and a pathogen population snapshot, without running the model again.
+
+The model (`Antigen::calculateEpitopes()`) slides a frame as long as the MHC
+gene along the antigen and turns the bits in the frame into an integer, an
+epitope; an antigen is presented by an MHC allele when one of its epitopes
+equals the integer of the allele (`H2Pinteraction::presentAntigen()`). The
+snapshot files write the bit strings with the highest bit first, so in the
+packed antigens of `genome_snapshot` the i-th epitope is simply the mhcLen
+bits of the antigen's integer starting at bit i. All the epitopes of a block
+of antigens are cut out of the packed words with shifts at once and looked up
+among the alleles in a direct address table (or a sorted array for long
+genes), which gives the sparse allele x antigen presentation matrix and from
+it the species each host can present.
+
+    mhc_presentation.py HostGenomesFile.XXXX.csv PathoGenomesFile.XXXX.csv
+
+Created on Sun Oct 18 21:02:17 2026
+for Evolutionary Biology Group, Faculty of Biology
+    Adam Mickiewicz University, Poznan, Poland
+"""
+import sys
+import numpy as np
+import genome_snapshot as gsnp
+import packed_bits as pbits
+
+
+# MHC genes up to this long are looked up in a direct address table of
+# 2**mhcLen entries, longer ones by binary search in the sorted alleles.
+DIRECT_LOOKUP_BITS = 24
+# Number of epitopes cut out of the antigens at once.
+BLOCK_EPITOPES = 2**23
+
+
+def epitopeCount(antigenLen, mhcLen):
+    """Number of epitopes of an antigen. The model's frame stops one bit
+    before the end of the antigen, so it is antigenLen - mhcLen and not one
+    more."""
+    return max(0, int(antigenLen) - int(mhcLen))
+
+
+def epitopeWindows(words, antigenLen, mhcLen):
+    """Cuts all the epitopes out of N packed antigens. Returns an N x E
+    uint64 array (E from `epitopeCount()`); column i holds bits i ...
+    i+mhcLen-1 of the antigen as an integer, the way
+    `Antigen::calculateEpitopes()` computes it. mhcLen is at most 64."""
+    words = pbits.asWords(words)
+    mhcLen = int(mhcLen)
+    if not 0 < mhcLen <= pbits.WORD_BITS:
+        raise ValueError("epitopeWindows(): the MHC length must be between 1"
+                         " and 64 bits.")
+    nn, ww = words.shape
+    # word q of `low` holds bits 64q ... 64q+63, `high` the next 64 bits
+    low = np.ascontiguousarray(words[:, ::-1])
+    high = np.zeros_like(low)
+    high[:, :-1] = low[:, 1:]
+    mask = np.uint64((1 << mhcLen) - 1)
+    epis = np.empty((nn, ww, pbits.WORD_BITS), dtype=np.uint64)
+    for bit in range(pbits.WORD_BITS):
+        val = low >> np.uint64(bit)
+        if bit:
+            val |= high << np.uint64(pbits.WORD_BITS - bit)
+        epis[:, :, bit] = val & mask
+    return epis.reshape(nn, -1)[:, :epitopeCount(antigenLen, mhcLen)]
+
+
+def alleleLookup(alleles, mhcLen):
+    """Returns a function mapping an array of epitopes to the indices of the
+    equal alleles (-1 where there is none). alleles have to be unique."""
+    alleles = np.asarray(alleles, dtype=np.uint64)
+    if int(mhcLen) <= DIRECT_LOOKUP_BITS:
+        table = np.full(1 << int(mhcLen), -1, dtype=np.int64)
+        table[alleles.astype(np.int64)] = np.arange(len(alleles))
+        return lambda epis: table[epis.astype(np.intp)]
+    order = np.argsort(alleles)
+    srt = alleles[order]
+
+    def lookup(epis):
+        if not len(srt):
+            return np.full(epis.shape, -1, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(srt, epis), len(srt) - 1)
+        return np.where(srt[pos] == epis, order[pos], -1)
+    return lookup
+
+
+def presentationMatrix(antigenWords, antigenLen, alleles, mhcLen,
+                       blockRows=None):
+    """Boolean K x A matrix (`scipy.sparse.csr_matrix`) telling which of the K
+    MHC alleles (integers of mhcLen bits) present which of the A packed
+    antigens. Any alleles and gene length can be given, e.g. to study
+    presentation under other gene lengths than the one of a run."""
+    from scipy.sparse import csr_matrix
+    antigenWords = pbits.asWords(antigenWords)
+    uniq, inverse = np.unique(np.asarray(alleles, dtype=np.uint64),
+                              return_inverse=True)
+    lookup = alleleLookup(uniq, mhcLen)
+    if blockRows is None:
+        blockRows = max(1, BLOCK_EPITOPES // max(1, antigenWords.shape[1] *
+                                                 pbits.WORD_BITS))
+    rows = []
+    cols = []
+    for start in range(0, len(antigenWords), blockRows):
+        found = lookup(epitopeWindows(antigenWords[start:start+blockRows],
+                                      antigenLen, mhcLen))
+        antig, epi = np.nonzero(found >= 0)
+        rows.append(found[antig, epi])
+        cols.append(antig + start)
+    rows = np.concatenate(rows) if rows else np.zeros(0, dtype=np.int64)
+    cols = np.concatenate(cols) if cols else np.zeros(0, dtype=np.int64)
+    mtx = csr_matrix((np.ones(len(rows), dtype=bool), (rows, cols)),
+                     shape=(len(uniq), len(antigenWords)))
+    # an allele matching several epitopes of one antigen is summed up here
+    mtx.sum_duplicates()
+    return mtx[inverse.ravel()]
+
+
+def _binary(mtx):
+    """Sparse matrix with all the stored values set to True."""
+    mtx = mtx.tocsr()
+    mtx.sum_duplicates()
+    mtx.eliminate_zeros()
+    mtx.data = np.ones(len(mtx.data), dtype=bool)
+    return mtx
+
+
+def snapshotPresentation(hostSnap, pathoSnap, sppNumber=None):
+    """Computes the presentation between the hosts of a host snapshot and
+    the pathogens of a pathogen snapshot (both loaded by `genome_snapshot`).
+    Returns a dictionary:
+
+    ==================  =====================================================
+    key                 info
+    ==================  =====================================================
+    `alleles`           unique MHC alleles of the hosts as integers, sorted
+    `gene_allele`       index into `alleles` of every host gene
+    `allele_antigen`    alleles x antigens presentation (sparse, boolean)
+    `allele_species`    alleles x pathogen species they present an antigen of
+    `host_species`      hosts x pathogen species they can present, like
+                        `genome_snapshot.presentedIncidence()`
+    ==================  =====================================================
+
+    The species columns are the species numbers, sppNumber of them (by
+    default the highest species number + 1). The epitopes are cut out as
+    single words, so the MHC genes can be at most 64 bits long."""
+    from scipy.sparse import csr_matrix
+    alleles, geneAllele = pbits.uniqueRows(hostSnap['bit_gene'],
+                                           return_inverse=True)
+    if alleles.shape[1] > 1:
+        raise ValueError("snapshotPresentation(): MHC genes longer than 64"
+                         " bits are not supported.")
+    alleles = alleles.ravel()
+    alleleAntigen = presentationMatrix(pathoSnap['antigen_words'],
+                                       pathoSnap['antigen_length'], alleles,
+                                       hostSnap['bit_length'])
+    antigenSpecies = np.repeat(pathoSnap['indv_species'],
+                               np.diff(pathoSnap['indv_offsets']))
+    if sppNumber is None:
+        sppNumber = int(pathoSnap['species'].max()) + 1 \
+            if len(pathoSnap['species']) else 0
+    coo = alleleAntigen.tocoo()
+    alleleSpecies = _binary(csr_matrix(
+        (np.ones(coo.nnz, dtype=np.int64),
+         (coo.row, antigenSpecies[coo.col])),
+        shape=(len(alleles), sppNumber)))
+    nHosts = gsnp.numberOfHosts(hostSnap)
+    hostAllele = _binary(csr_matrix(
+        (np.ones(len(geneAllele), dtype=np.int64),
+         (np.repeat(np.arange(nHosts), np.diff(hostSnap['host_offsets'])),
+          geneAllele)), shape=(nHosts, len(alleles))))
+    hostSpecies = _binary(hostAllele.astype(np.int64) @
+                          alleleSpecies.astype(np.int64))
+    return {'alleles': alleles,
+            'gene_allele': geneAllele,
+            'allele_antigen': alleleAntigen,
+            'allele_species': alleleSpecies,
+            'host_species': hostSpecies}
+
+
+def presentableSpeciesPerHost(hostSnap, pathoSnap):
+    """List with one integer array per host holding the (sorted) species of
+    the pathogen snapshot the host can present with any of its alleles."""
+    mtx = snapshotPresentation(hostSnap, pathoSnap)['host_species']
+    mtx.sort_indices()
+    return np.split(mtx.indices, mtx.indptr[1:-1])
+
+
+def auditPresented(hostSnap, pathoSnap):
+    """Compares the species each host presented according to the headers of
+    the host snapshot (what `PresentedPathogenNumbers.csv` counts) with the
+    species it can present to the pathogens of pathoSnap. Returns a tuple of
+    per host arrays `(reported, derived, unexplained)`: the numbers of
+    distinct reported and derivable species and of the reported species none
+    of the host's alleles presents."""
+    sppNumber = int(max(np.max(hostSnap['presented_species'], initial=-1),
+                        np.max(pathoSnap['species'], initial=-1))) + 1
+    derived = snapshotPresentation(hostSnap, pathoSnap,
+                                   sppNumber)['host_species']
+    reported = gsnp.presentedIncidence(hostSnap, sppNumber).astype(bool)
+    unexplained = reported > derived
+    return (np.asarray(reported.sum(axis=1)).ravel(),
+            np.asarray(derived.sum(axis=1)).ravel(),
+            np.asarray(unexplained.sum(axis=1)).ravel())
+
+
+def main():
+    """ """
+    if len(sys.argv) <= 2:
+        print("Give the names of two files: the host snapshot (e.g.",
+              "HostGenomesFile.XXXX.csv) and the pathogen snapshot (e.g.",
+              "PathoGenomesFile.XXXX.csv) taken at the same time.")
+        sys.exit()
+    try:
+        hostSnap = gsnp.loadHostSnapshot(sys.argv[1])
+        pathoSnap = gsnp.loadPathoSnapshot(sys.argv[2])
+    except IOError as e:
+        print("I/O error({0}) in".format(e.errno),
+              "main(): {0}".format(e.strerror))
+        sys.exit(1)
+    pres = snapshotPresentation(hostSnap, pathoSnap)
+    nAlleles, nAntigens = pres['allele_antigen'].shape
+    print("MHC alleles:", nAlleles, " antigens:", nAntigens,
+          " presenting pairs:", pres['allele_antigen'].nnz)
+    reported, derived, unexplained = auditPresented(hostSnap, pathoSnap)
+    print("Mean number of species a host can present:", np.mean(derived))
+    print("Mean number of species a host presented:", np.mean(reported))
+    print("Hosts with presented species not explained by the pathogen",
+          "snapshot:", np.count_nonzero(unexplained), "of", len(unexplained))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Packed representation of the bit strings of MHC genes and antigens. A set of
+N bit strings of length L is a 2-D Numpy array of N x W unsigned 64-bit words
+(W = ceil(L / 64)) plus the bit length L kept alongside. The bits are right
+aligned and the words go from the most significant one, so for L <= 64 the
+single word of a row is just the integer value of the '0'/'1' string, the same
+number `int(bits, 2)` gives. A 1-D array is taken as one word per row. Both
+the antigens and the MHC genes of `genome_snapshot` are stored this way.
+
+The arrays are built straight from the ASCII '0'/'1' bytes of the model's
+output with Numpy, without `bitstring` objects or per-character Python
+strings, and the identity and similarity kernels work on the words.
+
+Created on Sun Oct 18 19:31:06 2026
+for Evolutionary Biology Group, Faculty of Biology
+    Adam Mickiewicz University, Poznan, Poland
+"""
+import numpy as np
+
+
+WORD_BITS = 64
+# Number of set bits of every byte value, for Numpy without bitwise_count().
+POPCOUNT_LUT = np.array([bin(ii).count('1') for ii in range(256)],
+                        dtype=np.uint8)
+
+
+def wordCount(bitLen):
+    """Number of 64-bit words needed for bitLen bits."""
+    return (int(bitLen) + WORD_BITS - 1) // WORD_BITS
+
+
+def asWords(words):
+    """Returns the packed words as a 2-D uint64 array (a 1-D array is taken
+    as one word per row)."""
+    words = np.asarray(words, dtype=np.uint64)
+    if words.ndim == 1:
+        return words.reshape(-1, 1)
+    return words
+
+
+def packBitArray(bits):
+    """Packs an N x L array of 0/1 values into N x W words."""
+    bits = np.asarray(bits, dtype=np.uint8)
+    nn, bitLen = bits.shape
+    ww = wordCount(bitLen)
+    pad = ww * WORD_BITS - bitLen
+    if pad:
+        bits = np.hstack((np.zeros((nn, pad), dtype=np.uint8), bits))
+    packed = np.ascontiguousarray(np.packbits(bits, axis=1))
+    return packed.view('>u8').astype(np.uint64).reshape(nn, ww)
+
+
+def packAscii(bitLines, bitLen):
+    """Packs a list of '0'/'1' strings (str or bytes) of length bitLen, e.g.
+    the first column of the snapshot files, into N x W words."""
+    if not bitLines:
+        return np.zeros((0, wordCount(bitLen)), dtype=np.uint64)
+    if isinstance(bitLines[0], str):
+        raw = ''.join(bitLines).encode('ascii')
+    else:
+        raw = b''.join(bitLines)
+    raw = np.frombuffer(raw, dtype=np.uint8)
+    return packBitArray(raw.reshape(len(bitLines), bitLen) - ord('0'))
+
+
+def unpackBitArray(words, bitLen):
+    """Unpacks N x W words into an N x bitLen array of 0/1 values (uint8)."""
+    words = asWords(words)
+    nn, ww = words.shape
+    raw = np.ascontiguousarray(words.astype('>u8')).view(np.uint8)
+    bits = np.unpackbits(raw.reshape(nn, ww * 8), axis=1)
+    return bits[:, ww * WORD_BITS - int(bitLen):]
+
+
+def toStrings(words, bitLen, reverse=False):
+    """Converts packed words back into a list of '0'/'1' strings. With
+    `reverse` the strings are turned back to front."""
+    bits = unpackBitArray(words, bitLen) + ord('0')
+    if reverse:
+        bits = bits[:, ::-1]
+    return [row.tobytes().decode() for row in bits]
+
+
+def popcount(words):
+    """Number of set bits in every word (same shape as words)."""
+    words = np.asarray(words, dtype=np.uint64)
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(words)
+    raw = np.ascontiguousarray(words).view(np.uint8)
+    return POPCOUNT_LUT[raw.reshape(words.shape + (8,))].sum(axis=-1,
+                                                             dtype=np.uint8)
+
+
+def rowPopcount(words):
+    """Number of set bits in every row of packed words."""
+    return popcount(asWords(words)).sum(axis=1, dtype=np.int64)
+
+
+def equalRows(wordsA, wordsB):
+    """Element-wise (broadcast) identity of the rows of two packed arrays,
+    e.g. `equalRows(aa[:, None], bb[None, :])` is the N x M identity
+    matrix."""
+    return (np.asarray(wordsA) == np.asarray(wordsB)).all(axis=-1)
+
+
+def sortRows(words):
+    """Rows of packed words sorted by the values of the bit strings they
+    hold, duplicates kept."""
+    words = asWords(words)
+    if words.shape[1] == 1:
+        return np.sort(words, axis=0)
+    return words[np.lexsort(words.T[::-1])]
+
+
+def uniqueRows(words, return_index=False, return_inverse=False,
+               return_counts=False):
+    """Unique rows of packed words, sorted, with optional indices of their
+    first occurrences, inverse indices and counts like `numpy.unique()`."""
+    words = asWords(words)
+    if words.shape[1] == 1:
+        res = np.unique(words[:, 0], return_index=return_index,
+                        return_inverse=return_inverse,
+                        return_counts=return_counts)
+        if isinstance(res, tuple):
+            return (res[0].reshape(-1, 1),) + tuple(rr.ravel()
+                                                    for rr in res[1:])
+        return res.reshape(-1, 1)
+    res = np.unique(words, axis=0, return_index=return_index,
+                    return_inverse=return_inverse,
+                    return_counts=return_counts)
+    if isinstance(res, tuple):
+        return (res[0],) + tuple(rr.ravel() for rr in res[1:])
+    return res
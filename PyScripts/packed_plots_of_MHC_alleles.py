@@ -20,6 +20,8 @@ import numpy as np
 import numpy.polynomial.polynomial as poly
 import matplotlib.pyplot as plt
 import scipy.stats
+import generation_arrays as ga
+import run_catalog as rcat
 
 
 # """Data type for loading data from files HostsGeneDivers.csv"""
@@ -61,13 +63,24 @@ def getVarxLabel(filepath):
 def loadParamSettings(filepath):
     """Loads model's parametrisation from i.g. InputParameters.json file into
     a handy list. """
+    try:
+        with open(filepath) as f:
+            prms = json.load(f)
+    except Exception:
+        print("ERROR in loadParamSettings(): Cannot load params into a list.")
+        return None
+    return paramSettingsFromDict(prms)
+
+
+def paramSettingsFromDict(prms):
+    """Puts model's parametrisation already loaded from i.g.
+    InputParameters.json (e.g. a run found by `run_catalog.findRuns()`) into
+    the same handy list as `loadParamSettings()`."""
     nogphoch = 'number_of_genes_per_host_one_chromosome'
     nopgpohg = 'number_of_pathogen_generation_per_one_host_generation'
     hmnogich = 'host_maximal_number_of_genes_in_chromosome'
     paramzList = []
     try:
-        with open(filepath) as f:
-            prms = json.load(f)
         paramzList.append(prms['number_of_threads'])
         paramzList.append(prms['number_of_bits_per_gene'])
         paramzList.append(prms['number_of_bits_per_antigen'])
@@ -87,7 +100,8 @@ def loadParamSettings(filepath):
         paramzList.append(prms['alpha_factor_for_the_host_fitness_function'])
         return paramzList
     except Exception:
-        print("ERROR in loadParamSettings(): Cannot load params into a list.")
+        print("ERROR in paramSettingsFromDict(): Cannot load params into a",
+              "list.")
         return None
 
 
@@ -190,70 +204,71 @@ def loadTheDateFromParamFile(filePar):
 
 
 def getTheData(theStartDate, templateList, genrsUsed=1000, dirr=os.getcwd()):
-    """Walking the dir using Python 3.5. Variable theStartDate has to be
-    a datetime.date() data type."""
+    """Goes through the runs in the catalog of the dir (see `run_catalog`).
+    Variable theStartDate has to be a datetime.date() data type."""
     nopgpohg = 'number_of_pathogen_generation_per_one_host_generation'
     vv = lookForVARinList(templateList)
     datOut = []
     dataOrdering = ['VAR', 'VARX', 'meanAllel', 'stdAllel', 'slope']
-    for dirName, subdirList, fileList in os.walk(dirr):
-        for file in fileList:
-            filepath = os.path.join(dirName, file)
-            if(filepath == os.path.join(dirName, 'InputParameters.json') and
-               loadTheDateFromParamFile(filepath) >= theStartDate):
-                paramzList = loadParamSettings(filepath)
-                with open(filepath) as f:
-                    prms = json.load(f)
-                if compareParams(templateList, paramzList):
-                    path_spp = float(prms['number_of_pathogen_species'])
-#                    ll = re.split(" ", ln.getline(filepath, 9))
-#                    path_spp = float(ll[2].split()[0])
-                    pathoNorm = float(prms[nopgpohg]) * path_spp
-#                    ll = re.split(" ", ln.getline(filepath, 12))
-#                    pathoNorm = float(ll[2].split()[0]) * path_spp
-                    var = float(paramzList[vv['VAR']])
-                    varx = float(paramzList[vv['VARX']])
-                    dataFilePath = os.path.join(dirName, "HostsGeneDivers.csv")
-                    data = np.genfromtxt(dataFilePath, dtype=inType)
-                    EqPt = len(data) - genrsUsed
-                    if EqPt <= 0:
-                        print("ERROR in getTheData(): not enough generations",
-                              "in run", dirName, ";", EqPt, "is not good.")
-                        sys.exit(1)
-                    c0, c1 = poly.polyfit(data['time'][EqPt::],
-                                          data['num_of_MHC_types'][EqPt::], 1)
-                    meanAlle = data['num_of_MHC_types'][EqPt::].mean()
-                    stdAlle = data['num_of_MHC_types'][EqPt::].std()
-                    meanFitt = data['mean_fitness'][EqPt::].mean() / pathoNorm
-#                    stdFitt = np.std(data['mean_fitness'][EqPt::] / pathoNorm)
-                    cvFitt = data['std_fitness']/data['mean_fitness']
-                    cvFitt = cvFitt[EqPt::]
-                    cvFitt = cvFitt[~np.isnan(cvFitt)]
-                    cvFittMean = np.mean(cvFitt) / pathoNorm
-                    cvFittSTD = np.std(cvFitt) / pathoNorm
-                    dataFilePath = os.path.join(dirName,
-#                                                "HostMHCsNumbUniq_ChrOne.csv")
-#                                                "NumberOfMhcAfterMating.csv")
-                                                "NumberOfMhcBeforeMating.csv")
-                    hgsUNIQ = np.genfromtxt(dataFilePath)
-                    # Note, that the MHC type number is given per 1 chromosome
-                    indvMean = np.mean(hgsUNIQ[EqPt:, 1:])
-                    indvSTD = np.std(hgsUNIQ[EqPt:, 1:])
-                    stdFitt = np.std(data['mean_fitness'][EqPt::] / pathoNorm)
-                    dataFilePath = os.path.join(dirName,
-                                                "PresentedPathogenNumbers.csv")
-                    try:
-                        patoPres = np.genfromtxt(dataFilePath)
-                        patoMean = np.mean(patoPres[EqPt:, 1:]) / pathoNorm
-                        patoSTD = np.std(patoPres[EqPt:, 1:]) / pathoNorm
-                    except OSError:
-                        print("No PresentedPathogenNumbers.csv in:", dirName)
-                        patoMean = np.nan
-                        patoSTD = np.nan
-                    datOut.append((var, varx, meanAlle, stdAlle, c1,
-                                   indvMean, indvSTD, meanFitt, stdFitt,
-                                   cvFittMean, cvFittSTD, patoMean, patoSTD,
-                                   dirName))
+    for run in rcat.findRuns(theStartDate, dirr):
+        dirName = run['dir']
+        prms = run['params']
+        paramzList = paramSettingsFromDict(prms)
+        if compareParams(templateList, paramzList):
+            path_spp = float(prms['number_of_pathogen_species'])
+#            ll = re.split(" ", ln.getline(filepath, 9))
+#            path_spp = float(ll[2].split()[0])
+            pathoNorm = float(prms[nopgpohg]) * path_spp
+#            ll = re.split(" ", ln.getline(filepath, 12))
+#            pathoNorm = float(ll[2].split()[0]) * path_spp
+            var = float(paramzList[vv['VAR']])
+            varx = float(paramzList[vv['VARX']])
+            dataFilePath = os.path.join(dirName, "HostsGeneDivers.csv")
+            # one generation more to know if the run is long enough
+            data = np.genfromtxt(ga.readLastLines(dataFilePath,
+                                                  genrsUsed + 1),
+                                 dtype=inType)
+            EqPt = len(data) - genrsUsed
+            if EqPt <= 0:
+                print("ERROR in getTheData(): not enough generations",
+                      "in run", dirName, ";", EqPt, "is not good.")
+                sys.exit(1)
+            c0, c1 = poly.polyfit(data['time'][EqPt::],
+                                  data['num_of_MHC_types'][EqPt::], 1)
+            meanAlle = data['num_of_MHC_types'][EqPt::].mean()
+            stdAlle = data['num_of_MHC_types'][EqPt::].std()
+            meanFitt = data['mean_fitness'][EqPt::].mean() / pathoNorm
+#            stdFitt = np.std(data['mean_fitness'][EqPt::] / pathoNorm)
+            cvFitt = data['std_fitness']/data['mean_fitness']
+            cvFitt = cvFitt[EqPt::]
+            cvFitt = cvFitt[~np.isnan(cvFitt)]
+            cvFittMean = np.mean(cvFitt) / pathoNorm
+            cvFittSTD = np.std(cvFitt) / pathoNorm
+            dataFilePath = os.path.join(dirName,
+#                                        "HostMHCsNumbUniq_ChrOne.csv")
+#                                        "NumberOfMhcAfterMating.csv")
+                                        "NumberOfMhcBeforeMating.csv")
+            hgsTime, hgsUNIQ = ga.loadLastGenerations(dataFilePath,
+                                                      genrsUsed)
+            # Note, that the MHC type number is given per 1 chromosome
+            indvMean = np.mean(hgsUNIQ)
+            indvSTD = np.std(hgsUNIQ)
+            stdFitt = np.std(data['mean_fitness'][EqPt::] / pathoNorm)
+            dataFilePath = os.path.join(dirName,
+                                        "PresentedPathogenNumbers.csv")
+            try:
+                patoTime, patoPres = ga.loadLastGenerations(
+                    dataFilePath, genrsUsed)
+                patoMean = np.mean(patoPres) / pathoNorm
+                patoSTD = np.std(patoPres) / pathoNorm
+            except OSError:
+                print("No PresentedPathogenNumbers.csv in:", dirName)
+                patoMean = np.nan
+                patoSTD = np.nan
+            datOut.append((var, varx, meanAlle, stdAlle, c1,
+                           indvMean, indvSTD, meanFitt, stdFitt,
+                           cvFittMean, cvFittSTD, patoMean, patoSTD,
+                           dirName))
     datOut = np.array(datOut, dtype=outType)
     return np.sort(datOut, order=dataOrdering)
 
@@ -267,16 +282,10 @@ def checkOneParamValue(templateList, theStartDate,
     there or still missing before running time-consuming `getTheData()`
     function."""
     datOut = []
-    for dirName, subdirList, fileList in os.walk(dirr):
-        for file in fileList:
-            filepath = os.path.join(dirName, file)
-            if(filepath == os.path.join(dirName, 'InputParameters.json') and
-               loadTheDateFromParamFile(filepath) >= theStartDate):
-                paramzList = loadParamSettings(filepath)
-                with open(filepath) as f:
-                    prms = json.load(f)
-                if compareParams(templateList, paramzList):
-                    datOut.append((theParam, prms[theParam], dirName))
+    for run in rcat.findRuns(theStartDate, dirr):
+        prms = run['params']
+        if compareParams(templateList, paramSettingsFromDict(prms)):
+            datOut.append((theParam, prms[theParam], run['dir']))
     return datOut
 
 
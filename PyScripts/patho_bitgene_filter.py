@@ -4,42 +4,209 @@
 Filther the file with Pathogen population data to leave off only the bit string
 representation of the antigen removing the mutation history data.
 
+Many files (or glob patterns) can be filtered at once with `--batch`, each in
+its own worker process. With `--binary` the antigens are stored as packed bits
+in a Numpy .npz file instead of text, see `loadBitgeneFile()`.
+
 Created on Thu Oct 29 17:47:26 2015
 for Evolutionary Biology Group, Faculty of Biology
     Adam Mickiewicz University, Poznan, Poland
 @author: Piotr Bentkowski - bentkowski.piotr@gmail.com
 """
-import re
+import os
 import sys
+import glob
+import argparse
+import multiprocessing as mp
+import numpy as np
+import genome_snapshot as gsnp
+import compressed_files as cfs
+
+
+# Amount of input read and written at once.
+CHUNK_BYTES = 2**22
+# Arrays of the parsed snapshot not needed without the mutation history.
+HISTORY_ARRAYS = ('parent_offsets', 'parent_tags')
+
+
+def filterLines(lines):
+    """Filters a list of lines (bytes) of a pathogen snapshot. Comment and
+    header lines are kept, antigen lines are cut to their bit string."""
+    out = []
+    for line in lines:
+        if b'#' in line or b'===' in line:
+            out.append(line)
+        else:
+            ll = line.split(None, 1)
+            if ll:
+                out.append(ll[0] + b'\n')
+    return b''.join(out)
+
+
+def filterTextFile(inFile, outFile):
+    """Streams inFile (plain or compressed) to outFile leaving only the bit
+    strings of the antigens. Works on chunks of lines with buffered
+    writes."""
+    with cfs.openFile(inFile, 'rb') as infile, \
+            open(outFile, 'wb', buffering=CHUNK_BYTES) as ff:
+        while True:
+            lines = infile.readlines(CHUNK_BYTES)
+            if not lines:
+                break
+            ff.write(filterLines(lines))
+
+
+def filterBinaryFile(inFile, outFile):
+    """Parses inFile with `genome_snapshot.parsePathoSnapshot()` and saves
+    the antigens as packed bits, with their individual and species offsets,
+    into the .npz file outFile. The mutation history is left out."""
+    snap = gsnp.parsePathoSnapshot(inFile)
+    for name in HISTORY_ARRAYS:
+        del snap[name]
+    with open(outFile, 'wb') as ff:
+        np.savez(ff, **snap)
+
+
+def loadBitgeneFile(FILE):
+    """Loads the .npz file written with `--binary`. Returns a dictionary of
+    arrays like `genome_snapshot.loadPathoSnapshot()` without the mutation
+    history, so e.g. `genome_snapshot.antigenStrings()` works on it."""
+    with np.load(FILE) as data:
+        return {name: data[name] for name in data.files}
+
+
+def outputName(inFile, binary=False, outDir=None, root=None):
+    """Name of the filtered file in batch mode: PathoGenomesFile.XXXX.csv
+    becomes PathoGenomesFile.XXXX.bits.csv (or .bits.npz with `binary`),
+    next to the input file or in outDir. In outDir the path of the input
+    relative to the directory root (see inputRoot()) is kept, so the files
+    of different runs do not end up in one output file."""
+    base = os.path.basename(cfs.plainName(inFile))
+    if base.endswith('.csv'):
+        base = base[:-len('.csv')]
+    base += '.bits.npz' if binary else '.bits.csv'
+    if not outDir:
+        return os.path.join(os.path.dirname(inFile), base)
+    dirr = os.path.dirname(os.path.abspath(inFile))
+    rel = os.path.relpath(dirr, root) if root else os.curdir
+    return os.path.normpath(os.path.join(outDir, rel, base))
+
+
+def inputRoot(files):
+    """The deepest directory holding all the files, mirrored in the output
+    directory by outputName()."""
+    if not files:
+        return None
+    return os.path.commonpath([os.path.dirname(os.path.abspath(ff))
+                               for ff in files])
+
+
+def collidingOutputs(tasks):
+    """Output files the (inFile, outFile, binary) tasks would write more
+    than once, e.g. for X.csv and X.csv.gz. Returns a dictionary of such
+    output files with the list of their input files."""
+    inputs = {}
+    for inFile, outFile, binary in tasks:
+        inputs.setdefault(os.path.abspath(outFile), []).append(inFile)
+    return {outFile: ins for outFile, ins in inputs.items() if len(ins) > 1}
+
+
+def filterFile(task):
+    """Filters one file. task is a tuple `(inFile, outFile, binary)`. Returns
+    an error message or None. Meant to run in worker processes."""
+    inFile, outFile, binary = task
+    try:
+        if binary:
+            filterBinaryFile(inFile, outFile)
+        else:
+            filterTextFile(inFile, outFile)
+        return None
+    except (OSError, ValueError) as e:
+        return "Cannot process " + inFile + ": " + str(e)
+
+
+def expandInputs(patterns):
+    """Expands glob patterns into a sorted list of existing files. Plain file
+    names are kept even if only their compressed variant exists. Earlier
+    outputs (*.bits.csv, *.bits.npz) are skipped."""
+    files = []
+    for pp in patterns:
+        found = glob.glob(pp)
+        if found:
+            files.extend(ff for ff in found if os.path.isfile(ff))
+        else:
+            files.append(pp)
+    return sorted(ff for ff in set(files) if not
+                  cfs.plainName(ff).endswith(('.bits.csv', '.bits.npz')))
+
+
+def runBatch(tasks, jobs):
+    """Filters the (inFile, outFile, binary) tasks in `jobs` worker processes
+    and reports each file as it is done. Returns the number of failures."""
+    failed = 0
+    if jobs <= 1 or len(tasks) <= 1:
+        results = map(filterFile, tasks)
+        pool = None
+    else:
+        pool = mp.Pool(min(jobs, len(tasks)))
+        results = pool.imap(filterFile, tasks)
+    try:
+        for task, err in zip(tasks, results):
+            if err is None:
+                print("Done:", task[0], "->", task[1])
+            else:
+                print("ERROR in runBatch():", err)
+                failed += 1
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return failed
 
 
 def main():
     """ """
-    if len(sys.argv) <= 2:
+    parser = argparse.ArgumentParser(
+        description="Leaves only the bit strings of the antigens in the "
+        "pathogen genome files (e.g. PathoGenomesFile.XXXX.csv).",
+        epilog="Without --batch give two files: the input file and the "
+        "output file.")
+    parser.add_argument('files', nargs='+', help="input file(s) or glob "
+                        "patterns; without --batch: input and output file")
+    parser.add_argument('--batch', action='store_true', help="filter all the "
+                        "given files into *.bits.csv (or *.bits.npz) files")
+    parser.add_argument('-j', '--jobs', type=int, default=mp.cpu_count(),
+                        help="number of worker processes in batch mode")
+    parser.add_argument('-o', '--outdir', default=None, help="directory for "
+                        "the output files in batch mode; the directories of "
+                        "the input files below their common one are kept")
+    parser.add_argument('--binary', action='store_true', help="write packed "
+                        "binary antigens (.npz) instead of text")
+    args = parser.parse_args()
+    if args.batch:
+        files = expandInputs(args.files)
+        root = inputRoot(files)
+        tasks = [(ff, outputName(ff, args.binary, args.outdir, root),
+                  args.binary) for ff in files]
+        clash = collidingOutputs(tasks)
+        if clash:
+            for outFile in sorted(clash):
+                print("ERROR in main():", ", ".join(clash[outFile]),
+                      "would all be written to", outFile)
+            sys.exit(1)
+        if args.outdir:
+            for dirr in set(os.path.dirname(task[1]) for task in tasks):
+                os.makedirs(dirr, exist_ok=True)
+    elif len(args.files) == 2:
+        tasks = [(args.files[0], args.files[1], args.binary)]
+    else:
         print("Tow file needed:\n 1. Name of the file with pathogen genomes",
-              "e.g. PathoGenomesFile.XXXX.csv\n 2. Name of the output file")
+              "e.g. PathoGenomesFile.XXXX.csv\n 2. Name of the output file",
+              "\nor use --batch to filter many files at once.")
         sys.exit()
-    else:
-        try:
-            open(sys.argv[2], 'w').close()
-        except Exception:
-            print("Cannot create the new file")
-            sys.exit()
-        try:
-            with open(sys.argv[1]) as infile:
-                for line in infile:
-                    ff = open(sys.argv[2], 'a')
-                    if re.search(r"#", line):
-                        ff.write(line)
-                    elif re.search(r"===", line):
-                        ff.write(line)
-                    else:
-                        ff.write(line.split()[0] + '\n')
-                    ff.close()
-            print("DONE!")
-        except Exception:
-            print("Cannot process the input file. Check if it exists.")
-            sys.exit()
+    if runBatch(tasks, args.jobs) > 0:
+        sys.exit(1)
+    print("DONE!")
 
 
 if __name__ == "__main__":
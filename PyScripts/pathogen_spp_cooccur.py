@@ -1,21 +1,32 @@
 #!/usr/bin/env python3.5
 # -*- coding: utf-8 -*-
 """
-Your doc string goes here...
+Calculates how often pairs of pathogen species are presented together by the
+hosts, from the host snapshots (HostGenomesFile.XXXX.csv), and clusters the
+species by it. The co-presentation matrix is the product X^T X of the sparse
+host x species presentation matrix X. Given a run directory instead of a file
+it is calculated for every host snapshot of the run, which gives its time
+series.
 
 Created on Wed Jul 13 18:26:33 2016
 for Evolutionary Biology Group, Faculty of Biology
     Adam Mickiewicz University, Poznan, Poland
 @author: Piotr Bentkowski - bentkowski.piotr@gmail.com
 """
-import re
 import os
 import sys
 import json
+import glob
+import fnmatch
 import numpy as np
 import scipy.cluster.hierarchy as sch
 import matplotlib.pyplot as plt
 import matplotlib.gridspec as gridspec
+import genome_snapshot as gsnp
+import compressed_files as cfs
+
+
+HOST_SNAPSHOTS = 'HostGenomesFile.*.csv'
 
 
 def loadParams(dirname):
@@ -34,17 +45,12 @@ def loadParams(dirname):
 
 
 def loadPresentedSpecies(filepath):
-    """ """
-    LL = []
+    """Loads the species of the pathogens presented by each host from the
+    headers of the host snapshot file. Returns a list with one integer array
+    per host."""
     try:
-        with open(filepath, 'r') as f:
-            for line in f:
-                if re.search(" ===", line):
-                    LL.append(list(map(int, line.split("are:")[1].
-                              split(" ===")[0].split())))
-                else:
-                    pass
-        return LL
+        snap = gsnp.loadHostSnapshot(filepath)
+        return gsnp.presentedPerHost(snap)
     except Exception:
         print("ERROR in loadPresentedSpecies(): Cannot load the presented",
               "pathogen species.")
@@ -65,16 +71,73 @@ def calculateCoocurenceMtx(LL, sppNumber, popSize):
     `popSize`       number of host individuals
     ==============  ==========================================================
     '''
-    mtx = np.zeros((sppNumber, sppNumber))
-    for i in range(sppNumber):
-        for j in range(i+1, sppNumber):
-            for itm in LL:
-                if i in itm and j in itm:
-                    mtx[i, j] += 1
-                    mtx[j, i] += 1
+    return copresentationMatrix(presentedSpeciesIncidence(LL, sppNumber),
+                                popSize)
+
+
+def presentedSpeciesIncidence(LL, sppNumber):
+    """Binary host x species matrix (`scipy.sparse.csr_matrix`) of the
+    species presented by each host, from the list made by
+    loadPresentedSpecies(). Species numbers from sppNumber on are left
+    out."""
+    from scipy.sparse import csr_matrix
+    lengths = [len(itm) for itm in LL]
+    species = np.concatenate(LL).astype(np.int64) if sum(lengths) \
+        else np.zeros(0, dtype=np.int64)
+    hosts = np.repeat(np.arange(len(LL)), lengths)
+    keep = (species >= 0) & (species < sppNumber)
+    mtx = csr_matrix((np.ones(np.count_nonzero(keep), dtype=np.int64),
+                      (hosts[keep], species[keep])),
+                     shape=(len(LL), sppNumber))
+    mtx.sum_duplicates()
+    mtx.data[:] = 1
+    return mtx
+
+
+def copresentationMatrix(incidence, popSize):
+    """Co-presentation matrix from a binary host x species matrix X: the
+    numbers of hosts presenting both species of a pair (X^T X without the
+    diagonal) divided by popSize."""
+    mtx = (incidence.T @ incidence).toarray().astype(float)
+    np.fill_diagonal(mtx, 0.)
     return mtx / float(popSize)
 
 
+def snapshotCopresentation(filepath, sppNumber, popSize):
+    """Co-presentation matrix of one host snapshot file. Returns a tuple
+    `(time, matrix)` with the time step of the snapshot."""
+    snap = gsnp.loadHostSnapshot(filepath)
+    species = snap['presented_species']
+    nCols = max(sppNumber, int(species.max()) + 1 if len(species) else 0)
+    incidence = gsnp.presentedIncidence(snap, nCols)[:, :sppNumber]
+    return (int(snap['snapshot_time']),
+            copresentationMatrix(incidence, popSize))
+
+
+def snapshotFiles(dirname, pattern=HOST_SNAPSHOTS):
+    """Host snapshot files of a run directory (plain or compressed, each
+    snapshot once)."""
+    files = {}
+    # a plain file sorts before its compressed variants and is kept
+    for ff in sorted(glob.glob(os.path.join(dirname, pattern + '*'))):
+        plain = cfs.plainName(ff)
+        if fnmatch.fnmatch(os.path.basename(plain), pattern):
+            files.setdefault(plain, ff)
+    return sorted(files.values())
+
+
+def copresentationTimeSeries(dirname, sppNumber, popSize):
+    """Co-presentation matrices of all the host snapshots of a run. Returns
+    a tuple `(times, matrices)`: the sorted snapshot times and the
+    T x sppNumber x sppNumber array of the matrices."""
+    res = sorted((snapshotCopresentation(ff, sppNumber, popSize)
+                  for ff in snapshotFiles(dirname)), key=lambda rr: rr[0])
+    times = np.array([tt for tt, mtx in res], dtype=np.int64)
+    matrices = np.array([mtx for tt, mtx in res]).reshape(-1, sppNumber,
+                                                          sppNumber)
+    return times, matrices
+
+
 def clusterSpecies(mtx, low=0, high=1):
     ''' '''
     FontSize = 15
@@ -111,8 +174,20 @@ def main():
     ''' '''
     if len(sys.argv) <= 1:
         print("Specify the file with hosts genetic data. It is usualy named:",
-              "HostGenomesFile.XXXX.csv or similar.")
+              "HostGenomesFile.XXXX.csv or similar. Given a run directory",
+              "the matrices of all its host snapshots are saved into",
+              "CopresentationSeries.npz.")
         sys.exit()
+    if os.path.isdir(sys.argv[1]):
+        popSize, sppNumber = loadParams(sys.argv[1])
+        if sppNumber is None:
+            sys.exit()
+        times, matrices = copresentationTimeSeries(sys.argv[1], sppNumber,
+                                                   popSize)
+        np.savez("CopresentationSeries.npz", times=times, matrices=matrices)
+        print("Co-presentation matrices of", len(times), "snapshots saved",
+              "to CopresentationSeries.npz")
+        return
     try:
         popSize, sppNumber = loadParams(os.getcwd())
         LL = loadPresentedSpecies(sys.argv[1])
@@ -10,6 +10,7 @@ Created on Tue Mar 15 10:17:01 2016
 import json
 import numpy as np
 import matplotlib.pyplot as plt
+import compressed_files as cfs
 
 
 def main():
@@ -27,8 +28,10 @@ def main():
     plt.rc('xtick', labelsize=TickSize)
     plt.rc('ytick', labelsize=TickSize)
 
-    genMeans = np.genfromtxt("HostGeneNumbTotal_ChrOne.csv")
-    mhcMeans = np.genfromtxt("HostMHCsNumbUniq_ChrOne.csv")
+    with cfs.openFile("HostGeneNumbTotal_ChrOne.csv") as f:
+        genMeans = np.genfromtxt(f)
+    with cfs.openFile("HostMHCsNumbUniq_ChrOne.csv") as f:
+        mhcMeans = np.genfromtxt(f)
 #    GenerData = np.genfromtxt("HostsGeneDivers.csv")
     print("Done loading data files!")
 
@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Persistent catalog of the model runs found in a results directory tree. Every
+directory holding an `InputParameters.json` file is recorded in a small SQLite
+database together with its parsed parameters, the date the run was started and
+the list of its output files. The database lives in the root of the crawled
+tree (`.run_catalog.sqlite`) and is refreshed incrementally: a directory is
+listed again only when its modification time changed, and a parameter file is
+parsed again only when it changed itself. The multi-run crawlers query the
+catalog with `findRuns()` instead of walking the tree and re-reading JSON
+files on each start. The tree is scanned with `os.scandir()` by a bounded pool
+of threads, since on network filesystems the time goes into waiting for the
+metadata, and `findRuns()` hands every run over as soon as its directory is
+scanned, so a crawler starts working before the whole tree is walked.
+`scanRuns()` streams the run directories the same way without the catalog.
+
+Created on Sun Oct 18 16:40:21 2026
+for Evolutionary Biology Group, Faculty of Biology
+    Adam Mickiewicz University, Poznan, Poland
+"""
+import os
+import sys
+import json
+import sqlite3
+import fnmatch
+import datetime as dt
+import compressed_files as cfs
+import genome_snapshot as gsnp
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+CATALOG_NAME = '.run_catalog.sqlite'
+PARAMS_FILE = 'InputParameters.json'
+# Files telling that a directory holds a model run.
+MARKER_FILES = (PARAMS_FILE, 'HostsGeneDivers.csv', 'HostGenomesFile.*.csv')
+# Number of directories scanned at once.
+SCAN_WORKERS = 16
+# Directories of the binary caches (and the ones left over from building
+# them) inside the runs, which are never walked into.
+SKIPPED_SUFFIXES = (gsnp.CACHE_SUFFIX,)
+SKIPPED_PREFIXES = (gsnp.CACHE_TMP_PREFIX,)
+# Bump it whenever the layout of the tables changes. Older catalogs are
+# dropped and rebuilt.
+CATALOG_VERSION = 1
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS dirs (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    subdirs TEXT NOT NULL,
+    files TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS runs (
+    path TEXT PRIMARY KEY,
+    params_mtime_ns INTEGER NOT NULL,
+    start_date TEXT,
+    params TEXT
+);
+"""
+
+
+def startDateFromParams(prms):
+    """Takes the parameters of a run loaded from InputParameters.json and
+    returns the day the run was started as a datetime.date() or None when the
+    date cannot be read."""
+    try:
+        ll = prms['run_start_date_and_time'].split(".")[0].split("-")
+        return dt.date(int(ll[0]), int(ll[1]), int(ll[2]))
+    except Exception:
+        return None
+
+
+def openCatalog(dirr=os.getcwd(), catalogFile=None):
+    """Opens (and creates if needed) the catalog of the directory tree dirr.
+    By default the database is the file `.run_catalog.sqlite` in dirr. When it
+    cannot be written there the catalog is kept in memory for this session
+    only."""
+    if catalogFile is None:
+        catalogFile = os.path.join(dirr, CATALOG_NAME)
+    try:
+        conn = sqlite3.connect(catalogFile, timeout=60)
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version != CATALOG_VERSION:
+            conn.executescript("DROP TABLE IF EXISTS dirs;"
+                               "DROP TABLE IF EXISTS runs;")
+            conn.execute("PRAGMA user_version = " + str(CATALOG_VERSION))
+        conn.executescript(SCHEMA)
+        conn.commit()
+    except sqlite3.Error as e:
+        print("WARNING in openCatalog(): cannot use", catalogFile, "-", e,
+              "; the catalog is kept in memory.")
+        conn = sqlite3.connect(':memory:')
+        conn.executescript(SCHEMA)
+    return conn
+
+
+def _listDir(dirName):
+    """Lists a directory. Returns a tuple `(subdirs, files)` of sorted name
+    lists. Symbolic links to directories are not followed, like in
+    `os.walk()`."""
+    subdirs = []
+    files = []
+    with os.scandir(dirName) as it:
+        for entry in it:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.name)
+                else:
+                    files.append(entry.name)
+            except OSError:
+                continue
+    return sorted(subdirs), sorted(files)
+
+
+def _skippedDir(name):
+    """Tells whether the walk leaves out the subdirectory name, a cache
+    directory of `genome_snapshot`."""
+    return (name.endswith(SKIPPED_SUFFIXES) or
+            name.startswith(SKIPPED_PREFIXES))
+
+
+def _underTree(dirr, column='path'):
+    """SQL condition and its arguments selecting the paths of the tree
+    rooted at dirr."""
+    prefix = os.path.join(dirr, '')
+    return ("(" + column + " = ? OR substr(" + column + ", 1, ?) = ?)",
+            (dirr, len(prefix), prefix))
+
+
+def walkConcurrently(dirr, visit, workers=SCAN_WORKERS):
+    """Walks the directory tree dirr visiting up to `workers` directories at
+    once in a thread pool, which hides the metadata latency of network
+    filesystems. `visit(dirName)` is called in the pool for each directory
+    and returns a tuple `(subdirs, result)` or None when the directory cannot
+    be read; the walk descends into `subdirs` (names), except the cache
+    directories (see `_skippedDir()`), and yields the pairs `(dirName,
+    result)` in the order they are completed, so the consumer can start
+    working before the whole tree is scanned."""
+    todo = deque([os.path.abspath(dirr)])
+    running = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while todo or running:
+            # only a few directories per thread are queued at once, so the
+            # memory use does not depend on the size of the tree
+            while todo and len(running) < 2 * workers:
+                dirName = todo.popleft()
+                running[pool.submit(visit, dirName)] = dirName
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in done:
+                dirName = running.pop(fut)
+                out = fut.result()
+                if out is None:
+                    continue
+                subdirs, result = out
+                todo.extend(os.path.join(dirName, sub) for sub in subdirs
+                            if not _skippedDir(sub))
+                yield dirName, result
+
+
+def scanRuns(dirr=os.getcwd(), markers=MARKER_FILES, workers=SCAN_WORKERS):
+    """Scans the directory tree dirr concurrently without the catalog and
+    yields the pairs `(dirName, files)` for each directory holding any of the
+    marker files (name patterns, compressed files included), as soon as it
+    is found. `files` is the sorted list of all the file names in dirName."""
+    def visit(dirName):
+        try:
+            subdirs, files = _listDir(dirName)
+        except OSError:
+            return None
+        found = any(fnmatch.fnmatchcase(cfs.plainName(ff), mm)
+                    for ff in files for mm in markers)
+        return subdirs, files if found else None
+    for dirName, files in walkConcurrently(dirr, visit, workers):
+        if files is not None:
+            yield dirName, files
+
+
+def _loadRunParams(dirName):
+    """Loads InputParameters.json of the run in dirName. Returns a tuple
+    `(start_date, params)` ready for the `runs` table."""
+    try:
+        with open(os.path.join(dirName, PARAMS_FILE)) as f:
+            prms = json.load(f)
+    except (OSError, ValueError):
+        print("ERROR in refreshCatalog(): Cannot load the Params file in",
+              dirName)
+        return None, None
+    startDate = startDateFromParams(prms)
+    if startDate is not None:
+        startDate = startDate.isoformat()
+    return startDate, json.dumps(prms)
+
+
+def refreshRuns(conn, dirr=os.getcwd(), workers=SCAN_WORKERS):
+    """Brings the catalog up to date with the directory tree dirr. Every
+    directory is stat-ed, but only those whose modification time changed are
+    listed again; runs whose parameter file changed are parsed again. The
+    tree is scanned with `walkConcurrently()`, the database is written from
+    the calling thread only.
+
+    Yields the runs as their directories are scanned, as tuples `(path,
+    start_date, params, files)` like the rows of the catalog (text and JSON).
+    The changes are committed before each run is yielded, so the database is
+    not locked while the consumer works on the run. Directories which
+    disappeared are removed from the catalog once the whole tree is
+    scanned."""
+    dirr = os.path.abspath(dirr)
+    cond, args = _underTree(dirr)
+    oldDirs = {}
+    for path, mtime, subdirs, files in conn.execute(
+            "SELECT path, mtime_ns, subdirs, files FROM dirs WHERE " + cond,
+            args):
+        oldDirs[path] = (mtime, subdirs, files)
+    oldRuns = {}
+    for path, mtime, startDate, params in conn.execute(
+            "SELECT path, params_mtime_ns, start_date, params FROM runs "
+            "WHERE " + cond, args):
+        oldRuns[path] = (mtime, startDate, params)
+
+    def visit(dirName):
+        try:
+            mtime = os.stat(dirName).st_mtime_ns
+            old = oldDirs.get(dirName)
+            if old is not None and old[0] == mtime:
+                subdirs = json.loads(old[1])
+                files = json.loads(old[2])
+                listing = None
+                fileList = old[2]
+            else:
+                subdirs, files = _listDir(dirName)
+                fileList = json.dumps(files)
+                listing = (mtime, json.dumps(subdirs), fileList)
+        except OSError:
+            return None
+        run = None
+        if PARAMS_FILE in files:
+            try:
+                prmsTime = os.stat(os.path.join(dirName,
+                                                PARAMS_FILE)).st_mtime_ns
+                old = oldRuns.get(dirName)
+                if old is None or old[0] != prmsTime:
+                    run = (prmsTime,) + _loadRunParams(dirName)
+                else:
+                    run = old
+            except OSError:
+                pass
+        return subdirs, (listing, run, fileList)
+
+    seen = set()
+    try:
+        for dirName, (listing, run, fileList) in walkConcurrently(
+                dirr, visit, workers):
+            seen.add(dirName)
+            if listing is not None:
+                conn.execute("INSERT OR REPLACE INTO dirs "
+                             "VALUES (?, ?, ?, ?)",
+                             (dirName,) + listing)
+            if run is None:
+                if dirName in oldRuns:
+                    conn.execute("DELETE FROM runs WHERE path = ?",
+                                 (dirName,))
+                continue
+            if run is not oldRuns.get(dirName):
+                conn.execute("INSERT OR REPLACE INTO runs "
+                             "VALUES (?, ?, ?, ?)",
+                             (dirName,) + run)
+            if run[2] is not None:
+                conn.commit()
+                yield dirName, run[1], run[2], fileList
+        for table, paths in (('dirs', oldDirs), ('runs', oldRuns)):
+            gone = [(path,) for path in paths if path not in seen]
+            conn.executemany("DELETE FROM " + table + " WHERE path = ?", gone)
+    finally:
+        conn.commit()
+
+
+def refreshCatalog(conn, dirr=os.getcwd(), workers=SCAN_WORKERS):
+    """Brings the catalog up to date with the directory tree dirr at once,
+    see `refreshRuns()`."""
+    for _ in refreshRuns(conn, dirr, workers):
+        pass
+
+
+def _scannedRuns(dirr, workers=SCAN_WORKERS):
+    """Yields the runs of the tree dirr found by `scanRuns()`, without the
+    catalog, as tuples like `refreshRuns()`."""
+    for dirName, files in scanRuns(dirr, (PARAMS_FILE,), workers):
+        startDate, params = _loadRunParams(dirName)
+        if params is not None:
+            yield dirName, startDate, params, json.dumps(files)
+
+
+def _runRecord(row, theStartDate, withFile):
+    """Turns a catalog row of a run into the dictionary `findRuns()` yields,
+    or None when the run does not match theStartDate and withFile."""
+    path, startDate, params, files = row
+    if startDate is not None:
+        startDate = dt.date(*map(int, startDate.split("-")))
+    if theStartDate is not None and (startDate is None or
+                                     startDate < theStartDate):
+        return None
+    files = json.loads(files)
+    if not any(fnmatch.fnmatch(cfs.plainName(ff), withFile) for ff in files):
+        return None
+    return {'dir': path, 'params': json.loads(params),
+            'start_date': startDate, 'files': files}
+
+
+def findRuns(theStartDate=None, dirr=os.getcwd(), withFile=PARAMS_FILE,
+             refresh=True, catalogFile=None, workers=SCAN_WORKERS,
+             useCatalog=True):
+    """Yields the runs of the directory tree dirr. Each run is a
+    dictionary:
+
+    ==============  ==========================================================
+    key             info
+    ==============  ==========================================================
+    `dir`           directory of the run
+    `params`        parameters loaded from InputParameters.json (a dict)
+    `start_date`    the day the run was started as a datetime.date()
+    `files`         sorted list of the names of files in `dir`
+    ==============  ==========================================================
+
+    Only runs started on theStartDate or later are yielded, when the date is
+    given, and only runs having a file matching the `withFile` pattern (e.g.
+    'HostGenomesFile.*.csv'), plain or compressed. With `refresh` the catalog
+    is brought up to date while the tree is scanned, `workers` directories at
+    once, and every run is yielded as soon as its directory is scanned (see
+    `refreshRuns()`); without it the catalog is queried as it is and the runs
+    come sorted by their directory. Without `useCatalog` the tree is scanned
+    with `scanRuns()` and nothing is stored."""
+    dirr = os.path.abspath(dirr)
+    if not useCatalog:
+        for row in _scannedRuns(dirr, workers):
+            run = _runRecord(row, theStartDate, withFile)
+            if run is not None:
+                yield run
+        return
+    conn = openCatalog(dirr, catalogFile)
+    rows = refreshRuns(conn, dirr, workers) if refresh else None
+    try:
+        if rows is None:
+            cond, args = _underTree(dirr, 'runs.path')
+            rows = conn.execute(
+                "SELECT runs.path, runs.start_date, runs.params, dirs.files "
+                "FROM runs JOIN dirs USING (path) WHERE runs.params IS NOT "
+                "NULL AND " + cond + " ORDER BY runs.path", args).fetchall()
+        for row in rows:
+            run = _runRecord(row, theStartDate, withFile)
+            if run is not None:
+                yield run
+    finally:
+        if refresh:
+            rows.close()
+        conn.close()
+
+
+def main():
+    """Refreshes the catalog of the tree given as an argument (the current
+    directory by default) and prints a short summary, e.g. to build the
+    catalog of a large results tree in advance."""
+    dirr = sys.argv[1] if len(sys.argv) > 1 else os.getcwd()
+    runs = list(findRuns(dirr=dirr))
+    print("Runs in", os.path.abspath(dirr), ":", len(runs))
+    dates = [run['start_date'] for run in runs if run['start_date']]
+    if dates:
+        print("Started between", min(dates), "and", max(dates))
+
+
+if __name__ == "__main__":
+    main()
@@ -18,6 +18,23 @@ import numpy as np
 import matplotlib.pyplot as plt
 from scipy.stats import linregress
 import packed_plots_of_MHC_alleles as ppma
+import generation_arrays as ga
+import run_catalog as rcat
+
+
+# Number of generation x host cells of the arrays processed at once.
+BLOCK_CELLS = 2**24
+
+
+def loadGenerationRows(FILE, cc=0):
+    """Loads the host columns of a per-generation file skipping its first
+    generation. With 'cc' > 0 only the last 'cc' generations are read from
+    the end of the file, otherwise the whole array is memory-mapped from the
+    binary cache made by `generation_arrays`."""
+    if cc > 0:
+        # one row more, in case the file is not longer than 'cc'
+        return ga.loadLastGenerations(FILE, cc + 1)[1][1::]
+    return ga.loadGenerationFile(FILE)[1][1::]
 
 
 def loadTheParents(cc=0, moth="NumberOfMhcInMother.csv",
@@ -26,26 +43,21 @@ def loadTheParents(cc=0, moth="NumberOfMhcInMother.csv",
     """Simply load the data into two Numpy arrays. 'cc' is how many last
     generations you want to analyse - 0 means ALL will be loaded."""
     try:
-        mother = np.genfromtxt(moth)[1::, 1::]
+        mother = loadGenerationRows(moth, cc)
     except Exception:
         print("Failed to load mothers MHC numbers. Check if file exists.")
         return None, None, None
     try:
-        father = np.genfromtxt(fath)[1::, 1::]
+        father = loadGenerationRows(fath, cc)
     except Exception:
         print("Failed to load fathers MHC numbers. Check if file exists.")
         return None, None, None
     try:
-        mates = np.genfromtxt(beforeMating)[1::, 1::]
+        mates = loadGenerationRows(beforeMating, cc)
     except Exception:
         print("Failed to load available mates MHC numbers.",
               "Check if file exists.")
         return None, None, None
-    if cc > 0 and cc < len(mates):
-        cc = len(mates) - cc
-        mother = mother[cc::, :]
-        father = father[cc::, :]
-        mates = mates[cc::, :]
 #    time = np.genfromtxt(moth)[:, 0]
     return mother, father, mates
 
@@ -54,25 +66,18 @@ def trimData(mother, father, mates, low=0, up=100):
     """Takes data loaded by `loadTheParents()` and excludes time steps where
     average number of unique MHC types in mothers is lower or higher then
     user-defined limit."""
-    new_mothers = []
-    new_fathers = []
-    new_mates = []
-    for i, itm in enumerate(mother):
-        if(np.mean(itm) >= low and np.mean(itm) <= up):
-            new_mothers.append(itm)
-            new_fathers.append(father[i])
-            new_mates.append(mates[i])
-    return np.array(new_mothers), np.array(new_fathers), np.array(new_mates)
+    meanMoth = np.mean(mother, axis=1)
+    keep = (meanMoth >= low) & (meanMoth <= up)
+    return (np.asarray(mother)[keep], np.asarray(father)[keep],
+            np.asarray(mates)[keep])
 
 
 def avrgMateMHCnumb(mate):
     """For each time step of the `mate` array it calculates the mean number
     of MHC types per time step and files an array of the exact shape as the the
     `mate` array. Used later for calculation."""
-    mmMate = np.zeros(mate.shape)
-    for i, itm in enumerate(mate):
-        mmMate[i, :] = np.mean(itm)
-    return mmMate
+    return np.repeat(np.mean(mate, axis=1, keepdims=True), mate.shape[1],
+                     axis=1)
 
 
 def reshapeMatherFather(mother, father, mmMate):
@@ -93,31 +98,68 @@ def pickMotherSizeGroups(motherR, fatherR, mmFarhR):
     `reshapeMatherFather()`. For 'mothers' with N MHC types (`ww` list) it
     creates an array of all values of MHC types numbers of 'fathers'."""
     ww = list(range(int(np.min(motherR)), int(np.max(motherR) + 1)))
-    bigOnes = []
-    meanOnes = []
-    for iii in ww:
-        s_list = []
-        m_list = []
-        for i, itm in enumerate(motherR):
-            if itm == iii:
-                s_list.append(fatherR[i])
-                m_list.append(mmFarhR[i])
-#                s_list.append(itm - father[i])
-        bigOnes.append(np.array(s_list))
-        meanOnes.append(np.array(m_list))
+    # === a stable sort keeps the pairs of a class in their order ===
+    order = np.argsort(motherR, kind='mergesort')
+    bounds = np.searchsorted(motherR[order], ww[1:])
+    bigOnes = np.split(np.asarray(fatherR)[order], bounds)
+    meanOnes = np.split(np.asarray(mmFarhR)[order], bounds)
     return ww, bigOnes, meanOnes
 
 
 def meanFatherMHCnumb(ww, bigOnes, meanOnes):
     """ """
     meanFathr = np.zeros((len(ww), 3))
-    for ii, moth in enumerate(ww):
-        meanFathr[ii, 0] = moth
-        meanFathr[ii, 1] = np.mean(bigOnes[ii])
-        meanFathr[ii, 2] = np.mean(meanOnes[ii])
+    meanFathr[:, 0] = ww
+    meanFathr[:, 1] = [np.mean(itm) for itm in bigOnes]
+    meanFathr[:, 2] = [np.mean(itm) for itm in meanOnes]
     return meanFathr
 
 
+def mateChoiceStats(mother, father, mates, low=0, up=100):
+    """Does what trimData(), avrgMateMHCnumb(), pickMotherSizeGroups() and
+    the means of the groups do in one pass over the generation x host arrays
+    loaded by `loadTheParents()`, reading them in blocks of generations, so
+    they can stay memory-mapped. The pairs are summed up per mother class
+    (number of MHC types in the 'mother') with `numpy.bincount()`. Returns a
+    tuple `(ww, bSize, fatherMean, mateMean, deltas)`: the mother classes
+    from the smallest to the largest one, the number of breeding pairs in
+    each, the mean number of MHC types in their 'fathers', the mean of the
+    pre-mating population means of their generations and the mean deviation
+    of the 'fathers' from the latter (NaN for classes without pairs)."""
+    if not mother.shape == father.shape == mates.shape:
+        print("Mother, father and mates arrays need to have same shapes.",
+              "Aborded.")
+        return None
+    base = int(np.min(mother)) if mother.size else 0
+    size = int(np.max(mother)) - base + 1 if mother.size else 0
+    bSize = np.zeros(size)
+    fathSum = np.zeros(size)
+    mateSum = np.zeros(size)
+    rows = max(1, BLOCK_CELLS // max(1, mother.shape[1]))
+    for start in range(0, len(mother), rows):
+        moth = np.asarray(mother[start:start+rows], dtype=np.int64)
+        meanMoth = moth.mean(axis=1)
+        keep = (meanMoth >= low) & (meanMoth <= up)
+        if not keep.any():
+            continue
+        cls = (moth[keep] - base).ravel()
+        fath = np.asarray(father[start:start+rows])[keep]
+        mmMate = np.mean(np.asarray(mates[start:start+rows])[keep], axis=1)
+        bSize += np.bincount(cls, minlength=size)
+        fathSum += np.bincount(cls, weights=fath.ravel(), minlength=size)
+        mateSum += np.bincount(cls, weights=np.repeat(mmMate, moth.shape[1]),
+                               minlength=size)
+    found = np.flatnonzero(bSize)
+    if not len(found):
+        return [], np.zeros(0), np.zeros(0), np.zeros(0), np.zeros(0)
+    sl = slice(found[0], found[-1] + 1)
+    ww = list(range(base + found[0], base + found[-1] + 1))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        fatherMean = fathSum[sl] / bSize[sl]
+        mateMean = mateSum[sl] / bSize[sl]
+    return ww, bSize[sl], fatherMean, mateMean, fatherMean - mateMean
+
+
 def plotAndDoStats(Mom, Dad, low_copy, up_copy):
     """Plot regression plot between number of MHC types a 'mother' has and the
     number 'father' has. Not very useful though :-/ """
@@ -154,18 +196,10 @@ def plotDeviantFromMeanFather(mother, father, mate, lower, upper):
     the mean number of MHC types that individuals had in host population before
     mating (the mean for the pool of available mates) for each size of 'mother'
     MHC repertoire."""
-    mother, father, mate = trimData(mother, father, mate, lower, upper)
-    mmMate = avrgMateMHCnumb(mate)
-    rMom, rDad, rMmMate = reshapeMatherFather(mother, father, mmMate)
-    ww, bigOnes, meanOnes = pickMotherSizeGroups(rMom, rDad, rMmMate)
-#    meanFathr = meanFatherMHCnumb(ww, bigOnes, meanOnes)
-    ll = []
-    for i, it in enumerate(ww):
-        ll.append((it, np.mean(bigOnes[i] - meanOnes[i])))
-    xx = np.array(ll)
-    msSize = np.zeros(len(bigOnes))
-    for i, itm in enumerate(bigOnes):
-        msSize[i] = np.sqrt(float(len(itm)))
+    ww, bSize, fatherMean, mateMean, deltas = mateChoiceStats(
+        mother, father, mate, lower, upper)
+    xx = np.column_stack((ww, deltas))
+    msSize = np.sqrt(bSize)
     plt.figure(1, figsize=(9, 6))
 #    plt.plot(xx[:, 0], xx[:, 1], "o", ms=msSize)
     plt.scatter(xx[:, 0], xx[:, 1], s=msSize)
@@ -204,43 +238,36 @@ def justPlotDeviantFromMeanFather(ww, deltas, bSize, path, suffix=""):
 
 
 def getTheData(theStartDate, templateList, dirr=os.getcwd(), genLast=0):
-    """Walking the dir using Python 3.5. Variable theStartDate has to be
-    a datetime.date() data type. Each item in the `datOut` structure is the
-    result of computing one simulation."""
+    """Goes through the runs in the catalog of the dir (see `run_catalog`).
+    Variable theStartDate has to be a datetime.date() data type. Each item in
+    the `datOut` structure is the result of computing one simulation."""
     datOut = []
-    for dirName, subdirList, fileList in os.walk(dirr):
-        for file in fileList:
-            filepath = os.path.join(dirName, file)
-            if(filepath == os.path.join(dirName, 'InputParameters.json') and
-               ppma.loadTheDateFromParamFile(filepath) >= theStartDate):
-                paramzList = ppma.loadParamSettings(filepath)
-                if ppma.compareParams(templateList, paramzList):
-                    print("Processing dir:", dirName, end=" ")
-                    moPth = os.path.join(dirName, 'NumberOfMhcInMother.csv')
-                    faPth = os.path.join(dirName, 'NumberOfMhcInFather.csv')
-                    mPth = os.path.join(dirName, 'NumberOfMhcBeforeMating.csv')
-                    mothr, fathr, bmate = loadTheParents(genLast,
-                                                         moPth, faPth, mPth)
-                    moth, fath, bmate = trimData(mothr, fathr, bmate, 2, 100)
-                    mmMt = avrgMateMHCnumb(bmate)
-                    rMom, rDad, rMmMt = reshapeMatherFather(moth, fath, mmMt)
-                    ww, Fatrs, meanM = pickMotherSizeGroups(rMom, rDad, rMmMt)
-                    bSize = np.zeros(len(Fatrs))
-                    for i, itm in enumerate(Fatrs):
-                        bSize[i] = len(itm)
-                    deltas = []
-                    for i, it in enumerate(ww):
-                        deltas.append(np.nanmean(Fatrs[i] - meanM[i]))
-                    justPlotDeviantFromMeanFather(ww, deltas, bSize, dirName)
-                    try:
-                        xx = np.transpose(np.vstack((ww, np.array(deltas),
-                                                     bSize)))
-                    except Exception:
-                        print(" - failed to stack the data! Check if the",
-                              "input file sizes (e.g. line numbers) are OK.")
-                        continue
-                    datOut.append(xx)
-                    print(" - done.")
+    for run in rcat.findRuns(theStartDate, dirr):
+        dirName = run['dir']
+        paramzList = ppma.paramSettingsFromDict(run['params'])
+        if ppma.compareParams(templateList, paramzList):
+            print("Processing dir:", dirName, end=" ")
+            moPth = os.path.join(dirName, 'NumberOfMhcInMother.csv')
+            faPth = os.path.join(dirName, 'NumberOfMhcInFather.csv')
+            mPth = os.path.join(dirName, 'NumberOfMhcBeforeMating.csv')
+            mothr, fathr, bmate = loadTheParents(genLast,
+                                                 moPth, faPth, mPth)
+            stats = mateChoiceStats(mothr, fathr, bmate, 2, 100)
+            if stats is None:
+                print(" - failed to match the data! Check if the",
+                      "input file sizes (e.g. line numbers) are OK.")
+                continue
+            ww, bSize, fatherMean, mateMean, deltas = stats
+            justPlotDeviantFromMeanFather(ww, deltas, bSize, dirName)
+            try:
+                xx = np.transpose(np.vstack((ww, np.array(deltas),
+                                             bSize)))
+            except Exception:
+                print(" - failed to stack the data! Check if the",
+                      "input file sizes (e.g. line numbers) are OK.")
+                continue
+            datOut.append(xx)
+            print(" - done.")
     return datOut
 
 
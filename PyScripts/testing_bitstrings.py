@@ -1,8 +1,20 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 """
-Your doc string here, please...
+Tests how often a random MHC bit string fits into (presents) a random antigen
+bit string.
 
+The old functions build every bit string character by character with
+`bitstring` and test one MHC against one antigen at a time. The Monte Carlo
+estimator draws whole blocks of packed random MHCs and antigens (see
+`packed_bits`) from a seedable Numpy generator, cuts the epitopes out of the
+antigens with shifts like `mhc_presentation.epitopeWindows()` and compares
+them with the MHCs all at once. The trials are split into chunks with
+independent seed streams, simulated in worker processes, and the estimate is
+reported with its confidence interval next to the exact probability (for MHCs
+of up to EXACT_MAX_BITS bits) and the approximation for independent epitopes:
+
+    testing_bitstrings.py 6000 16 1000000 --seed 42 -j 8
 
 Created on Thu Nov  3 16:26:40 2016
 for Evolutionary Biology Group, Faculty of Biology
@@ -10,8 +22,21 @@ for Evolutionary Biology Group, Faculty of Biology
 @author: Piotr Bentkowski - bentkowski.piotr@gmail.com
 """
 import sys
+import argparse
+import multiprocessing as mp
 import numpy as np
 import bitstring as bts
+import packed_bits as pbits
+import mhc_presentation as mpres
+
+
+# Number of trials simulated with one seed stream (one task of the pool), so
+# the result for a given seed does not depend on the number of processes.
+CHUNK_TRIALS = 2**16
+# Normal quantile of the 95 % confidence interval.
+Z_95 = 1.959964
+# Longest MHC for which exactPresentation() enumerates all the MHCs.
+EXACT_MAX_BITS = 20
 
 
 def generateBistring(length, pp=0.5):
@@ -73,25 +98,215 @@ def finInRawBit(antigs, mhcs):
     return counter
 
 
-def main():
-    """ """
-    if len(sys.argv) <= 3:
-        print("The script needs 3 arguments:")
-        antiSize = int(input("  1. Size of the antigen (big bitstrig): "))
-        mhcSize = int(input("  2. Size of the MHC (small bitstrig): "))
-        theNumber = int(input("  3. Number of MHC to test: "))
+def makeRng(seed=None):
+    """Seedable random generator: a `numpy.random.Generator`, or a
+    `RandomState` on Numpy older than 1.17. seed may be a `SeedSequence`."""
+    if hasattr(np.random, 'default_rng'):
+        return np.random.default_rng(seed)
+    return np.random.RandomState(seed)
+
+
+def seedStreams(seed, number):
+    """Derives `number` independent seeds from one seed (spawned
+    `SeedSequence` children where Numpy has them)."""
+    if hasattr(np.random, 'SeedSequence'):
+        return np.random.SeedSequence(seed).spawn(number)
+    return list(np.random.RandomState(seed).randint(2**31, size=number))
+
+
+def randomPackedBits(rng, howMuch, length, pp=0.5):
+    """howMuch random bit strings of `length` bits as N x W packed words.
+    Every bit is 1 with the probability pp; for pp = 0.5 the words are
+    filled with random bytes straight away."""
+    ww = pbits.wordCount(length)
+    if pp == 0.5:
+        words = np.frombuffer(rng.bytes(8 * howMuch * ww), dtype=np.uint64)
+        words = words.reshape(howMuch, ww).copy()
+        if length % pbits.WORD_BITS:
+            words[:, 0] &= np.uint64((1 << length % pbits.WORD_BITS) - 1)
+        return words
+    draw = rng.random if hasattr(rng, 'integers') else rng.random_sample
+    return pbits.packBitArray(draw((howMuch, length)) < pp)
+
+
+def presentedPairs(mhcs, antigens, antiSize, mhcSize):
+    """Tells for every pair of a packed MHC and a packed antigen whether the
+    MHC equals one of the epitopes of the antigen, the way the model
+    presents antigens (see `mhc_presentation.epitopeWindows()`). The
+    epitopes starting at the same bit of every word are cut out and compared
+    together, without keeping all of them in memory."""
+    antigens = pbits.asWords(antigens)
+    mhcs = np.asarray(mhcs, dtype=np.uint64).reshape(-1, 1)
+    low = np.ascontiguousarray(antigens[:, ::-1])
+    high = np.zeros_like(low)
+    high[:, :-1] = low[:, 1:]
+    mask = np.uint64((1 << mhcSize) - 1)
+    epiNumb = mpres.epitopeCount(antiSize, mhcSize)
+    found = np.zeros(len(antigens), dtype=bool)
+    for bit in range(min(pbits.WORD_BITS, epiNumb)):
+        # words holding an epitope starting at this bit
+        ww = (epiNumb - bit + pbits.WORD_BITS - 1) // pbits.WORD_BITS
+        val = low[:, :ww] >> np.uint64(bit)
+        if bit:
+            val |= high[:, :ww] << np.uint64(pbits.WORD_BITS - bit)
+        found |= ((val & mask) == mhcs).any(axis=1)
+    return found
+
+
+def simulateChunk(task):
+    """Tests `trials` pairs of a random MHC and a random antigen drawn from
+    their own seed stream. task is a tuple `(seed, trials, antiSize,
+    mhcSize, pp)`. Returns the number of presented pairs. Meant to run in
+    worker processes."""
+    seed, trials, antiSize, mhcSize, pp = task
+    rng = makeRng(seed)
+    blockRows = max(1, mpres.BLOCK_EPITOPES //
+                    (pbits.wordCount(antiSize) * pbits.WORD_BITS))
+    hits = 0
+    for start in range(0, trials, blockRows):
+        nn = min(blockRows, trials - start)
+        mhcs = randomPackedBits(rng, nn, mhcSize, pp)
+        antigens = randomPackedBits(rng, nn, antiSize, pp)
+        hits += int(np.count_nonzero(presentedPairs(mhcs, antigens,
+                                                    antiSize, mhcSize)))
+    return hits
+
+
+def wilsonInterval(hits, trials, zz=Z_95):
+    """Wilson score confidence interval `(low, high)` of the fraction of
+    hits in trials (95 % by default)."""
+    if trials <= 0:
+        return (0., 1.)
+    phat = hits / trials
+    denom = 1. + zz**2 / trials
+    centre = (phat + zz**2 / (2. * trials)) / denom
+    half = zz * np.sqrt(phat * (1. - phat) / trials +
+                        zz**2 / (4. * trials**2)) / denom
+    return (max(0., float(centre - half)), min(1., float(centre + half)))
+
+
+def overlapClasses(mhcSize):
+    """Groups all the 2**mhcSize MHCs by what the probability of finding them
+    in a random bit string depends on: the number of ones and the overlaps of
+    the MHC with itself. Returns a tuple `(keys, counts)` of the distinct
+    keys and the number of MHCs with each. Column 0 of a key is the number
+    of ones; column d is 0 if the MHC shifted by d bits does not match
+    itself, and one more than the number of ones in the d bits added by the
+    shift if it does."""
+    mhcs = np.arange(1 << mhcSize, dtype=np.uint64)
+    keys = np.zeros((len(mhcs), mhcSize), dtype=np.uint8)
+    keys[:, 0] = pbits.popcount(mhcs)
+    for dd in range(1, mhcSize):
+        overlap = (mhcs >> np.uint64(dd)) == (mhcs & np.uint64(
+            (1 << (mhcSize - dd)) - 1))
+        keys[overlap, dd] = pbits.popcount(
+            mhcs[overlap] & np.uint64((1 << dd) - 1)) + 1
+    raw = np.ascontiguousarray(keys).view(np.dtype((np.void, mhcSize)))
+    _, first, counts = np.unique(raw.ravel(), return_index=True,
+                                 return_counts=True)
+    return keys[first].astype(int), counts
+
+
+def exactPresentation(antiSize, mhcSize, pp=0.5):
+    """Exact probability that a random MHC of mhcSize bits presents a random
+    antigen of antiSize bits, i.e. occurs in the bits the epitopes are cut
+    from. For every class of MHCs from overlapClasses() the probability of
+    not occurring in n bits follows the recurrence given by the generating
+    function of Guibas & Odlyzko (1981), (1 - z) c(z) + P(MHC) z^mhcSize,
+    where c(z) is the autocorrelation polynomial of the MHC. Returns NaN for
+    MHCs longer than EXACT_MAX_BITS, which are too many to enumerate."""
+    if mhcSize > EXACT_MAX_BITS:
+        return np.nan
+    epiNumb = mpres.epitopeCount(antiSize, mhcSize)
+    if epiNumb == 0:
+        return 0.
+    keys, counts = overlapClasses(mhcSize)
+    qq = 1. - pp
+    ones = keys[:, 0]
+    probMhc = pp**ones * qq**(mhcSize - ones)
+    # autocorrelation polynomials, one row of coefficients per class
+    corr = np.zeros((len(keys), mhcSize + 1))
+    corr[:, 0] = 1.
+    for dd in range(1, mhcSize):
+        over = keys[:, dd] > 0
+        added = keys[over, dd] - 1
+        corr[over, dd] = pp**added * qq**(dd - added)
+    denom = corr.copy()
+    denom[:, 1:] -= corr[:, :-1]
+    denom[:, mhcSize] += probMhc
+    # last[:, k] is the probability of no occurrence in the n - k bits
+    # before, so `denom * avoid = corr` gives it for n bits
+    last = np.zeros((len(keys), mhcSize + 1))
+    for nn in range(epiNumb + mhcSize):
+        coeff = corr[:, nn] if nn <= mhcSize else 0.
+        avoid = coeff - (denom[:, 1:] * last[:, 1:]).sum(axis=1)
+        last[:, 2:] = last[:, 1:-1]
+        last[:, 1] = avoid
+    return float(np.sum(counts * probMhc * (1. - avoid)))
+
+
+def presentationTheory(antiSize, mhcSize, pp=0.5):
+    """Theoretical probabilities the estimate is compared with. Returns a
+    tuple `(exact, independent)`: the exact probability from
+    exactPresentation() (NaN above EXACT_MAX_BITS) and the approximation
+    that at least one of the epitopes equals the MHC if the epitopes were
+    independent, which they are not as they overlap."""
+    agree = pp**2 + (1. - pp)**2
+    independent = 1. - (1. - agree**mhcSize)**mpres.epitopeCount(antiSize,
+                                                                 mhcSize)
+    return exactPresentation(antiSize, mhcSize, pp), independent
+
+
+def estimatePresentation(antiSize, mhcSize, trials, pp=0.5, seed=None,
+                         jobs=1):
+    """Monte Carlo estimate of the probability that a random MHC of mhcSize
+    bits presents a random antigen of antiSize bits (both with bits set with
+    the probability pp). The trials are split into chunks of CHUNK_TRIALS,
+    each with its own seed stream derived from seed, and simulated in `jobs`
+    worker processes. Returns a dictionary:
+
+    ===============  ========================================================
+    key              info
+    ===============  ========================================================
+    `hits`           number of presented pairs
+    `trials`         number of pairs tested
+    `estimate`       fraction of presented pairs
+    `ci_low`         lower bound of the 95 % (Wilson) confidence interval
+    `ci_high`        upper bound of the 95 % (Wilson) confidence interval
+    `exact`          exact probability (NaN above EXACT_MAX_BITS)
+    `independent`    approximation for independent epitopes
+    ===============  ========================================================
+    """
+    if not 0 < mhcSize <= pbits.WORD_BITS or antiSize < mhcSize:
+        raise ValueError("estimatePresentation(): the MHC has to be 1 to 64 "
+                         "bits long and not longer than the antigen.")
+    sizes = [CHUNK_TRIALS] * (trials // CHUNK_TRIALS)
+    if trials % CHUNK_TRIALS:
+        sizes.append(trials % CHUNK_TRIALS)
+    tasks = [(ss, nn, antiSize, mhcSize, pp)
+             for ss, nn in zip(seedStreams(seed, len(sizes)), sizes)]
+    if jobs <= 1 or len(tasks) <= 1:
+        hits = sum(map(simulateChunk, tasks))
     else:
+        pool = mp.Pool(min(jobs, len(tasks)))
         try:
-            antiSize = int(sys.argv[1])
-            mhcSize = int(sys.argv[2])
-            theNumber = int(sys.argv[3])
-            if(antiSize < mhcSize):
-                print("Size of antigen cannot be smaller then size of MHC.",
-                      "Quit.")
-                sys.exit()
-        except Exception:
-            print("Cannot convert arguments to numbers. Quit")
-            sys.exit()
+            hits = sum(pool.imap_unordered(simulateChunk, tasks))
+        finally:
+            pool.close()
+            pool.join()
+    low, high = wilsonInterval(hits, trials)
+    exact, independent = presentationTheory(antiSize, mhcSize, pp)
+    return {'hits': hits,
+            'trials': trials,
+            'estimate': hits / trials if trials else np.nan,
+            'ci_low': low,
+            'ci_high': high,
+            'exact': exact,
+            'independent': independent}
+
+
+def mainBitstring(antiSize, mhcSize, theNumber):
+    """The original one pair at a time test with `bitstring`."""
     atigens = rawBitArr(theNumber, antiSize)
     MHCS = rawBitArr(theNumber, mhcSize)
     counter = finInRawBit(atigens, MHCS)
@@ -101,6 +316,55 @@ def main():
     print("\nDone!")
 
 
+def main():
+    """ """
+    parser = argparse.ArgumentParser(
+        description="Monte Carlo estimate of the probability that a random "
+        "MHC bit string presents a random antigen bit string.")
+    parser.add_argument('antiSize', type=int,
+                        help="size of the antigen (big bit string)")
+    parser.add_argument('mhcSize', type=int,
+                        help="size of the MHC (small bit string, max 64)")
+    parser.add_argument('theNumber', type=int,
+                        help="number of MHC-antigen pairs to test")
+    parser.add_argument('-p', '--pp', type=float, default=0.5,
+                        help="probability of a bit being 1")
+    parser.add_argument('-s', '--seed', type=int, default=None,
+                        help="seed of the random streams")
+    parser.add_argument('-j', '--jobs', type=int, default=mp.cpu_count(),
+                        help="number of worker processes")
+    parser.add_argument('--bitstring', action='store_true', help="run the "
+                        "old one pair at a time test with bitstring instead")
+    if len(sys.argv) <= 3:
+        print("The script needs 3 arguments:")
+        argv = [input("  1. Size of the antigen (big bitstrig): "),
+                input("  2. Size of the MHC (small bitstrig): "),
+                input("  3. Number of MHC to test: ")]
+    else:
+        argv = sys.argv[1:]
+    args = parser.parse_args(argv)
+    if args.antiSize < args.mhcSize:
+        print("Size of antigen cannot be smaller then size of MHC.", "Quit.")
+        sys.exit()
+    if args.bitstring:
+        mainBitstring(args.antiSize, args.mhcSize, args.theNumber)
+        return
+    try:
+        res = estimatePresentation(args.antiSize, args.mhcSize,
+                                   args.theNumber, args.pp, args.seed,
+                                   args.jobs)
+    except ValueError as e:
+        print("ERROR in main():", e)
+        sys.exit(1)
+    print("MHC fitted", res['hits'], "times out of", res['trials'])
+    print("Fraction of MHC tested that fitted:", res['estimate'],
+          " 95% CI: [{0:.6g}, {1:.6g}]".format(res['ci_low'], res['ci_high']))
+    if args.mhcSize <= EXACT_MAX_BITS:
+        print("Exact probability:", res['exact'])
+    print("Approximation for independent epitopes:", res['independent'])
+    print("\nDone!")
+
+
 def main2():
     """ """
     if len(sys.argv) <= 3: